@@ -0,0 +1,49 @@
+# evaluate a year of cron schedule: the bitmask next_plan_at against per-minute polling,
+# and the catch-up after a year of downtime: last_plan_at against walking the missed plans.
+# usage: python3 benchmarks/cron_schedule.py
+from datetime import datetime, timedelta
+from pathlib import Path
+from sys import path
+from time import perf_counter
+path.insert(0, str(Path(__file__).absolute().parent.parent))
+from sooners.cron import BaseCronTask
+
+class Every5Minutes(BaseCronTask): cron_expr = '*/5 9-17 * * 1-5'
+class Hourly(BaseCronTask): cron_expr = '0 * * * *'
+class Monthly(BaseCronTask): cron_expr = '30 2 1 * *'
+class LeapDay(BaseCronTask): cron_expr = '0 0 29 2 *'
+
+def by_next_plan_at(cron_class: type, start_at: datetime, end_at: datetime) -> int:
+    fired, now_at = 0, start_at
+    while (now_at := cron_class.next_plan_at(now_at)) < end_at: fired += 1
+    return fired
+
+def by_polling(cron_class: type, start_at: datetime, end_at: datetime) -> int:
+    fired, now_at = 0, start_at
+    while (now_at := now_at + timedelta(minutes = 1)) < end_at:
+        if cron_class.launch_ornot(now_at) is not None: fired += 1
+    return fired
+
+def by_walking(cron_class: type, start_at: datetime, end_at: datetime) -> datetime:
+    plan_at = cron_class.next_plan_at(start_at)
+    while (next_at := cron_class.next_plan_at(plan_at)) <= end_at: plan_at = next_at
+    return plan_at
+
+def by_last_plan_at(cron_class: type, start_at: datetime, end_at: datetime) -> datetime:
+    return cron_class.last_plan_at(cron_class.next_plan_at(start_at), end_at)
+
+if __name__ == '__main__':
+    start_at = datetime(2024, 1, 1)
+    end_at = start_at.replace(year = start_at.year + 1)
+    for cron_class in (Every5Minutes, Hourly, Monthly, LeapDay):
+        cron_class.post_setup()
+        for func in (by_next_plan_at, by_polling):
+            time0 = perf_counter()
+            fired = func(cron_class, start_at, end_at)
+            print('%-16s %-16s fired=%6u %10.3fms' % (
+                cron_class.__name__, func.__name__, fired, (perf_counter() - time0) * 1000))
+        for func in (by_last_plan_at, by_walking):
+            time0 = perf_counter()
+            plan_at = func(cron_class, start_at, end_at)
+            print('%-16s %-16s last=%s %6.3fms' % (
+                cron_class.__name__, func.__name__, plan_at, (perf_counter() - time0) * 1000))
@@ -0,0 +1,78 @@
+# evaluate the lines per second of workers logging through the guardian pipes:
+# the chunked guardian against the former readline with a flush per line,
+# and the framed records of the logging handler.
+# usage: python3 benchmarks/daemon_logpipe.py [lines] [workers]
+from argparse import Namespace
+from os import _exit, close, fdopen, fork, pipe, waitpid
+from pathlib import Path
+from sys import argv, path
+from tempfile import TemporaryDirectory
+from time import perf_counter
+path.insert(0, str(Path(__file__).absolute().parent.parent))
+import sooners.settings
+
+def write_lines(wpipe: int, lines: int) -> None:
+    fp = fdopen(wpipe, 'wt')
+    for index in range(lines):
+        fp.write('%06u: the worker is chatty, nothing to see here.\n' % index)
+    fp.close()
+    _exit(0)
+
+def log_records(record_wpipe: int, lines: int) -> None:
+    from logging import getLogger
+    from sooners.daemon import LogRecordHandler
+    logger = getLogger('bench')
+    logger.addHandler(LogRecordHandler(record_wpipe))
+    logger.setLevel(20)
+    for index in range(lines):
+        logger.info('%06u: the worker is chatty, nothing to see here.', index)
+        logger.debug('%06u: filtered by the level.', index)
+    _exit(0)
+
+def by_readline(command, lines: int, workers: int) -> None:
+    rpipe, wpipe = pipe()
+    if (subpid := fork()) == 0: close(rpipe); write_lines(wpipe, lines)
+    close(wpipe)
+    rfp = fdopen(rpipe)
+    while (line := rfp.readline()):
+        command.wfp.write(line)
+        command.wfp.flush()
+    waitpid(subpid, 0)
+    rfp.close()
+
+def by_guardian(command, lines: int, workers: int) -> None:
+    command.lines, command.records_ornot = lines, False
+    command.guardian(Namespace(workers = workers))
+
+def by_records(command, lines: int, workers: int) -> None:
+    command.lines, command.records_ornot = lines, True
+    command.guardian(Namespace(workers = workers))
+
+if __name__ == '__main__':
+    lines = int(argv[1]) if len(argv) > 1 else 200000
+    workers = int(argv[2]) if len(argv) > 2 else 4
+    with TemporaryDirectory() as sandbox_root:
+        sandbox_root = Path(sandbox_root)
+        sooners.settings.the_settings = Namespace(
+            sandbox_root = sandbox_root, logs_dir = sandbox_root,
+            closed_logs_dir = sandbox_root, log_limit = 1 << 40,
+            log_level = 20, log_read_size = 64 * 1024, log_flush_size = 64 * 1024, log_flush_interval = 1.0)
+        from sooners.daemon import BaseDaemonCommand
+        class BenchCommand(BaseDaemonCommand):
+            def worker(self, worker, wpipe, record_wpipe, namespace):
+                close(worker.rpipe); close(worker.record_rpipe)
+                for other in self.workers.values():
+                    close(other.rpipe); close(other.record_rpipe)
+                if self.records_ornot: close(wpipe); log_records(record_wpipe, self.lines)
+                else: close(record_wpipe); write_lines(wpipe, self.lines)
+        command = BenchCommand(sooners.settings.the_settings)
+        command.logprefix, command.lnhdr = 'bench', 'BENCH'
+        for func, func_workers in ((by_readline, 1), (by_guardian, 1), (by_guardian, workers),
+                                   (by_records, 1), (by_records, workers)):
+            command.logopen('%s.%u' % (func.__name__, func_workers))
+            time0 = perf_counter()
+            func(command, lines, func_workers)
+            seconds = perf_counter() - time0
+            command.wfp.close()
+            print('%-12s workers=%u lines=%u %8.3fs %12.0f lines/s/worker' % (
+                func.__name__, func_workers, lines, seconds, lines / seconds))
@@ -0,0 +1,70 @@
+# evaluate the latency of the cached endpoint responses against the uncached ones,
+# after checking that the cache changes no body: the handlers return the dicts with
+# a field out of the response model, which must be filtered in both cases.
+# usage: python3 benchmarks/endpoint_cache.py [requests] [users]
+from argparse import Namespace
+from asyncio import run
+from pathlib import Path
+from sys import argv, path
+from time import perf_counter
+path.insert(0, str(Path(__file__).absolute().parent.parent))
+import sooners.settings
+sooners.settings.the_settings = Namespace(
+    endpoint_response = 'default', endpoint_shared_cache = None,
+    endpoint_json_encoders = ('orjson', 'msgspec', 'pydantic', 'json'))
+from fastapi import FastAPI
+from fastapi.routing import APIRouter
+from httpx import ASGITransport, AsyncClient
+from sooners.endpoint import BaseEndpoint
+from sooners.epcache import EPCache
+from sooners.sample1.endpoints import TeamSchema, UserSchema
+
+def make_app(response: str, cache: EPCache | None, users: int) -> FastAPI:
+    the_users = list(map(lambda index: dict(
+        name = 'user%04u' % index, team = 'team%02u' % (index % 16),
+        secret = 'pw%04u' % index), range(users)))
+    class Users(BaseEndpoint):
+        path = 'users'
+        async def get(self) -> list[UserSchema]: return the_users
+    class Team(BaseEndpoint):
+        path = 'team'
+        async def get(self) -> TeamSchema: return dict(name = 'team00', secret = 'pw')
+    app, apirouter = FastAPI(), APIRouter(prefix = '/bench')
+    for endpoint in (Users, Team):
+        endpoint.response, endpoint.cache = response, cache
+        endpoint.endpoint_setup(apirouter)
+    app.include_router(apirouter)
+    return app
+
+async def bodies(app: FastAPI) -> tuple[bytes]:
+    async with AsyncClient(transport = ASGITransport(app = app),
+                           base_url = 'http://bench') as client:
+        func = lambda path: client.get(path, params = dict(self = 0))
+        return tuple(map(lambda response: response.raise_for_status().content,
+                         [await func('/bench/users'), await func('/bench/team')]))
+
+async def evaluate(app: FastAPI, requests: int) -> tuple[float, float]:
+    async with AsyncClient(transport = ASGITransport(app = app),
+                           base_url = 'http://bench') as client:
+        latencies = list()
+        for index in range(requests):
+            time0 = perf_counter()
+            (await client.get('/bench/users', params = dict(self = 0))).raise_for_status()
+            latencies.append(perf_counter() - time0)
+        latencies.sort()
+    return (latencies[len(latencies) // 2], latencies[len(latencies) * 99 // 100])
+
+if __name__ == '__main__':
+    requests = int(argv[1]) if len(argv) > 1 else 1000
+    users = int(argv[2]) if len(argv) > 2 else 100
+    for response in ('default', 'fast'):
+        uncached = run(bodies(make_app(response, None, users)))
+        cached = run(bodies(app := make_app(response, EPCache(60, shared_ornot = False), users)))
+        if cached != uncached:
+            raise AssertionError('%s: cached %r != uncached %r.' % (response, cached, uncached))
+        elif b'secret' in b''.join(cached):
+            raise AssertionError('%s: secret leaked by %r.' % (response, cached))
+        for cache_name, app in (('uncached', make_app(response, None, users)), ('cached', app)):
+            p50, p99 = run(evaluate(app, requests))
+            print('%-8s %-8s get p50=%7.3fms p99=%7.3fms' % (
+                response, cache_name, p50 * 1000, p99 * 1000))
@@ -0,0 +1,38 @@
+# evaluate the overhead of the metrics middleware per request: the asgi app is
+# called directly, without and with the middleware, sampling none or every request.
+# usage: python3 benchmarks/endpoint_metrics.py [requests]
+from asyncio import run
+from pathlib import Path
+from sys import argv, path
+from time import perf_counter
+path.insert(0, str(Path(__file__).absolute().parent.parent))
+from fastapi import FastAPI
+from sooners.epmetrics import EPMetrics, EPMetricsMiddleware
+
+def make_app() -> FastAPI:
+    app = FastAPI()
+    @app.get('/items/{item}')
+    async def get_item(item: str) -> str: return item
+    return app
+
+async def call_app(app, requests: int) -> float:
+    scope = dict(type = 'http', asgi = dict(version = '3.0'), http_version = '1.1',
+                 method = 'GET', scheme = 'http', path = '/items/1', raw_path = b'/items/1',
+                 root_path = '', query_string = b'', headers = [], server = ('bench', 80))
+    async def receive() -> dict: return dict(type = 'http.request', body = b'')
+    async def send(message: dict) -> None: pass
+    time0 = perf_counter()
+    for index in range(requests): await app(dict(scope), receive, send)
+    return perf_counter() - time0
+
+if __name__ == '__main__':
+    requests = int(argv[1]) if len(argv) > 1 else 20000
+    buckets = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10)
+    for name, sample_rate in (('without', None), ('sample none', 0), ('sample all', 1)):
+        app = make_app()
+        if sample_rate is not None:
+            app.add_middleware(EPMetricsMiddleware, metrics = EPMetrics(buckets, sample_rate),
+                               metrics_path = '/metrics')
+        run(call_app(app, 100))
+        seconds = run(call_app(app, requests))
+        print('%-12s %8u requests %10.3fus/request' % (name, requests, seconds / requests * 1e6))
@@ -0,0 +1,64 @@
+# evaluate the latency and throughput of the endpoint responses on the sample1
+# schemas: fastapi default, fast json by every available encoder, prevalidated.
+# usage: python3 benchmarks/endpoint_response.py [requests] [users]
+from argparse import Namespace
+from asyncio import gather, run
+from pathlib import Path
+from sys import argv, path
+from time import perf_counter
+path.insert(0, str(Path(__file__).absolute().parent.parent))
+import sooners.settings
+sooners.settings.the_settings = Namespace(
+    endpoint_response = 'default', endpoint_shared_cache = None,
+    endpoint_json_encoders = ('orjson', 'msgspec', 'pydantic', 'json'))
+from fastapi import FastAPI
+from fastapi.routing import APIRouter
+from httpx import ASGITransport, AsyncClient
+from sooners.endpoint import BaseEndpoint
+from sooners.epresponse import FastJSONResponse, json_encoders, select_json_encoder
+from sooners.sample1.endpoints import TeamSchema, UserSchema
+
+def make_app(response: str, users: int) -> FastAPI:
+    the_users = list(map(lambda index: UserSchema(
+        name = 'user%04u' % index, team = 'team%02u' % (index % 16)), range(users)))
+    class Users(BaseEndpoint):
+        path = 'users'
+        async def get(self) -> list[UserSchema]: return the_users
+        async def post(self, user: UserSchema) -> TeamSchema:
+            return TeamSchema(name = user.team)
+    Users.response = response
+    app, apirouter = FastAPI(), APIRouter(prefix = '/bench')
+    Users.endpoint_setup(apirouter)
+    app.include_router(apirouter)
+    return app
+
+async def evaluate(app: FastAPI, requests: int) -> tuple[float, float, float]:
+    async with AsyncClient(transport = ASGITransport(app = app),
+                           base_url = 'http://bench') as client:
+        latencies = list()
+        for index in range(requests):
+            time0 = perf_counter()
+            (await client.get('/bench/users', params = dict(self = 0))).raise_for_status()
+            latencies.append(perf_counter() - time0)
+        latencies.sort()
+        time0 = perf_counter()
+        await gather(*map(lambda index: client.post(
+            '/bench/users', params = dict(self = 0),
+            json = dict(name = 'user', team = 'team')), range(requests)))
+        throughput = requests / (perf_counter() - time0)
+    return (latencies[len(latencies) // 2], latencies[len(latencies) * 99 // 100], throughput)
+
+if __name__ == '__main__':
+    requests = int(argv[1]) if len(argv) > 1 else 1000
+    users = int(argv[2]) if len(argv) > 2 else 100
+    cases = [('default', None)]
+    for name in json_encoders.keys():
+        if select_json_encoder((name,))[0] == name: cases.append(('fast', name))
+    cases.append(('prevalidated', cases[1][1]))
+    for response, encoder_name in cases:
+        if encoder_name is not None:
+            FastJSONResponse.encoder_name, encoder = select_json_encoder((encoder_name,))
+            FastJSONResponse.encoder = staticmethod(encoder)
+        p50, p99, throughput = run(evaluate(make_app(response, users), requests))
+        print('%-12s %-8s get p50=%7.3fms p99=%7.3fms, post %8.0f req/s' % (
+            response, encoder_name or '-', p50 * 1000, p99 * 1000, throughput))
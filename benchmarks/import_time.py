@@ -0,0 +1,35 @@
+# evaluate the import time of the cli entry path by python -X importtime, and
+# check the modules deferred to the interactive fallbacks are not imported.
+# usage: python3 benchmarks/import_time.py [budget in ms] [module]
+from pathlib import Path
+from subprocess import PIPE, run
+from sys import argv, executable, exit
+root = Path(__file__).absolute().parent.parent
+deferred = ('asyncio', 'difflib', 'readline', 'subprocess', 'sooners.termcolors')
+script = 'import sys, %s; print(",".join(sorted(set(sys.modules).intersection(%r))))'
+
+def import_times(module: str) -> tuple[dict[str, int], str]:
+    pipe = run((executable, '-X', 'importtime', '-c', script % (module, deferred)),
+               stdout = PIPE, stderr = PIPE, cwd = root, encoding = 'utf-8')
+    if pipe.returncode != 0: raise RuntimeError(pipe.stderr)
+    times = dict()
+    for line in pipe.stderr.splitlines():
+        if not line.startswith('import time:') or 'cumulative' in line: continue
+        self_us, cumulative_us, name = line[len('import time:'): ].split('|')
+        times[name.strip()] = int(cumulative_us)
+    return times, pipe.stdout.strip()
+
+if __name__ == '__main__':
+    budget = float(argv[1]) if len(argv) > 1 else None
+    module = argv[2] if len(argv) > 2 else 'sooners.core'
+    samples = sorted(map(lambda index: import_times(module), range(5)),
+                     key = lambda sample: sample[0][module])
+    times, imported = samples[len(samples) // 2]
+    for name, cumulative_us in sorted(times.items(), key = lambda item: -item[1])[:15]:
+        print('%-40s %10.3fms' % (name, cumulative_us / 1000))
+    print('%s: %.3fms (median of %u), deferred imported: %s.' % (
+        module, times[module] / 1000, len(samples), imported or 'none'))
+    if imported: exit(1)
+    elif budget is not None and times[module] / 1000 > budget:
+        print('over the budget %.3fms.' % budget)
+        exit(1)
@@ -0,0 +1,93 @@
+# evaluate the latency seen by clients while the server is reloaded: the former
+# SIGHUP, which retires the old workers before the new ones are warmed up, against
+# the reload waiting for the new workers ready. the warm-up is simulated by a hook.
+# usage: python3 benchmarks/reload_latency.py [warmup seconds] [clients]
+from argparse import Namespace
+from os import _exit, fork, kill, waitpid
+from pathlib import Path
+from signal import SIGHUP, SIGINT
+from sys import argv, path
+from tempfile import TemporaryDirectory
+from threading import Event, Thread
+from time import monotonic, sleep
+from urllib.request import urlopen
+path.insert(0, str(Path(__file__).absolute().parent.parent))
+from fastapi import FastAPI
+from sooners.settings.baseapi import ServersMap
+from sooners.settings.fastapi import SettingsFastAPIMixin
+
+class BenchSettings(object):
+    lifespan_setup, warmup = SettingsFastAPIMixin.lifespan_setup, SettingsFastAPIMixin.warmup
+    def __init__(self, sandbox_root: Path, port: int, warmup_seconds: float) -> None:
+        self.source_root = self.sandbox_root = sandbox_root
+        self.logs_dir = sandbox_root.joinpath('logs')
+        self.logs_dir.mkdir()
+        self.servers = ServersMap(self)
+        self.servers.install('bench', port = port, workers = 2, preload_app = True,
+                             graceful_timeout = 5)
+        self.databases = dict()
+        self.warmup_hooks = [lambda settings: sleep(warmup_seconds)]
+        self._app = FastAPI()
+        self._app.get('/ping')(self.ping)
+        self.lifespan_setup()
+    async def ping(self) -> str: return 'pong'
+    def boot(self): return self
+    @property
+    def app(self): return self._app
+
+def start_server(settings: BenchSettings) -> int:
+    from sooners.core.commands.libs.server import SoonersApplication
+    if (pid := fork()) == 0:
+        try: SoonersApplication(Namespace(server = 'bench'), settings).run()
+        finally: _exit(0)
+    waitpid(pid, 0)
+    pid_fpath, ready_dir = settings.servers.pid_fpath('bench'), settings.servers.ready_dir('bench')
+    while not pid_fpath.is_file() or len(tuple(ready_dir.iterdir())) < 2: sleep(0.1)
+    return int(pid_fpath.read_text())
+
+def request_loop(url: str, stopping: Event, records: list) -> None:
+    while not stopping.is_set():
+        time0 = monotonic()
+        try: ok = urlopen(url, timeout = 30).read() == b'"pong"'
+        except OSError as exc: ok = False
+        records.append((time0, monotonic() - time0, ok))
+
+def percentile(latencies: list[float], ratio: float) -> float:
+    return latencies[min(len(latencies) - 1, int(len(latencies) * ratio))] * 1000
+
+def measure(hup: bool, warmup_seconds: float, clients: int, port: int) -> None:
+    from sooners.core.commands.server import Command
+    with TemporaryDirectory() as tmpdir:
+        settings = BenchSettings(Path(tmpdir), port, warmup_seconds)
+        master_pid = start_server(settings)
+        command = Command(settings)
+        command.verbosity = 0
+        stopping, records = Event(), list()
+        threads = tuple(map(lambda index: Thread(target = request_loop, args = (
+            'http://127.0.0.1:%u/ping' % port, stopping, records)), range(clients)))
+        for thread in threads: thread.start()
+        sleep(1)
+        reload_at = monotonic()
+        # the bench app is preloaded, where on_reload would re-execute this script.
+        if hup: kill(master_pid, SIGHUP)
+        else:
+            ready_dir = settings.servers.ready_dir('bench')
+            command.reload_by_workers(Namespace(server = 'bench', ready_timeout = 30),
+                                      master_pid, command.ready_pids(ready_dir), ready_dir)
+        sleep(warmup_seconds + 2)
+        stopping.set()
+        for thread in threads: thread.join()
+        kill(master_pid, SIGINT)
+        for name, func in (('before', lambda record: record[0] < reload_at),
+                           ('reloading', lambda record: record[0] >= reload_at)):
+            latencies = sorted(map(lambda record: record[1], filter(func, records)))
+            errors = sum(map(lambda record: not record[2], filter(func, records)))
+            print('%-6s %-10s requests=%6u errors=%3u p50=%8.3fms p99=%8.3fms max=%8.3fms' % (
+                'hup' if hup else 'gated', name, len(latencies), errors,
+                percentile(latencies, 0.5), percentile(latencies, 0.99), latencies[-1] * 1000))
+
+if __name__ == '__main__':
+    warmup_seconds = float(argv[1]) if len(argv) > 1 else 1.0
+    clients = int(argv[2]) if len(argv) > 2 else 8
+    for hup, port in ((True, 18301), (False, 18302)):
+        measure(hup, warmup_seconds, clients, port)
@@ -1,16 +1,22 @@
 from argparse import ArgumentParser, Namespace
-from asyncio import gather, get_event_loop
-from difflib import get_close_matches
 from importlib import import_module
-from os import get_exec_path
+from json import dumps, loads
+from os import get_exec_path, getpid, replace, scandir
 from pathlib import Path
-from readline import parse_and_bind, set_completer_delims, set_completer
-from subprocess import PIPE, run
-from .termcolors import colorize
+from typing import Iterable
 from .component import BaseComponentSubDirPyClass
 
-parse_and_bind('tab: complete')
-set_completer_delims('')
+# readline, difflib, subprocess, asyncio and termcolors are imported when used,
+# so the non-interactive commands under cron or systemd start fast.
+_readline_ready = False
+def set_command_completer(completer) -> None:
+    global _readline_ready
+    from readline import parse_and_bind, set_completer_delims, set_completer
+    if not _readline_ready:
+        parse_and_bind('tab: complete')
+        set_completer_delims('')
+        _readline_ready = True
+    set_completer(completer)
 
 class BaseCommand(BaseComponentSubDirPyClass):
     component_subdir = 'commands'
@@ -38,6 +44,7 @@ class BaseCommand(BaseComponentSubDirPyClass):
         self.verbosity = namespace.verbosity
 
     def async_handle(self, namespace: Namespace) -> None:
+        from asyncio import gather, get_event_loop
         coroutine = gather(*self.make_coroutines(namespace))
         get_event_loop().run_until_complete(coroutine)
 
@@ -48,6 +55,7 @@ class BaseCommand(BaseComponentSubDirPyClass):
             raise self.exctype('Can not locate %r.' % program)
 
     def popen(self, *args, stdout_encoding = 'utf-8'):
+        from subprocess import PIPE, run
         try: pipe = run(args, stdout = PIPE, stderr = PIPE)
         except OSError as exc: raise self.exctype('Error executing %r' % args) from exc
         return (pipe.stdout.decode(stdout_encoding),
@@ -61,7 +69,9 @@ class BaseCommand(BaseComponentSubDirPyClass):
         return stdout, errors, status
 
     def prompt(self, message: str, **kwargs) -> None:
-        if kwargs: message = colorize(message, **kwargs)
+        if kwargs:
+            from .termcolors import colorize
+            message = colorize(message, **kwargs)
         print(message)
     def emprompt(self, message: str) -> None:
         print(message, opts = ('bold',))
@@ -85,18 +95,69 @@ class CommandCompleter(object):
         if state >= len(candidates): return None
         return '%s%s' % (text, candidates[state])
 
+class CommandIndex(object):
+    # the commands of all the components: name -> help, persisted in the sandbox.
+    # a component is scanned again only when the mtimes of its command files changed,
+    # so the lookup and help import no unrelated command module.
+    def __init__(self, settings) -> None:
+        self.settings, self.changed = settings, False
+        self.fpath = settings.sandbox_root.joinpath('commands.index.json')
+        try: self.index = loads(self.fpath.read_text(encoding = 'utf-8'))
+        except (OSError, ValueError): self.index = dict()
+        for component in settings.components.values(): self.load_component(component)
+        if self.changed: self.save()
+    def __repr__(self) -> str:
+        return '%s(%s)' % (self.__class__.__name__, ','.join(self.index.keys()))
+
+    @classmethod
+    def signature(cls, component) -> dict[str, int]:
+        subdir = component.root.joinpath(BaseCommand.component_subdir)
+        if not subdir.is_dir(): return dict()
+        func = lambda direntry: direntry.name != '__pycache__'
+        with scandir(subdir) as direntries:
+            return dict(map(lambda direntry: (direntry.name, direntry.stat().st_mtime_ns),
+                            filter(func, direntries)))
+
+    def load_component(self, component) -> None:
+        signature = self.signature(component)
+        if self.index.get(component.name, dict()).get('signature') == signature: return
+        func = lambda ctx: (ctx.name, ctx.klass.help)
+        self.index[component.name] = dict(
+            signature = signature,
+            commands = dict(map(func, BaseCommand.scan_component(component))))
+        self.changed = True
+
+    def save(self) -> None:
+        # the index is only a cache, a read-only sandbox is not an error.
+        temppath = self.fpath.with_name('%s.%u.tmp' % (self.fpath.name, getpid()))
+        try:
+            temppath.write_text(dumps(self.index, indent = 1), encoding = 'utf-8')
+            replace(temppath, self.fpath)
+        except OSError as exc: pass
+
+    def commands(self) -> Iterable[tuple[str, str, str]]:
+        for component in self.settings.components.values():
+            for name, help in self.index[component.name]['commands'].items():
+                yield component.name, name, help
+    def names(self) -> set[str]: return set(map(lambda command: command[1], self.commands()))
+
+    def load(self, command_name: str) -> type | None:
+        for component in self.settings.components.values():
+            if command_name not in self.index[component.name]['commands']: continue
+            command_class = BaseCommand.load_from_subdir(command_name, component)
+            if command_class is not None: return command_class
+        return None
+
 def locate_command(settings, command_name: str, *argv) -> BaseCommand:
-    for component in settings.components.values():
-        command_class = BaseCommand.load_from_subdir(command_name, component)
-        if command_class is not None: return command_class(settings, *argv)
-    name2class = dict()
-    func = lambda ctx: (ctx.name, ctx.klass)
-    for component in settings.components.values():
-        name2class.update(map(func, BaseCommand.scan_component(component)))
-    matches = get_close_matches(command_name, name2class.keys())
+    index = CommandIndex(settings)
+    if (command_class := index.load(command_name)) is not None:
+        return command_class(settings, *argv)
+    from difflib import get_close_matches
+    matches = get_close_matches(command_name, index.names())
     if not matches: raise ImportError('Unable to locate command: %r.' % command_name)
-    set_completer(CommandCompleter(matches))
+    set_command_completer(CommandCompleter(matches))
     print('Did you mean: %r ?' % matches)
     new_command_name = input('Command: ').strip()
-    if new_command_name not in name2class: raise exc
-    return name2class[new_command_name](settings, *argv)
+    if (command_class := index.load(new_command_name)) is None:
+        raise ImportError('Unable to locate command: %r.' % new_command_name)
+    return command_class(settings, *argv)
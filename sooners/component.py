@@ -31,13 +31,16 @@ class BaseComponent(object):
         try: import_module(models_module_name, models_module_name)
         except ModuleNotFoundError as exc: pass
 
+    # the data steps of the schema patches, can be overrided. data_forward is done after
+    # the operations of a patch to a higher version, data_backward before the operations
+    # of a patch to a lower version.
+    def data_forward(self, context: Context, version0: int, version1: int) -> None: pass
+    def data_backward(self, context: Context, version0: int, version1: int) -> None: pass
+
     def load_statics(self) -> None:
         if not self.root.joinpath('statics').is_dir(): return
-        from fastapi.staticfiles import StaticFiles
-        self.settings.app.mount(
-            '/%s/statics' % self.name,
-            StaticFiles(directory = self.root.joinpath('statics')),
-            name = '%s.statics' % self.name)
+        self.settings.mount_statics('/%s/statics' % self.name, self.root.joinpath('statics'),
+                                    self.name, '%s.statics' % self.name)
 
     def version_fname(self, version: int) -> str:
         return 'version.%04u.xml' % version
@@ -4,8 +4,16 @@ from .. import SourceVersion
 from ..component import BaseComponent
 from ..settings import locate_settings
 from ..command import locate_command
+from ..utils import Context
 
-class Component(BaseComponent): pass
+class Component(BaseComponent):
+    # the configuration rows are compacted since version 0003.
+    def data_forward(self, context: Context, version0: int, version1: int) -> None:
+        from .models import Configuration
+        if version0 < 3 <= version1: Configuration.compact_rows(context)
+    def data_backward(self, context: Context, version0: int, version1: int) -> None:
+        from .models import Configuration
+        if version1 < 3 <= version0: Configuration.expand_rows(context)
 
 def execute_from_command_line(
         source_root: Path, sandbox_root: Path,
@@ -1,36 +1,56 @@
 from argparse import Namespace
-from asyncio import sleep as aiosleep
+from asyncio import sleep as aiosleep, to_thread
 from datetime import datetime, timedelta
-from ...cron import BaseCronTask
+from ...cron import BaseCronTask, CronExecutors, CronLeases, CronLedger, CronScheduler
 from ...daemon import BaseDaemonWithScanCommand
 
 class Command(BaseDaemonWithScanCommand):
     help = 'run the cron tasks.'
     base_classes = [BaseCronTask]
     async def crontask_main(self, class_map: dict, namespace: Namespace):
-        func = lambda cron: (cron[0], cron[1](namespace))
-        cron_map = dict(map(func, class_map.items()))
-        while cron_map:
-            now_at = datetime.now()
-            if now_at.second == 59: fix = 1000000 - now_at.microsecond
-            elif now_at.second == 0: fix = -now_at.microsecond
-            elif now_at.microsecond < 500000: fix = -now_at.microsecond
-            else: fix = 1000000 - now_at.microsecond
-            now_at += timedelta(seconds = fix / 1000000)
-            if now_at.second > 0: pass
-            else:
-                func = lambda cron: (*cron, cron[1].launch_ornot(now_at))
-                for cron_name, cron_object, plan_at in filter(func, cron_map.items()):
-                    if plan_at is None: continue
+        func = lambda cron: (cron[0], cron[1].klass.post_setup()())
+        ledger = CronLedger(self.settings) if self.settings.cron_ledger else None
+        last_plan_ats = None if ledger is None else await to_thread(ledger.last_plan_ats)
+        scheduler = CronScheduler(
+            dict(map(func, class_map.items())), datetime.now(), last_plan_ats)
+        executors = CronExecutors(self.settings)
+        if not self.settings.cron_lease: leases = None
+        else: leases = CronLeases(self.settings, scheduler.cron_map.keys(),
+                                  self.worker_index, self.worker_count)
+        try:
+            while scheduler:
+                now_at = datetime.now()
+                if leases is not None and leases.heartbeat_at <= now_at:
+                    await to_thread(leases.heartbeat, now_at)
+                for cron_name, cron_object, plan_at, launch_ornot in scheduler.pop_due(now_at):
+                    if leases is not None and leases.owner(cron_name) != leases.node: continue
+                    elif not launch_ornot:
+                        print('Skip the missed launch: %r(%r)...' % (cron_object, plan_at))
+                        outcome = 'SKIP'
+                    elif cron_object.busy() and cron_object.cron_catchup != 'all':
+                        print('Discard the launch over concurrency %u: %r(%r)...' %
+                              (cron_object.cron_concurrency, cron_object, plan_at))
+                        outcome = 'DISCARD'
+                    elif leases is not None and\
+                         not await to_thread(leases.claim, cron_name, plan_at): continue
                     elif cron_object.busy():
-                        print('Discard the overlapped launch: %r(%r)...' %
-                              (cron_object, plan_at))
+                        print('Queue the launch: %r(%r)...' % (cron_object, plan_at))
+                        cron_object.backlog.append((cron_name, plan_at))
+                        continue
                     else:
-                        print('Launch: %r(%r)...' % (cron_object, next_plan_at))
-                        cron_object.launch_work(cron_name, plan_at, now_at)
-            func = lambda cron: cron[1].next_plan_at(now_at)
-            next_plan_at = min(map(func, cron_map.items()))
-            if next_plan_at < now_at: continue
-            sleep_period = next_plan_at - now_at
-            print('Sleep: %r...' % sleep_period)
-            await aiosleep(sleep_period.seconds)
+                        print('Launch: %r(%r)...' % (cron_object, plan_at))
+                        cron_object.launch_work(
+                            cron_name, plan_at, now_at, executors, ledger)
+                        continue
+                    if ledger is not None:
+                        await to_thread(ledger.record, cron_name, plan_at, outcome)
+                next_at = scheduler.next_plan_at()
+                if leases is not None: next_at = min(next_at, leases.heartbeat_at)
+                sleep_period = next_at - datetime.now()
+                if sleep_period <= timedelta(0): continue
+                print('Sleep: %r...' % sleep_period)
+                await aiosleep(sleep_period.total_seconds())
+        finally:
+            executors.shutdown()
+            if leases is not None: leases.close()
+            if ledger is not None: ledger.close()
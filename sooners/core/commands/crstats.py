@@ -0,0 +1,47 @@
+from argparse import ArgumentParser, Namespace
+from datetime import datetime, timedelta
+from fnmatch import fnmatch
+from ...utils import DefaultDict
+from ...command import BaseCommand
+
+def percentile(values: list[float], percent: int) -> float | None:
+    # the nearest rank of the sorted values.
+    if not values: return None
+    return values[max(0, (len(values) * percent + 99) // 100 - 1)]
+
+class Command(BaseCommand):
+    help = ('show the latency and duration percentiles of the recorded cron runs.')
+    percents = (50, 90, 99)
+    def add_arguments(self, parser: ArgumentParser) -> None:
+        super().add_arguments(parser)
+        parser.add_argument('--days', type = int, default = 7,
+                            help = 'the days of cron runs to evaluate.')
+        parser.add_argument(
+            'pattern', nargs = '*', type = str,
+            help = 'the pattern to match the name of cron task.')
+
+    def handle(self, namespace: Namespace) -> None:
+        super().handle(namespace)
+        from ..models import CronRun
+        context = self.settings.make_db_context()
+        since_at = datetime.now() - timedelta(days = namespace.days)
+        runs = DefaultDict(lambda name: list())
+        for run in CronRun.runs_since(since_at, context.default.session):
+            if not namespace.pattern or\
+               any(map(lambda pattern: fnmatch(run.name, pattern), namespace.pattern)):
+                runs[run.name].append(run)
+        context.default.session.close()
+        for name, name_runs in sorted(runs.items()):
+            outcomes = DefaultDict(lambda outcome: 0)
+            for run in name_runs: outcomes[run.outcome.name] += 1
+            self.prompt('%s: %s.' % (name, ', '.join(map(
+                lambda item: '%s=%u' % item, sorted(outcomes.items())))), opts = ('bold',))
+            func = lambda value: ' ' * 9 + '-' if value is None else '%9.3fs' % value
+            for label, values in (
+                    ('latency', filter(None.__ne__, map(CronRun.latency, name_runs))),
+                    ('duration', filter(None.__ne__, map(lambda run: run.duration, name_runs)))):
+                values = sorted(values)
+                self.prompt('    %-8s %s' % (label, ' '.join(map(
+                    lambda percent: 'p%u=%s' % (percent, func(percentile(values, percent))),
+                    self.percents))))
+        if not runs: self.prompt1('No cron run recorded in %u days.' % namespace.days)
@@ -1,6 +1,6 @@
 from argparse import ArgumentParser, Namespace
 from importlib import import_module
-from ...command import BaseCommand, locate_command
+from ...command import BaseCommand, CommandIndex, locate_command
 from ...component import BaseComponent
 
 class Command(BaseCommand):
@@ -13,10 +13,7 @@ class Command(BaseCommand):
             command = locate_command(self.settings, namespace.command)
             command.make_parser().print_help()
         else:
-            commands = list()
-            for component in self.settings.components.values():
-                func = lambda ctx: (ctx.component.name, ctx.name, ctx.klass.help)
-                commands.extend(map(func, BaseCommand.scan_component(component)))
+            commands = list(CommandIndex(self.settings).commands())
             maxlen0 = max(map(lambda command: len(command[0]), commands))
             maxlen1 = max(map(lambda command: len(command[1]), commands))
             fmtstr = ':'.join(('%%%us' % maxlen0, '%%%us' % maxlen1, '  %s'))
@@ -8,6 +8,8 @@ class BaseMilestoneCommand(BaseCommand):
         super().add_arguments(parser)
         parser.add_argument('--show', action = 'store_true',
                             help = 'show the step of the specified milestone')
+        parser.add_argument('--plan', action = 'store_true',
+                            help = 'show the operations with estimated cost and lock, not do it')
         parser.add_argument('--confirm', action = 'store_true',
                             help = 'confirm before every step')
         parser.add_argument('--no-action', action = 'store_true',
@@ -33,4 +35,7 @@ class BaseMilestoneCommand(BaseCommand):
                 debug_schema = namespace.debug_schema,
                 exctype = self.exctype, prompt = self.prompt)
             patterns = MilestoneStepPatterns(namespace.confirm, *namespace.patterns)
-            self.sub_handle(module.milestone, patterns, context)
+            if not namespace.plan: self.sub_handle(module.milestone, patterns, context)
+            else:
+                plan = module.milestone.plan(patterns, context, self.direction)
+                for line in plan.show(): self.prompt(line)
@@ -1,11 +1,35 @@
 from argparse import Namespace
+from gc import collect, freeze
+from os import environ, listdir, makedirs
+from signal import SIGTERM
+from sys import exit, stderr
 from gunicorn import debug, util
+from gunicorn.arbiter import Arbiter
 from gunicorn.config import KNOWN_SETTINGS
 from gunicorn.app.base import BaseApplication
 
+class SoonersArbiter(Arbiter):
+    def __init__(self, app):
+        super().__init__(app)
+        self.retiring_pids = set()
+    def manage_workers(self):
+        # the workers not ready yet are retired before the oldest ready ones, so the
+        # SIGTTOUs of an aborted reload leave the old workers serving.
+        if len(self.WORKERS) <= self.num_workers or\
+           (ready_dir := environ.get('SOONERS_READY_DIR')) is None:
+            return super().manage_workers()
+        ready_pids = set(map(int, filter(str.isdigit, listdir(ready_dir))))
+        self.retiring_pids &= set(self.WORKERS.keys())
+        func = lambda item: (item[0] not in self.retiring_pids, item[0] in ready_pids,
+                             item[1].age)
+        workers = sorted(self.WORKERS.items(), key = func)
+        for pid, worker in workers[:len(workers) - self.num_workers]:
+            self.retiring_pids.add(pid)
+            self.kill_worker(pid, SIGTERM)
+
 class SoonersApplication(BaseApplication):
     def __init__(self, namespace: Namespace, settings, **kws):
-        self.namespace, self.settings = namespace, settings
+        self.namespace, self.settings, self.post_fork_config = namespace, settings, None
         super().__init__(**kws)
     def load_config(self):
         server_config = self.settings.servers[self.namespace.server]
@@ -14,11 +38,11 @@ class SoonersApplication(BaseApplication):
         cutoff_fields = ('config', 'wsgi_app', 'host', 'port')
         override_fields = dict(
             bind = [':'.join([host, str(port)]), *server_config.get('bind', ())],
-            daemon = True, chdir = self.settings.source_root,
-            accesslog = self.settings.logs_dir.joinpath('%s.access' % self.namespace.server),
-            errorlog = self.settings.logs_dir.joinpath('%s.error' % self.namespace.server),
-            pidfile = self.settings.logs_dir.joinpath('%s.pid' % self.namespace.server),
-            tmp_upload_dir = self.settings.sandbox_root.joinpath('uploads'))
+            daemon = True, chdir = str(self.settings.source_root),
+            accesslog = str(self.settings.logs_dir.joinpath('%s.access' % self.namespace.server)),
+            errorlog = str(self.settings.logs_dir.joinpath('%s.error' % self.namespace.server)),
+            pidfile = str(self.settings.servers.pid_fpath(self.namespace.server)),
+            tmp_upload_dir = str(self.settings.sandbox_root.joinpath('uploads')))
         default_fields = dict(
             worker_class = 'uvicorn.workers.UvicornWorker',
             workers = 4, threads = 4, proc_name = self.namespace.server)
@@ -31,8 +55,39 @@ class SoonersApplication(BaseApplication):
                 self.cfg.set(setting.name, value)
             elif setting.name in server_config:
                 self.cfg.set(setting.name, server_config[setting.name])
-    def load(self): return app_str # self.settings.app
+        ready_dir = self.settings.servers.ready_dir(self.namespace.server)
+        makedirs(ready_dir, exist_ok = True)
+        environ['SOONERS_READY_DIR'] = str(ready_dir) # inherited by the workers.
+        if self.cfg.preload_app:
+            self.post_fork_config = server_config.get('post_fork', None)
+            self.cfg.set('post_fork', self.post_fork)
+
+    def load(self):
+        if self.cfg.preload_app: return self.preload()
+        from ..server import app_str
+        return app_str # every worker boots by importing it.
+
+    def preload(self):
+        # the master boots once and the workers are forked from it: the models, the
+        # routes and the translations are shared by copy-on-write. they are frozen
+        # out of the gc, whose scans would touch and copy their pages in the workers.
+        app = self.settings.boot().app
+        collect()
+        freeze()
+        return app
+
+    def post_fork(self, server, worker) -> None:
+        # the connections pooled by the master are dropped without closing them,
+        # the engines of every worker open their own.
+        for database in self.settings.databases.values():
+            database.engine_sync.dispose(close = False)
+            database.engine.sync_engine.dispose(close = False)
+        if callable(self.post_fork_config): self.post_fork_config(server, worker)
     def run(self):
         if self.cfg.spew: debug.spew()
         if self.cfg.daemon: util.daemonize(self.cfg.enable_stdio_inheritance)
-        super().run()
+        try: SoonersArbiter(self).run()
+        except RuntimeError as exc:
+            print('\nError: %s\n' % exc, file = stderr)
+            stderr.flush()
+            exit(1)
@@ -0,0 +1,92 @@
+from argparse import ArgumentParser, Namespace
+from gzip import compress
+from hashlib import blake2b
+from importlib import import_module
+from json import dump
+from mimetypes import guess_type
+from os import makedirs
+from pathlib import Path
+from shutil import rmtree
+from typing import Iterable
+from ...command import BaseCommand
+
+class Command(BaseCommand):
+    help = ('fingerprint and precompress the statics of all components into the sandbox.')
+    compressible_types = ('application/javascript', 'application/json',
+                          'application/manifest+json', 'application/wasm',
+                          'application/xml', 'image/svg+xml')
+    min_size, min_ratio = 256, 0.9
+    suffixes = dict(br = '.br', gzip = '.gz')
+
+    def add_arguments(self, parser: ArgumentParser) -> None:
+        super().add_arguments(parser)
+        parser.add_argument(
+            '--no-brotli', action = 'store_true',
+            help = "Don't write the brotli variants even if brotli is available.")
+
+    def handle(self, namespace: Namespace) -> None:
+        super().handle(namespace)
+        self.compressors = dict(gzip = lambda body: compress(body, 9, mtime = 0))
+        if not namespace.no_brotli:
+            try: brotli = import_module('brotli')
+            except ImportError as exc: self.prompt1('brotli is not available, skipped.')
+            else: self.compressors['br'] = lambda body: brotli.compress(body, quality = 11)
+        statics_dir = self.settings.statics_dir.absolute()
+        # written aside and swapped in when completed, the servers index it at startup.
+        building_dir = statics_dir.with_name(statics_dir.name + '.building')
+        sources = tuple(self.find_mounts())
+        for target_dir in (statics_dir, building_dir):
+            for mount_name, source_dir in sources:
+                if self.overlap_ornot(target_dir, source_dir.absolute()):
+                    raise self.exctype('%s overlaps the statics of %s: %s.' % (
+                        target_dir, mount_name, source_dir))
+        if building_dir.exists(): rmtree(building_dir)
+        mounts = dict()
+        for mount_name, source_dir in sources:
+            mounts[mount_name] = entries = dict()
+            for source_fpath in sorted(source_dir.rglob('*')):
+                if not source_fpath.is_file(): continue
+                relpath = source_fpath.relative_to(source_dir).as_posix()
+                entries[relpath] = self.write_asset(
+                    source_fpath, building_dir.joinpath(mount_name), relpath)
+                self.prompt2('Written: %s/%s' % (mount_name, entries[relpath]['hashed']))
+            self.prompt0('Written: %s, %u assets.' % (mount_name, len(entries)))
+        makedirs(building_dir, exist_ok = True)
+        with building_dir.joinpath('manifest.json').open('wt', encoding = 'utf-8') as wfp:
+            dump(dict(version = 1, mounts = mounts), wfp, indent = 1, sort_keys = True)
+        if statics_dir.exists(): rmtree(statics_dir)
+        building_dir.rename(statics_dir)
+        self.prompt0('Written: %s' % statics_dir.joinpath('manifest.json'))
+
+    def find_mounts(self) -> Iterable[tuple[str, Path]]:
+        if (source_dir := self.settings.source_root.joinpath('statics')).is_dir():
+            yield 'statics', source_dir
+        for component in self.settings.components.values():
+            if (source_dir := component.root.joinpath('statics')).is_dir():
+                yield component.name, source_dir
+
+    def overlap_ornot(self, path0: Path, path1: Path) -> bool:
+        # removed and rewritten by makestatics, so path0 never holds nor is in a source.
+        return path0 == path1 or path0 in path1.parents or path1 in path0.parents
+
+    def write_asset(self, source_fpath: Path, target_dir: Path,
+                    relpath: str) -> dict[str, object]:
+        body = source_fpath.read_bytes()
+        digest = blake2b(body, digest_size = 16).hexdigest()
+        relpath = Path(relpath)
+        hashed = relpath.with_name('%s.%s%s' % (relpath.stem, digest[:8], relpath.suffix))
+        media_type = guess_type(source_fpath.name)[0] or 'application/octet-stream'
+        target_fpath = target_dir.joinpath(hashed)
+        makedirs(target_fpath.parent, exist_ok = True)
+        target_fpath.write_bytes(body)
+        encodings = dict()
+        if len(body) >= self.min_size and (media_type.startswith('text/') or
+                                           media_type in self.compressible_types):
+            for encoding, compressor in self.compressors.items():
+                # kept only when it is worth of decompression.
+                if len(compressed := compressor(body)) > len(body) * self.min_ratio: continue
+                vpath = target_fpath.with_name(target_fpath.name + self.suffixes[encoding])
+                vpath.write_bytes(compressed)
+                encodings[encoding] = len(compressed)
+        return dict(hashed = hashed.as_posix(), etag = '"%s"' % digest, size = len(body),
+                    media_type = media_type, encodings = encodings)
@@ -3,5 +3,6 @@ from .libs.milestonebase import BaseMilestoneCommand
 
 class Command(BaseMilestoneCommand):
     help = ('do milestone steps in backward direction.')
+    direction = 'backward'
     def sub_handle(self, milestone, patterns, context: Context) -> None:
         milestone.backward(patterns, context)
@@ -1,6 +1,9 @@
 from argparse import ArgumentParser, Namespace
-from os import kill
-from signal import SIGHUP, SIGINT
+from os import kill, scandir
+from pathlib import Path
+from signal import SIGHUP, SIGINT, SIGKILL, SIGTERM, SIGTTIN, SIGTTOU, SIGUSR2, SIGWINCH
+from subprocess import run
+from time import monotonic, sleep
 from ...command import BaseCommand
 
 app_str = 'sooners.serve:the_settings.app'
@@ -14,6 +17,11 @@ class Command(BaseCommand):
                             choices = ('devel', 'start', 'reload', 'stop'))
         parser.add_argument('server', help = 'the server to be used.',
                             choices = self.settings.servers.keys())
+        parser.add_argument('--ready-timeout', type = float, default = 60,
+                            help = 'seconds to wait the new workers ready on reload.')
+        parser.add_argument('--hup', action = 'store_true',
+                            help = 'reload by SIGHUP without waiting the new workers ready, '
+                            'ignored by preload_app.')
 
     def handle(self, namespace: Namespace) -> None:
         super().handle(namespace)
@@ -40,12 +48,138 @@ class Command(BaseCommand):
         SoonersApplication(namespace, self.settings).run()
 
     def on_reload(self, namespace: Namespace) -> None:
-        pidfile = self.settings.logs_dir.joinpath('%s.pid' % namespace.server)
-        kill(pid := int(pidfile.open('rt').read()), SIGHUP)
+        # the new workers are warmed up and ready before the old ones are retired, and
+        # the old ones drain their requests in graceful_timeout of the server config.
+        # the workers of preload_app are forked from the master, so the master is
+        # re-executed by SIGUSR2 to load the new code, SIGHUP or SIGTTIN would not.
+        pid = self.read_pid(namespace)
+        ready_dir = self.settings.servers.ready_dir(namespace.server)
+        server_config = self.settings.servers[namespace.server]
+        if server_config.get('preload_app', False):
+            self.reload_by_reexec(namespace, pid, ready_dir)
+        elif namespace.hup or not (old_pids := self.ready_pids(ready_dir)): kill(pid, SIGHUP)
+        else: self.reload_by_workers(namespace, pid, old_pids, ready_dir)
+
+    def reload_by_workers(self, namespace: Namespace, pid: int,
+                          old_pids: set[int], ready_dir: Path) -> None:
+        # the new workers are added by SIGTTIN and the old ones are retired by SIGTTOU.
+        kept_pids = self.worker_pids(pid) | old_pids
+        for index in range(len(old_pids)): self.signal(pid, SIGTTIN)
+        try: self.wait_ready(namespace, ready_dir, old_pids, len(old_pids))
+        except self.exctype:
+            # backed out: the arbiter retires the workers not ready first by SIGTTOU.
+            for index in range(len(old_pids)): self.signal(pid, SIGTTOU)
+            self.wait_backed_out(namespace, pid, old_pids, kept_pids)
+            raise
+        for index in range(len(old_pids)): self.signal(pid, SIGTTOU)
+        self.wait_retired(namespace, old_pids)
+
+    def reload_by_reexec(self, namespace: Namespace, pid: int, ready_dir: Path) -> None:
+        # the new master is started by SIGUSR2 with the listeners, the old workers are
+        # stopped by SIGWINCH once the new ones are ready, then the old master.
+        old_pids = self.ready_pids(ready_dir)
+        workers = self.settings.servers[namespace.server].get('workers', 4)
+        kill(pid, SIGUSR2)
+        deadline = monotonic() + namespace.ready_timeout
+        while (new_pid := self.read_new_pid(namespace, pid)) is None:
+            if monotonic() < deadline: sleep(self.poll_interval); continue
+            raise self.exctype('No new master started in %gs, reload aborted.' %
+                               namespace.ready_timeout)
+        try: self.wait_ready(namespace, ready_dir, old_pids, workers)
+        except self.exctype:
+            # backed out: the new master is stopped, the old one serves as before.
+            kill(new_pid, SIGTERM)
+            while self.alive_ornot(new_pid): sleep(self.poll_interval)
+            with self.settings.servers.pid_fpath(namespace.server).open('wt') as wfp:
+                wfp.write('%u\n' % pid)
+            raise
+        self.signal(pid, SIGWINCH)
+        self.wait_retired(namespace, old_pids)
+        kill(pid, SIGTERM)
+        # the new master renames its pid file when it is promoted by the exit of the old.
+        pid_fpath = self.settings.servers.pid_fpath(namespace.server)
+        deadline = monotonic() + self.promote_timeout
+        while self.read_pid_at(pid_fpath) != new_pid:
+            if monotonic() < deadline: sleep(self.poll_interval); continue
+            self.prompt1('The new master %u not promoted yet.' % new_pid)
+            return
+        self.prompt0('The new master %u promoted.' % new_pid)
+
+    def wait_ready(self, namespace: Namespace, ready_dir: Path,
+                   old_pids: set[int], count: int) -> None:
+        # aborted on timeout, the old workers are kept serving.
+        deadline = monotonic() + namespace.ready_timeout
+        while len(new_pids := self.ready_pids(ready_dir) - old_pids) < count:
+            if monotonic() < deadline: sleep(self.poll_interval); continue
+            raise self.exctype(
+                '%u of %u new workers ready in %gs, reload aborted with the old kept.' % (
+                    len(new_pids), count, namespace.ready_timeout))
+        self.prompt0('%u new workers ready.' % len(new_pids))
+
+    def wait_retired(self, namespace: Namespace, old_pids: set[int]) -> None:
+        server_config = self.settings.servers[namespace.server]
+        deadline = monotonic() + server_config.get('graceful_timeout', 30) + 1
+        while (draining_pids := set(filter(self.alive_ornot, old_pids))):
+            if monotonic() < deadline: sleep(self.poll_interval); continue
+            self.prompt1('%u old workers not exited yet.' % len(draining_pids))
+            return
+        self.prompt0('%u old workers retired.' % len(old_pids))
+
+    def wait_backed_out(self, namespace: Namespace, pid: int,
+                        old_pids: set[int], kept_pids: set[int]) -> None:
+        # the new workers stuck in a warmup blocking their loop are killed at last.
+        server_config, signum = self.settings.servers[namespace.server], SIGKILL
+        deadline = monotonic() + server_config.get('graceful_timeout', 30) + 1
+        while (new_pids := self.worker_pids(pid) - kept_pids):
+            if monotonic() < deadline: sleep(self.poll_interval); continue
+            elif signum is None:
+                self.prompt1('%u new workers not exited yet: %r.' % (len(new_pids), new_pids))
+                return
+            for new_pid in new_pids:
+                try: kill(new_pid, signum)
+                except ProcessLookupError as exc: pass # exited meanwhile.
+            deadline, signum = monotonic() + self.promote_timeout, None
+        if (lost_pids := set(filter(lambda old_pid: not self.alive_ornot(old_pid), old_pids))):
+            self.prompt1('%u old workers exited meanwhile: %r.' % (len(lost_pids), lost_pids))
+        else: self.prompt0('%u new workers retired, the old ones kept.' % len(old_pids))
 
     def on_stop(self, namespace: Namespace) -> None:
-        pidfile = self.settings.logs_dir.joinpath('%s.pid' % namespace.server)
-        kill(pid := int(pidfile.open('rt').read()), SIGINT)
+        kill(self.read_pid(namespace), SIGINT)
+
+    # gunicorn queues 5 signals at most, they are sent one by one.
+    signal_interval, poll_interval, promote_timeout = 0.1, 0.1, 5.0
+    def signal(self, pid: int, signum: int) -> None:
+        kill(pid, signum)
+        sleep(self.signal_interval)
+    def read_pid(self, namespace: Namespace) -> int:
+        with self.settings.servers.pid_fpath(namespace.server).open('rt') as rfp:
+            return int(rfp.read())
+    def read_pid_at(self, pid_fpath: Path) -> int | None:
+        try: return int(pid_fpath.read_text())
+        except (OSError, ValueError) as exc: return None # such as being renamed.
+    def read_new_pid(self, namespace: Namespace, old_pid: int) -> int | None:
+        # the new master writes the pid file suffixed by .2, renamed once promoted.
+        pid_fpath = self.settings.servers.pid_fpath(namespace.server)
+        for fpath in (pid_fpath.with_name(pid_fpath.name + '.2'), pid_fpath):
+            if (pid := self.read_pid_at(fpath)) is None: continue
+            elif pid != old_pid and self.alive_ornot(pid): return pid
+        return None
+    def alive_ornot(self, pid: int) -> bool:
+        try: kill(pid, 0)
+        except ProcessLookupError as exc: return False
+        return True
+    def worker_pids(self, pid: int) -> set[int]:
+        # the children of the master, by pgrep of both linux and bsd.
+        result = run(('pgrep', '-P', str(pid)), capture_output = True, text = True)
+        return set(map(int, result.stdout.split()))
+    def ready_pids(self, ready_dir: Path) -> set[int]:
+        pids = set()
+        if not ready_dir.is_dir(): return pids
+        for entry in scandir(ready_dir):
+            if not entry.name.isdigit(): continue
+            elif self.alive_ornot(pid := int(entry.name)): pids.add(pid)
+            else: Path(entry.path).unlink(missing_ok = True) # left by a dead worker.
+        return pids
 
     def show(self, namespace: Namespace) -> None:
         if not namespace.show: return
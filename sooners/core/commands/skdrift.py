@@ -0,0 +1,14 @@
+from argparse import Namespace
+from ...command import BaseCommand
+
+class Command(BaseCommand):
+    help = ('check the drift between models and the migrated database schema.')
+    def handle(self, namespace: Namespace) -> None:
+        super().handle(namespace)
+        drifts = tuple(self.settings.check_drift())
+        for drift in drifts:
+            if drift.table_name is None:
+                self.prompt('No saved fingerprints, do a migration first.', opts = ('bold',))
+            else: self.prompt('%s: %s' % (drift.table_name, drift.drift))
+        if not drifts: self.prompt1('No drift detected.')
+        else: raise self.exctype('%u drift(s) detected.' % len(drifts))
@@ -13,6 +13,10 @@ class MigrationWithdraw(Migration):
                       component: BaseComponent, dbname2key2record: DefaultDict) -> None:
         pass # fixme.
 
+    def _do_data_step(self, context: Context, component: BaseComponent,
+                      member_name: str) -> None:
+        pass # fixme.
+
 class Command(BaseSchemaCommand):
     help = ('Withdraw the broken database schema migration.')
     def sub_handle(self, context: Context, migration: MigrationWithdraw) -> None:
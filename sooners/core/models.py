@@ -1,12 +1,18 @@
+from datetime import datetime, timedelta
 from enum import Enum as PyEnum
+from typing import Iterable
+from struct import Struct
 from xml.dom.minidom import Element
-from sqlalchemy import inspect
+from zlib import compress, decompress
+from sqlalchemy import delete, insert, inspect, or_, select, update
+from sqlalchemy import func as SAFunc
 from sqlalchemy.orm import Mapped, mapped_column
-from sqlalchemy.exc import NoResultFound
+from sqlalchemy.exc import DBAPIError, IntegrityError, NoResultFound
 from ..settings import the_settings
 from ..utils import Hasher, Context, DefaultDict
-from ..db.columntypes import Boolean, BigInteger, Enum, Integer, String, SmallInteger
-from ..db.table import PrimaryKeyConstraint
+from ..db.columntypes import Boolean, BigInteger, DateTime, Enum, Float, Integer, LargeBinary
+from ..db.columntypes import String, SmallInteger
+from ..db.table import Index, PrimaryKeyConstraint
 from ..db.basemodel import intpk, BaseModel
 
 MAX_CONFIGURATION_PART = 64
@@ -14,53 +20,175 @@ MAX_COMPONENT_NAME = 64
 MAX_TABLE_NAME = 64
 MAX_OPERATED_NAME = 64
 MAX_SHARD_SUFFIX = 32
+MAX_CRON_NAME = 128
+MAX_CRON_OWNER = 64
 
 class Configuration(BaseModel):
-    class CONF_TYPE(PyEnum): SCHEMA_PARAMS_0, SCHEMA_PARAMS_1 = 0, 1
+    class exctype(Exception): pass
+    class CONF_TYPE(PyEnum):
+        SCHEMA_PARAMS_0, SCHEMA_PARAMS_1, SCHEMA_FINGERPRINTS = 0, 1, 2
     __tablename__ = 'sooners_configuration'
-    __table_args__ = dict(table_priority = 'sooners.0001')
+    __table_args__ = (
+        Index('configuration_type_order', 'conf_type', 'conf_part_order', unique = True),
+        dict(table_priority = 'sooners.0001'))
     id: Mapped[intpk]
     conf_type: Mapped[CONF_TYPE] = mapped_column(Enum(CONF_TYPE, name = 'sooners_conf_type'))
     conf_part_order: Mapped[int] = mapped_column(Integer())
-    conf_part: Mapped[str] = mapped_column(String(MAX_CONFIGURATION_PART))
+    # conf_part is used by the chunked format before sooners_core version 0003 only.
+    conf_part: Mapped[str] = mapped_column(String(MAX_CONFIGURATION_PART), nullable = True)
+    conf_body: Mapped[bytes] = mapped_column(LargeBinary(), nullable = True)
+    body_header = Struct('!4sB')
+    body_magic, body_version, body_level = b'SNCF', 1, 9
     @classmethod
-    def load_configuration(cls, conf_type: CONF_TYPE, context: Context) -> str:
-        context.default.inspector.clear_cache()
-        if not context.default.inspector.has_table(cls.__tablename__): return None
-        try:
-            records = context.default.session.query(
-                cls).filter_by(conf_type = conf_type).order_by('conf_part_order')
-            return ''.join(map(lambda record: record.conf_part, records))
-        except NoResultFound as exc: return None
+    def encode_body(cls, conf: str) -> bytes:
+        header = cls.body_header.pack(cls.body_magic, cls.body_version)
+        return header + compress(conf.encode('utf-8'), cls.body_level)
+    @classmethod
+    def decode_body(cls, body: bytes) -> str:
+        magic, version = cls.body_header.unpack_from(body)
+        if magic != cls.body_magic or version != cls.body_version:
+            raise ValueError('Unsupported configuration body: %r.' % ((magic, version),))
+        return decompress(body[cls.body_header.size:]).decode('utf-8')
+
+    # database name -> layout of the table: 'chunked' before sooners_core version 0003,
+    # 'compact' before 0007 and 'upsert' since 0007. it is inspected once for each process
+    # and forgotten by the migration when it operates on the table. another process may
+    # migrate the table too, so it is inspected again when a statement does not fit it.
+    layouts = dict()
+    @classmethod
+    def layout(cls, context: Context) -> str | None:
+        database_name = context.default.default_database_name
+        if (layout := cls.layouts.get(database_name)) is not None: return layout
+        (inspector := context.default.inspector).clear_cache()
+        if not inspector.has_table(cls.__tablename__): return None
+        func = lambda item: item['name']
+        if 'conf_body' not in set(map(func, inspector.get_columns(cls.__tablename__))):
+            layout = 'chunked'
+        elif 'configuration_type_order' not in set(map(
+                func, inspector.get_indexes(cls.__tablename__))):
+            layout = 'compact'
+        else: layout = 'upsert'
+        cls.layouts[database_name] = layout
+        return layout
+    @classmethod
+    def forget_layout(cls, context: Context) -> None:
+        cls.layouts.pop(context.default.default_database_name, None)
+    @classmethod
+    def _with_layout(cls, context: Context, func: callable) -> object:
+        try: return func(cls.layout(context))
+        except DBAPIError as exc: context.default.session.rollback()
+        except cls.exctype as exc: pass
+        cls.forget_layout(context)
+        return func(cls.layout(context))
+    @classmethod
+    def _load_rows(cls, conf_type: CONF_TYPE, context: Context, compact_ornot: bool) -> tuple:
+        fields = [cls.conf_part_order, cls.conf_part]
+        if compact_ornot: fields.append(cls.conf_body)
+        statement = select(*fields).where(cls.conf_type == conf_type)
+        return tuple(context.default.session.execute(statement.order_by(cls.conf_part_order)))
+    @classmethod
+    def _rows2conf(cls, rows: tuple) -> str | None:
+        if not rows: return None
+        elif getattr(rows[0], 'conf_body', None) is not None:
+            return cls.decode_body(rows[0].conf_body)
+        elif None in map(lambda row: row.conf_part, rows):
+            raise cls.exctype('Compact rows loaded in chunked layout.')
+        return ''.join(map(lambda row: row.conf_part, rows))
+    @classmethod
+    def load_configuration(cls, conf_type: CONF_TYPE, context: Context) -> str | None:
+        func = lambda layout: None if layout is None else cls._rows2conf(
+            cls._load_rows(conf_type, context, layout != 'chunked'))
+        return cls._with_layout(context, func)
     @classmethod
     def save_configuration(cls, conf_type: CONF_TYPE, conf: str | None, context: Context,
                            operate_ornot: bool = True, commit_ornot: bool = True) -> bool:
-        context.default.inspector.clear_cache()
-        if not context.default.inspector.has_table(cls.__tablename__): return False
-        if conf is None: conf_parts = ()
-        else: conf_parts = tuple(map(
-                lambda start: conf[start: start + MAX_CONFIGURATION_PART],
-                range(0, len(conf), MAX_CONFIGURATION_PART)))
-        insert_record_dict, update_record_dict, delete_record_dict = dict(), dict(), dict()
-        for record in context.default.session.query(cls).filter_by(conf_type = conf_type):
-            if record.conf_part_order < len(conf_parts):
-                update_record_dict[record.conf_part_order] = record
-            else: delete_record_dict[record.conf_part_order] = record
-        for conf_part_order, conf_part in enumerate(conf_parts):
-            if conf_part_order in update_record_dict: continue
-            insert_record_dict[conf_part_order] = cls(
-                conf_type = conf_type,
-                conf_part_order = conf_part_order,
-                conf_part = conf_part)
-        if operate_ornot:
-            for record in insert_record_dict.values():
-                context.default.session.add(record)
-            for record in update_record_dict.values():
-                record.body_part = conf_parts[record.conf_part_order]
-            for record in delete_record_dict.values():
-                context.default.session.delete(record)
+        func = lambda layout: cls._save(conf_type, conf, context, layout, operate_ornot)
+        if not cls._with_layout(context, func): return False
         if commit_ornot: context.default.session.commit()
         return True
+    @classmethod
+    def _save(cls, conf_type: CONF_TYPE, conf: str | None, context: Context,
+              layout: str | None, operate_ornot: bool) -> bool:
+        if layout is None: return False
+        elif not operate_ornot: pass
+        elif layout == 'chunked': cls._save_chunked(conf_type, conf, context)
+        else: cls._save_compact(conf_type, conf, context, layout == 'upsert')
+        return True
+    @classmethod
+    def _save_compact(cls, conf_type: CONF_TYPE, conf: str | None, context: Context,
+                      upsert_ornot: bool) -> None:
+        # one statement for each save, the chunked rows are compacted by the patch 0003.
+        session, where = context.default.session, cls.conf_type == conf_type
+        if conf is None:
+            session.execute(delete(cls).where(where))
+            return
+        values = dict(conf_part = None, conf_body = cls.encode_body(conf))
+        if upsert_ornot:
+            database = context.settings.databases[context.default.default_database_name]
+            session.execute(database.upsert(
+                cls.__table__, ('conf_type', 'conf_part_order'),
+                dict(conf_type = conf_type, conf_part_order = 0, **values), values))
+        # no unique key to upsert on before sooners_core version 0007.
+        elif session.execute(update(cls).where(
+                where, cls.conf_part_order == 0).values(**values)).rowcount == 0:
+            session.execute(insert(cls).values(
+                conf_type = conf_type, conf_part_order = 0, **values))
+    @classmethod
+    def _save_chunked(cls, conf_type: CONF_TYPE, conf: str | None, context: Context) -> None:
+        # only used while the sooners_configuration is not patched to version 0003.
+        session, where = context.default.session, cls.conf_type == conf_type
+        session.execute(delete(cls).where(where))
+        if conf is None: return
+        func = lambda start: dict(
+            conf_type = conf_type, conf_part_order = start // MAX_CONFIGURATION_PART,
+            conf_part = conf[start: start + MAX_CONFIGURATION_PART])
+        session.execute(insert(cls.__table__),
+                        list(map(func, range(0, len(conf), MAX_CONFIGURATION_PART))))
+    @classmethod
+    def compact_rows(cls, context: Context) -> None:
+        # the data step after the patch 0002 -> 0003.
+        session, conf_parts = context.default.session, dict()
+        statement = select(cls.conf_type, cls.conf_part).where(cls.conf_body.is_(None))
+        for row in session.execute(statement.order_by(cls.conf_type, cls.conf_part_order)):
+            conf_parts.setdefault(row.conf_type, list()).append(row.conf_part)
+        for conf_type, parts in conf_parts.items():
+            session.execute(delete(cls).where(cls.conf_type == conf_type))
+            session.execute(insert(cls).values(
+                conf_type = conf_type, conf_part_order = 0,
+                conf_part = None, conf_body = cls.encode_body(''.join(parts))))
+        session.commit()
+    @classmethod
+    def expand_rows(cls, context: Context) -> None:
+        # the data step before the patch 0003 -> 0002.
+        session = context.default.session
+        statement = select(cls.conf_type, cls.conf_body).where(cls.conf_body.is_not(None))
+        for row in tuple(session.execute(statement)):
+            cls._save_chunked(row.conf_type, cls.decode_body(row.conf_body), context)
+        session.commit()
+
+    @classmethod
+    def load_fingerprints(cls, context: Context) -> dict[str, tuple[str | None, str]] | None:
+        # one query without the inspector, cheap enough for every worker at boot.
+        # the component name is None for the fingerprints saved without it.
+        try: rows = cls._load_rows(cls.CONF_TYPE.SCHEMA_FINGERPRINTS, context, True)
+        except DBAPIError as exc:
+            context.default.session.rollback()
+            return None
+        if (conf := cls._rows2conf(rows)) is None: return None
+        fingerprints = dict()
+        for line in filter(None, conf.split('\n')):
+            table_name, value = line.split('=', 1)
+            component_name, sep, fingerprint = value.rpartition(':')
+            fingerprints[table_name] = (component_name or None, fingerprint)
+        return fingerprints
+    @classmethod
+    def save_fingerprints(cls, fingerprints: dict[str, tuple[str, str]] | None,
+                          context: Context, commit_ornot: bool = True) -> bool:
+        func = lambda item: '%s=%s:%s' % (item[0], *item[1])
+        if fingerprints is None: conf = None
+        else: conf = '\n'.join(map(func, sorted(fingerprints.items())))
+        return cls.save_configuration(cls.CONF_TYPE.SCHEMA_FINGERPRINTS, conf, context,
+                                      commit_ornot = commit_ornot)
 
 class _AutoVersion(object):
     def __init__(self, context: Context) -> None:
@@ -76,6 +204,15 @@ class _AutoVersion(object):
 
 class DBSchemaVersion(BaseModel):
     @classmethod
+    def load_checksums(cls, context: Context) -> dict[str, tuple]:
+        # one query without the inspector, empty before the first migration.
+        statement = select(cls.component_name, cls.checksum0, cls.checksum1)
+        try: rows = tuple(context.default.session.execute(statement))
+        except DBAPIError as exc:
+            context.default.session.rollback()
+            return dict()
+        return dict(map(lambda row: (row.component_name, row), rows))
+    @classmethod
     def load_default_dict(cls, context: Context) -> DefaultDict:
         version_records = DefaultDict(_AutoVersion(context))
         context.default.inspector.clear_cache()
@@ -153,12 +290,18 @@ class DBSchemaVersion(BaseModel):
 
 class DBSchemaOperation(BaseModel):
     @classmethod
-    def new_by_operation(cls, component_name: str, operation):
+    def row_by_operation(cls, component_name: str, operation) -> dict[str, object]:
         names = operation.names()
-        return cls(component_name = component_name, typeid = operation.typeid,
-                   table = operation.table_name(), name0 = names[0], name1 = names[1])
+        return dict(component_name = component_name, typeid = operation.typeid,
+                    table = operation.table_name(), name0 = names[0], name1 = names[1])
+    @classmethod
+    def new_by_operation(cls, component_name: str, operation):
+        return cls(**cls.row_by_operation(component_name, operation))
     __tablename__ = 'sooners_dbschema_operation'
-    __table_args__ = dict(table_priority = 'sooners.0003')
+    __table_args__ = (
+        Index('dbschema_operation_key', 'component_name', 'typeid',
+              'table', 'name0', 'name1', unique = True),
+        dict(table_priority = 'sooners.0003'))
     __database_name_patterns__ = ('*',)
     id: Mapped[intpk]
     component_name: Mapped[str] = mapped_column(String(MAX_COMPONENT_NAME))
@@ -188,3 +331,97 @@ class ShardWeight(BaseModel):
         return '%s(%s_%s:%u)' % (self.__class__.__name__, self.name, self.suffix, self.count)
     def weight(self, max_count: int) -> int:
         return (max_count - self.count) + 1
+
+class CronLease(BaseModel):
+    # a row for each cron task: owner claimed the run planned at plan_at.
+    # a row for each crond node, named with node_prefix: alive until expire_at.
+    node_prefix = '@'
+    __tablename__ = 'sooners_cron_lease'
+    __table_args__ = dict(table_priority = 'sooners.0005')
+    name: Mapped[str] = mapped_column(String(MAX_CRON_NAME), primary_key = True)
+    owner: Mapped[str] = mapped_column(String(MAX_CRON_OWNER), nullable = True)
+    plan_at: Mapped[datetime] = mapped_column(DateTime(), nullable = True)
+    expire_at: Mapped[datetime] = mapped_column(DateTime(), nullable = True)
+    def __repr__(self) -> str:
+        return '%s(%s@%s,%r,%r)' % (self.__class__.__name__, self.name, self.owner,
+                                    self.plan_at, self.expire_at)
+
+    @classmethod
+    def _insert_or_pass(cls, session, **values: dict[str, object]) -> None:
+        # another node may insert the same row at the same time.
+        try: session.execute(insert(cls).values(**values)); session.commit()
+        except IntegrityError as exc: session.rollback()
+    @classmethod
+    def ensure_tasks(cls, names: Iterable[str], session) -> None:
+        names = set(names)
+        exists = set(session.execute(select(cls.name).where(cls.name.in_(names))).scalars())
+        for name in sorted(names - exists): cls._insert_or_pass(session, name = name)
+    @classmethod
+    def heartbeat(cls, node: str, now_at: datetime, ttl: timedelta, session) -> None:
+        name, expire_at = '%s%s' % (cls.node_prefix, node), now_at + ttl
+        statement = update(cls).where(cls.name == name).values(expire_at = expire_at)
+        if session.execute(statement).rowcount > 0: session.commit()
+        else: cls._insert_or_pass(session, name = name, owner = node, expire_at = expire_at)
+    @classmethod
+    def leave(cls, node: str, session) -> None:
+        session.execute(delete(cls).where(cls.name == '%s%s' % (cls.node_prefix, node)))
+        session.commit()
+    @classmethod
+    def alive_nodes(cls, now_at: datetime, session) -> tuple[str]:
+        statement = select(cls.owner).where(
+            cls.name.startswith(cls.node_prefix, autoescape = True), cls.expire_at > now_at)
+        return tuple(sorted(session.execute(statement).scalars()))
+    @classmethod
+    def claim(cls, name: str, node: str, plan_at: datetime, session) -> bool:
+        # only one node can move plan_at forward, so the run is done once.
+        statement = update(cls).where(
+            cls.name == name, or_(cls.plan_at.is_(None), cls.plan_at < plan_at)).values(
+                owner = node, plan_at = plan_at)
+        claimed_ornot = session.execute(statement).rowcount > 0
+        session.commit()
+        return claimed_ornot
+
+class CronRun(BaseModel):
+    # the ledger of the cron runs, written by crond.
+    class OUTCOME(PyEnum):
+        RUNNING, SUCCESS, FAILURE, DISCARD, SKIP = 0, 1, 2, 3, 4
+    __tablename__ = 'sooners_cron_run'
+    __table_args__ = (
+        Index('cron_run_plan', 'name', 'plan_at'),
+        dict(table_priority = 'sooners.0006'))
+    id: Mapped[intpk]
+    name: Mapped[str] = mapped_column(String(MAX_CRON_NAME))
+    plan_at: Mapped[datetime] = mapped_column(DateTime())
+    start_at: Mapped[datetime] = mapped_column(DateTime(), nullable = True)
+    end_at: Mapped[datetime] = mapped_column(DateTime(), nullable = True)
+    duration: Mapped[float] = mapped_column(Float(), nullable = True) # in seconds.
+    outcome: Mapped[OUTCOME] = mapped_column(Enum(OUTCOME, name = 'sooners_cron_outcome'))
+    def __repr__(self) -> str:
+        return '%s(%s@%r,%s)' % (self.__class__.__name__, self.name, self.plan_at,
+                                 self.outcome.name)
+    def latency(self) -> float | None:
+        if self.start_at is None: return None
+        return (self.start_at - self.plan_at).total_seconds()
+
+    @classmethod
+    def start(cls, name: str, plan_at: datetime, start_at: datetime | None,
+              outcome: OUTCOME, session) -> int:
+        statement = insert(cls).values(name = name, plan_at = plan_at,
+                                       start_at = start_at, outcome = outcome)
+        run_id = session.execute(statement).inserted_primary_key[0]
+        session.commit()
+        return run_id
+    @classmethod
+    def finish(cls, run_id: int, end_at: datetime, outcome: OUTCOME, session) -> None:
+        run = session.get(cls, run_id)
+        run.end_at, run.outcome = end_at, outcome
+        run.duration = (end_at - run.start_at).total_seconds()
+        session.commit()
+    @classmethod
+    def last_plan_ats(cls, session) -> dict[str, datetime]:
+        statement = select(cls.name, SAFunc.max(cls.plan_at)).group_by(cls.name)
+        return dict(map(tuple, session.execute(statement)))
+    @classmethod
+    def runs_since(cls, since_at: datetime, session) -> Iterable['CronRun']:
+        statement = select(cls).where(cls.plan_at >= since_at).order_by(cls.name, cls.plan_at)
+        return session.execute(statement).scalars()
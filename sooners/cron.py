@@ -1,22 +1,73 @@
-from datetime import date, datetime
+import asyncio
+from collections import deque
+from concurrent.futures import Executor, ProcessPoolExecutor, ThreadPoolExecutor
+from datetime import date, datetime, timedelta
+from heapq import heapify, heappop, heappush
+from itertools import count
+from multiprocessing import get_context
+from socket import gethostname
+from threading import Lock
+from typing import Iterable
+from zlib import crc32
 from .component import BaseComponentSubDirPyClass
+from .utils import Hasher
 
 class BaseCronTask(BaseComponentSubDirPyClass):
     component_subdir = 'crons'
     component_object_name = 'CronTask'
     class exctype(Exception): pass
+    # cron_executor: 'loop' awaits work in the event loop, 'thread' and 'process' run
+    # work_sync in the pools of CronExecutors. at most cron_concurrency runs at once.
+    cron_executor, cron_concurrency = 'loop', 1
+    # cron_catchup: the runs missed over cron_grace are 'skip'ped, run 'once' for the
+    # latest one, or run 'all' in order, queued in backlog over cron_concurrency.
+    # 'all' runs the latest cron_catchup_limit of them at most, the older are skipped.
+    cron_catchup, cron_grace, cron_catchup_limit = 'once', timedelta(minutes = 1), 64
     def __init__(self):
         super().__init__()
-        self.task = None
+        self.task, self.tasks, self.backlog = None, set(), deque()
+        self.executors, self.ledger = None, None
 
-    def busy(self) -> bool:
-        if self.task is None: return False
-        assert(isinstance(self.task, asyncio.Task))
-        return self.task._state == 'PENDING' and self.task.get_coro().cr_suspended
+    def busy(self) -> bool: return len(self.tasks) >= self.cron_concurrency
 
-    def launch_work(self, name: str, plan_at: datetime, now_at: datetime) -> None:
+    def launch_work(self, name: str, plan_at: datetime, now_at: datetime,
+                    executors = None, ledger = None) -> None:
+        self.executors, self.ledger = executors, ledger
         task_name = 'cron(%s@%r/%r)' % (name, plan_at, now_at)
-        self.task = asyncio.create_task(self.work(name, plan_at, now_at), name = task_name)
+        if self.cron_executor == 'loop': coroutine = self.work(name, plan_at, now_at)
+        else: coroutine = self.work_in_executor(executors, name, plan_at, now_at)
+        coroutine = self.work_recorded(coroutine, name, plan_at)
+        self.task = asyncio.create_task(coroutine, name = task_name)
+        self.tasks.add(self.task)
+        self.task.add_done_callback(self.work_done)
+
+    async def work_in_executor(self, executors, name: str,
+                               plan_at: datetime, now_at: datetime) -> object:
+        pool = executors.pool(self.cron_executor)
+        # the process pool gets the class, the instance is not shared across processes.
+        if self.cron_executor == 'thread': func, args = self.work_sync, ()
+        else: func, args = work_sync_in_process, (self.__class__,)
+        return await asyncio.get_running_loop().run_in_executor(
+            pool, func, *args, name, plan_at, now_at)
+
+    async def work_recorded(self, coroutine, name: str, plan_at: datetime) -> object:
+        if self.ledger is None: return await coroutine
+        run_id = await asyncio.to_thread(self.ledger.start, name, plan_at, datetime.now())
+        try: result = await coroutine
+        except BaseException:
+            await asyncio.to_thread(self.ledger.finish, run_id, datetime.now(), 'FAILURE')
+            raise
+        await asyncio.to_thread(self.ledger.finish, run_id, datetime.now(), 'SUCCESS')
+        return result
+
+    def work_done(self, task: asyncio.Task) -> None:
+        self.tasks.discard(task)
+        if not task.cancelled() and task.exception() is not None:
+            print('Exception in %s: %r.' % (task.get_name(), task.exception()))
+        if self.backlog and not self.busy():
+            name, plan_at = self.backlog.popleft()
+            print('Launch from backlog: %r(%r)...' % (self, plan_at))
+            self.launch_work(name, plan_at, datetime.now(), self.executors, self.ledger)
 
     async def await_work(self) -> object:
         assert(isinstance(self.task, asyncio.Task))
@@ -26,75 +77,309 @@ class BaseCronTask(BaseComponentSubDirPyClass):
     async def work(self, name: str, plan_at: datetime, now_at: datetime) -> object:
         pass # fixme.
 
+    def work_sync(self, name: str, plan_at: datetime, now_at: datetime) -> object:
+        raise NotImplementedError('work_sync must be overloaded for %r executor.' %
+                                  self.cron_executor)
+
     @classmethod
     def post_setup(cls):
-        if not hasattr(cls, 'cron_monthes'): cls.cron_monthes = range(1, 13)
-        if not hasattr(cls, 'cron_weekdays'): cls.cron_weekdays = range(7)
-        if not hasattr(cls, 'cron_hours'): cls.cron_hours = range(24)
-        if not hasattr(cls, 'cron_minutes'): cls.cron_minutes = range(60)
+        if cls.cron_executor not in ('loop', 'thread', 'process'):
+            raise cls.exctype('Unsupported cron_executor %r of %r.' % (cls.cron_executor, cls))
+        elif cls.cron_concurrency < 1:
+            raise cls.exctype('cron_concurrency of %r must be positive.' % cls)
+        elif cls.cron_catchup not in ('skip', 'once', 'all'):
+            raise cls.exctype('Unsupported cron_catchup %r of %r.' % (cls.cron_catchup, cls))
+        elif cls.cron_catchup_limit < 1:
+            raise cls.exctype('cron_catchup_limit of %r must be positive.' % cls)
+        # the fields are compiled into bitmasks, bit n is set when value n is planned.
+        # cron_expr is the crontab syntax: minute hour day month weekday.
+        if hasattr(cls, 'cron_expr'):
+            for field, text in zip(cron_fields, cls.cron_expr.split(), strict = True):
+                setattr(cls, field.mask_name, field.parse(text))
+        for field in cron_fields:
+            if field.mask_name in cls.__dict__: pass
+            elif hasattr(cls, field.name):
+                setattr(cls, field.mask_name, field.compile(getattr(cls, field.name)))
+            else: setattr(cls, field.mask_name, field.full_mask)
+            if not getattr(cls, field.mask_name) & field.full_mask:
+                raise cls.exctype('Nothing planned in %s of %r.' % (field.name, cls))
+            setattr(cls, field.name, field.values(getattr(cls, field.mask_name)))
         return cls
 
-    @classmethod
-    def get_cron_days(cls, now_at):
-        if now_at.month in (1, 3, 5, 7, 8, 10, 12): lastday = 31
-        elif now_at.month in (4, 6, 9, 11): lastday = 30
-        else: lastday = (date(now_at.year, 3, 1) - date(now_at.year, 2, 1)).days
-        func = lambda day: day <= lastday
-        return filter(func, getattr(cls, 'cron_days', range(1, 32)))
-
     @classmethod
     def launch_ornot(cls, now_at: datetime) -> datetime | None:
-        assert(now_at.microsecond == 0)
-        if now_at.second != 0: return None
-        if now_at.minute not in cls.cron_minutes(): return None
-        elif now_at.hour not in cls.cron_hours(): return None
-        elif now_at.weekday() not in cls.cron_weekdays(): return None
-        elif now_at.day not in cls.get_cron_days(now_at): return None
-        elif now_at.month not in cls.cron_monthes(now_at): return None
+        if now_at.second != 0 or now_at.microsecond != 0: return None
+        elif not cls.cron_minutes_mask >> now_at.minute & 1: return None
+        elif not cls.cron_hours_mask >> now_at.hour & 1: return None
+        elif not cls.cron_days_mask >> now_at.day & 1: return None
+        elif not cls.cron_monthes_mask >> now_at.month & 1: return None
+        elif not cls.cron_weekdays_mask >> now_at.weekday() & 1: return None
         return now_at
 
+    @classmethod
+    def month_days_mask(cls, year: int, month: int) -> int:
+        # the planned days of the month, both cron_days and cron_weekdays matched.
+        weekday0 = date(year, month, 1).weekday()
+        if month == 12: lastday = 31
+        else: lastday = (date(year, month + 1, 1) - date(year, month, 1)).days
+        weekdays_mask, weekly = 0, 0x10204081 # bits 0, 7, 14, 21, 28.
+        for weekday in range(7):
+            if cls.cron_weekdays_mask >> weekday & 1:
+                weekdays_mask |= weekly << ((weekday - weekday0) % 7 + 1)
+        return cls.cron_days_mask & weekdays_mask & ((1 << (lastday + 1)) - 2)
+
     @classmethod
     def next_plan_at(cls, now_at: datetime) -> datetime:
-        while True:
-            if now_at.month in cls.cron_monthes and\
-               (next_plan_at := cls._next_plan_at_day(now_at)) is not None:
-                return next_plan_at
-            next_month = cls._first_bigger(now_at.month, cls.cron_monthes)
-            if next_month is None:
-                now_at = datetime(now_at.year + 1, cls.cron_monthes[0], 1, 0, 0, 0)
-            else: now_at = datetime(now_at.year, next_month, 1, 0, 0, 0)
+        # the first planned minute after now_at, so the searched minute is inclusive.
+        now_at = now_at.replace(second = 0, microsecond = 0) + timedelta(minutes = 1)
+        year, month, day, hour, minute = (
+            now_at.year, now_at.month, now_at.day, now_at.hour, now_at.minute)
+        while year <= now_at.year + 28: # the calendar repeats in 28 years.
+            if (next_month := next_bit(cls.cron_monthes_mask, month)) is None:
+                year, month, day, hour, minute = year + 1, 1, 1, 0, 0
+                continue
+            elif next_month != month: month, day, hour, minute = next_month, 1, 0, 0
+            if (next_day := next_bit(cls.month_days_mask(year, month), day)) is None:
+                month, day, hour, minute = month + 1, 1, 0, 0
+                continue
+            elif next_day != day: day, hour, minute = next_day, 0, 0
+            if (next_hour := next_bit(cls.cron_hours_mask, hour)) is None:
+                day, hour, minute = day + 1, 0, 0
+                continue
+            elif next_hour != hour: hour, minute = next_hour, 0
+            if (next_minute := next_bit(cls.cron_minutes_mask, minute)) is None:
+                hour, minute = hour + 1, 0
+                continue
+            return datetime(year, month, day, hour, next_minute, 0)
+        raise cls.exctype('Nothing planned in 28 years after %r of %r.' % (now_at, cls))
 
     @classmethod
-    def _next_plan_at_day(cls, now_at: datetime) -> datetime | None:
-        cron_days = tuple(cls.get_cron_days(now_at))
-        while True:
-            if now_at.day in cron_days and now_at.weekday() in cls.cron_weekdays and\
-               (next_plan_at := cls._next_plan_at_hour(now_at)) is not None:
-                return next_plan_at
-            while True:
-                next_day = cls._first_bigger(now_at.day, cron_days)
-                if next_day is None: return None
-                now_at = datetime(now_at.year, now_at.month, next_day, 0, 0, 0)
-                if now_at.weekday() in cls.cron_weekdays: break
+    def prev_plan_at(cls, now_at: datetime) -> datetime:
+        # the last planned minute not after now_at, searched backward as next_plan_at.
+        now_at = now_at.replace(second = 0, microsecond = 0)
+        year, month, day, hour, minute = (
+            now_at.year, now_at.month, now_at.day, now_at.hour, now_at.minute)
+        while year >= now_at.year - 28:
+            if (prev_month := prev_bit(cls.cron_monthes_mask, month)) is None:
+                year, month, day, hour, minute = year - 1, 12, 31, 23, 59
+                continue
+            elif prev_month != month: month, day, hour, minute = prev_month, 31, 23, 59
+            if (prev_day := prev_bit(cls.month_days_mask(year, month), day)) is None:
+                month, day, hour, minute = month - 1, 31, 23, 59
+                continue
+            elif prev_day != day: day, hour, minute = prev_day, 23, 59
+            if (prev_hour := prev_bit(cls.cron_hours_mask, hour)) is None:
+                day, hour, minute = day - 1, 23, 59
+                continue
+            elif prev_hour != hour: hour, minute = prev_hour, 59
+            if (prev_minute := prev_bit(cls.cron_minutes_mask, minute)) is None:
+                hour, minute = hour - 1, 59
+                continue
+            return datetime(year, month, day, hour, prev_minute, 0)
+        raise cls.exctype('Nothing planned in 28 years before %r of %r.' % (now_at, cls))
 
     @classmethod
-    def _next_plan_at_hour(cls, now_at: datetime) -> datetime | None:
-        while True:
-            if now_at.hour in cls.cron_hours and\
-               (next_plan_at := cls._next_plan_at_minute(now_at)) is not None:
-                return next_plan_at
-            next_hour = cls._first_bigger(now_at.hour, cls.cron_hours)
-            if next_hour is None: return None
-            now_at = datetime(now_at.year, now_at.month, now_at.day, next_hour, 0, 0)
+    def last_plan_at(cls, plan_at: datetime, now_at: datetime) -> datetime:
+        # the latest planned minute from plan_at up to now_at.
+        return max(plan_at, cls.prev_plan_at(now_at))
 
     @classmethod
-    def _next_plan_at_minute(cls, now_at: datetime) -> datetime | None:
-        next_minute = cls._first_bigger(now_at.minute, cls.cron_minutes)
-        if next_minute is None: return None
-        return datetime(now_at.year, now_at.month, now_at.day,
-                        now_at.hour, next_minute, 0)
+    def catchup_plan_ats(cls, plan_at: datetime, now_at: datetime) -> list[datetime]:
+        # the latest cron_catchup_limit planned minutes from plan_at up to now_at, in order.
+        plan_ats = [cls.last_plan_at(plan_at, now_at)]
+        while len(plan_ats) < cls.cron_catchup_limit and plan_ats[-1] > plan_at:
+            plan_ats.append(cls.prev_plan_at(plan_ats[-1] - timedelta(minutes = 1)))
+        return plan_ats[::-1]
 
+class CronLeases(object):
+    # the crond nodes share the cron tasks by the sooners_cron_lease table: every task
+    # is owned by one alive node through rendezvous hashing, and every planned run is
+    # claimed atomically, so a run is done once even if the nodes disagree for a while.
+    # a node is a crond worker, named host:index/count, which holds the tasks of its
+    # shard only, so the rendezvous is among the nodes holding the task.
+    def __init__(self, settings, names: Iterable[str],
+                 worker_index: int = 0, worker_count: int = 1) -> None:
+        from .core.models import CronLease
+        self.model, self.context = CronLease, settings.make_db_context()
+        self.node = '%s:%u/%u' % (gethostname(), worker_index, worker_count)
+        self.ttl = settings.cron_lease_ttl
+        self.nodes, self.heartbeat_at = (self.node,), datetime.now()
+        self.model.ensure_tasks(names, self.context.default.session)
+    def __repr__(self) -> str:
+        return '%s(%s/%u)' % (self.__class__.__name__, self.node, len(self.nodes))
+
+    def heartbeat(self, now_at: datetime) -> None:
+        session = self.context.default.session
+        self.model.heartbeat(self.node, now_at, self.ttl, session)
+        self.nodes = self.model.alive_nodes(now_at, session) or (self.node,)
+        self.heartbeat_at = now_at + self.ttl / 3
     @classmethod
-    def _first_bigger(cls, value0, values):
-        for value1 in filter(lambda value1: value0 < value1, values): return value1
-        return None
+    def holds(cls, node: str, name: str) -> bool:
+        # the nodes without the shard in their names hold all of the tasks.
+        index, _, count = node.rpartition(':')[2].partition('/')
+        if not index.isdigit() or not count.isdigit(): return True
+        return crc32(name.encode('utf-8')) % int(count) == int(index)
+    def owner(self, name: str) -> str:
+        nodes = tuple(filter(lambda node: self.holds(node, name), self.nodes)) or (self.node,)
+        return max(nodes, key = lambda node: Hasher('%s/%s' % (node, name)).b64digest())
+    def claim(self, name: str, plan_at: datetime) -> bool:
+        if self.owner(name) != self.node: return False
+        return self.model.claim(name, self.node, plan_at, self.context.default.session)
+    def close(self) -> None:
+        self.model.leave(self.node, self.context.default.session)
+        self.context.default.session.close()
+
+class CronLedger(object):
+    # the runs are recorded in the sooners_cron_run table by the threads of
+    # asyncio.to_thread, so the session is locked. disabled before it is migrated.
+    def __init__(self, settings) -> None:
+        from sqlalchemy import inspect
+        from .core.models import CronRun
+        self.model, self.context, self.lock = CronRun, settings.make_db_context(), Lock()
+        bind = self.context.default.session.get_bind()
+        self.enabled = inspect(bind).has_table(self.model.__tablename__)
+    def __repr__(self) -> str:
+        return '%s(%r)' % (self.__class__.__name__, self.enabled)
+
+    def last_plan_ats(self) -> dict[str, datetime]:
+        if not self.enabled: return dict()
+        with self.lock: return self.model.last_plan_ats(self.context.default.session)
+    def start(self, name: str, plan_at: datetime, start_at: datetime) -> int | None:
+        return self.record(name, plan_at, 'RUNNING', start_at)
+    def record(self, name: str, plan_at: datetime, outcome: str,
+               start_at: datetime | None = None) -> int | None:
+        if not self.enabled: return None
+        with self.lock: return self.model.start(
+                name, plan_at, start_at, self.model.OUTCOME[outcome],
+                self.context.default.session)
+    def finish(self, run_id: int | None, end_at: datetime, outcome: str) -> None:
+        if run_id is None: return
+        with self.lock: self.model.finish(
+                run_id, end_at, self.model.OUTCOME[outcome], self.context.default.session)
+    def close(self) -> None: self.context.default.session.close()
+
+def work_sync_in_process(cron_class: type, name: str,
+                         plan_at: datetime, now_at: datetime) -> object:
+    return cron_class().work_sync(name, plan_at, now_at)
+
+class CronExecutors(object):
+    # the pools are created at the first use, sized by the settings.
+    def __init__(self, settings) -> None:
+        self.settings, self.pools = settings, dict()
+    def __repr__(self) -> str:
+        return '%s(%s)' % (self.__class__.__name__, ','.join(sorted(self.pools.keys())))
+    def pool(self, executor: str) -> Executor:
+        if executor in self.pools: return self.pools[executor]
+        elif executor == 'thread':
+            self.pools[executor] = ThreadPoolExecutor(
+                self.settings.cron_thread_workers, thread_name_prefix = 'cron')
+        elif executor == 'process':
+            # forked, so the workers share the settings set up by crond.
+            self.pools[executor] = ProcessPoolExecutor(
+                self.settings.cron_process_workers, mp_context = get_context('fork'))
+        else: raise ValueError('Unsupported executor: %r.' % executor)
+        return self.pools[executor]
+    def shutdown(self) -> None:
+        for pool in self.pools.values(): pool.shutdown(wait = True, cancel_futures = True)
+        self.pools.clear()
+
+def next_bit(mask: int, value: int) -> int | None:
+    # the smallest planned value not smaller than value.
+    if not (mask := mask >> value): return None
+    return value + (mask & -mask).bit_length() - 1
+
+def prev_bit(mask: int, value: int) -> int | None:
+    # the largest planned value not larger than value.
+    if value < 0 or not (mask := mask & ((1 << (value + 1)) - 1)): return None
+    return mask.bit_length() - 1
+
+class CronField(object):
+    def __init__(self, name: str, low: int, high: int, names: tuple[str] = ()) -> None:
+        self.name, self.mask_name, self.low, self.high = name, '%s_mask' % name, low, high
+        self.names = dict(map(lambda item: (item[1], item[0] + low), enumerate(names)))
+        self.full_mask = ((1 << (high + 1)) - 1) & ~((1 << low) - 1)
+    def __repr__(self) -> str:
+        return '%s(%s:%u-%u)' % (self.__class__.__name__, self.name, self.low, self.high)
+    def compile(self, values: Iterable[int]) -> int:
+        mask = 0
+        for value in values:
+            if value not in range(self.low, self.high + 1):
+                raise ValueError('%r out of %r.' % (value, self))
+            mask |= 1 << value
+        return mask
+    def values(self, mask: int) -> tuple[int]:
+        return tuple(filter(lambda value: mask >> value & 1, range(self.low, self.high + 1)))
+    def parse_value(self, text: str) -> int:
+        if text.lower() in self.names: return self.names[text.lower()]
+        elif not text.isdigit(): raise ValueError('%r is not a value of %r.' % (text, self))
+        return int(text)
+    def parse(self, text: str) -> int:
+        mask = 0
+        for part in text.split(','):
+            part, step = part.split('/') if '/' in part else (part, '1')
+            if part == '*': first, last = self.low, self.high
+            elif '-' in part: first, last = map(self.parse_value, part.split('-'))
+            elif step != '1': first, last = self.parse_value(part), self.high
+            else: first = last = self.parse_value(part)
+            if not step.isdigit() or int(step) == 0:
+                raise ValueError('%r is not a step of %r.' % (step, self))
+            mask |= self.compile(map(self.convert, range(first, last + 1, int(step))))
+        return mask
+    def convert(self, value: int) -> int: return value
+
+class CronWeekdayField(CronField):
+    # crontab counts weekdays from sunday(0 or 7), datetime.weekday from monday(0).
+    def __init__(self, name: str) -> None:
+        super().__init__(name, 0, 6, ('mon', 'tue', 'wed', 'thu', 'fri', 'sat', 'sun'))
+        self.names = dict(map(lambda item: (item[0], (item[1] + 1) % 7), self.names.items()))
+    def convert(self, value: int) -> int:
+        if value not in range(8): raise ValueError('%r out of %r.' % (value, self))
+        return (value + 6) % 7
+
+cron_fields = (
+    CronField('cron_minutes', 0, 59),
+    CronField('cron_hours', 0, 23),
+    CronField('cron_days', 1, 31),
+    CronField('cron_monthes', 1, 12, ('jan', 'feb', 'mar', 'apr', 'may', 'jun',
+                                      'jul', 'aug', 'sep', 'oct', 'nov', 'dec')),
+    CronWeekdayField('cron_weekdays'))
+
+class CronScheduler(object):
+    # the cron objects are kept in a heap ordered by their next planned time,
+    # only the fired one is planned again. a restart resumes from the last plans.
+    def __init__(self, cron_map: dict[str, BaseCronTask], now_at: datetime,
+                 last_plan_ats: dict[str, datetime] | None = None) -> None:
+        self.cron_map, self.sequence = cron_map, count()
+        last_plan_ats = dict() if last_plan_ats is None else last_plan_ats
+        func = lambda name: (cron_map[name].next_plan_at(last_plan_ats.get(name, now_at)),
+                             next(self.sequence), name)
+        self.heap = list(map(func, cron_map.keys()))
+        heapify(self.heap)
+    def __bool__(self) -> bool: return bool(self.heap)
+    def __repr__(self) -> str:
+        return '%s(%u, %r)' % (self.__class__.__name__, len(self.heap), self.next_plan_at())
+
+    def next_plan_at(self) -> datetime | None: return self.heap[0][0] if self.heap else None
+    def push(self, name: str, plan_at: datetime) -> None:
+        heappush(self.heap, (plan_at, next(self.sequence), name))
+    def pop_due(self, now_at: datetime) -> Iterable[tuple[str, BaseCronTask, datetime, bool]]:
+        # yield the planned runs with launch or not, by the catch-up policy when missed.
+        while self.heap and self.heap[0][0] <= now_at:
+            plan_at, _, name = heappop(self.heap)
+            cron_object = self.cron_map[name]
+            if now_at - plan_at <= cron_object.cron_grace:
+                self.push(name, cron_object.next_plan_at(plan_at))
+                yield name, cron_object, plan_at, True
+            elif cron_object.cron_catchup == 'all':
+                # the missed runs are yielded at once, the ones over the limit skipped.
+                plan_ats = cron_object.catchup_plan_ats(plan_at, now_at)
+                self.push(name, cron_object.next_plan_at(plan_ats[-1]))
+                if plan_ats[0] != plan_at: yield name, cron_object, plan_at, False
+                for plan_at in plan_ats: yield name, cron_object, plan_at, True
+            elif cron_object.cron_catchup == 'once':
+                plan_at = cron_object.last_plan_at(plan_at, now_at)
+                self.push(name, cron_object.next_plan_at(plan_at))
+                yield name, cron_object, plan_at, True
+            else:
+                self.push(name, cron_object.next_plan_at(now_at))
+                yield name, cron_object, plan_at, False
@@ -2,12 +2,22 @@ from argparse import ArgumentParser, Namespace
 from collections import defaultdict
 from datetime import date, datetime
 from glob import glob
-from os import close, dup2, execl, fdopen, fork, getpid
-from os import kill, pipe, rename, waitpid, WNOHANG
+from importlib import import_module
+from logging import getLevelName, getLogger, Handler, LogRecord as PyLogRecord, WARNING
+from os import close, dup2, fork, getpid
+from os import kill, pipe, read, rename, unlink, waitpid, write
+from pathlib import Path
+from queue import Queue
+from selectors import DefaultSelector, EVENT_READ
 from signal import signal, SIGINT, SIGTERM
+from struct import Struct
 from sys import stdout, stderr
+from threading import Thread, Timer
+from time import monotonic
+from zlib import crc32
 from setproctitle import setproctitle
 from .settings import the_settings
+from .utils import Context
 from .command import BaseCommand
 from .component import BaseComponentFilePyClass, BaseComponentSubDirPyClass
 
@@ -25,6 +35,99 @@ class LogSwitch(object):
     def format(self) -> str:
         return '%s%s%s%s' % (self.start_mark, self.key, self.end_mark, self.body)
 
+class LogRecord(object):
+    # the framed record on the record pipe of a worker, the header is followed by
+    # the key and the body, so the guardian routes the records without parsing.
+    header = Struct('!IHBBd') # body size, key size, kind, level, timestamp.
+    MESSAGE, SWITCH, UNSWITCH = 0, 1, 2
+    @classmethod
+    def pack(cls, kind: int, level: int, timestamp: float, key: str, body: str) -> bytes:
+        key, body = key.encode('utf-8'), body.encode('utf-8')
+        return cls.header.pack(len(body), len(key), kind, level, timestamp) + key + body
+    @classmethod
+    def unpack_all(cls, buffer: bytes) -> tuple[list[tuple], bytes]:
+        # the complete records and the remaining bytes of a partial one.
+        records, offset = list(), 0
+        while len(buffer) - offset >= cls.header.size:
+            body_size, key_size, kind, level, timestamp =\
+                cls.header.unpack_from(buffer, offset)
+            key_at = offset + cls.header.size
+            body_at, end_at = key_at + key_size, key_at + key_size + body_size
+            if end_at > len(buffer): break
+            records.append((kind, level, timestamp,
+                            buffer[key_at: body_at].decode(errors = 'replace'),
+                            buffer[body_at: end_at].decode(errors = 'replace')))
+            offset = end_at
+        return records, buffer[offset:]
+
+class LogRecordHandler(Handler):
+    # the logging handler of the workers, the records are framed to the guardian.
+    # they are buffered up to flush_size bytes or flush_interval seconds, the
+    # warnings and above are sent at once.
+    def __init__(self, wpipe: int, level: int = 0, flush_size: int = 64 * 1024,
+                 flush_interval: float = 1.0) -> None:
+        super().__init__(level)
+        self.wpipe, self.flush_size, self.flush_interval = wpipe, flush_size, flush_interval
+        self.buffer, self.buffer_size, self.timer = list(), 0, None
+    def emit(self, record: PyLogRecord) -> None:
+        try: self.send(LogRecord.pack(LogRecord.MESSAGE, record.levelno, record.created,
+                                      record.name, self.format(record)),
+                       record.levelno >= WARNING)
+        except Exception: self.handleError(record)
+    def send(self, data: bytes, flush_ornot: bool = True) -> None:
+        # called with the handler locked, so the records are not interleaved.
+        self.buffer.append(data)
+        self.buffer_size += len(data)
+        if flush_ornot or self.buffer_size >= self.flush_size: self.flush_locked()
+        elif self.timer is None:
+            self.timer = Timer(self.flush_interval, self.flush)
+            self.timer.daemon = True
+            self.timer.start()
+    def flush(self) -> None:
+        self.acquire()
+        try: self.flush_locked()
+        finally: self.release()
+    def flush_locked(self) -> None:
+        if self.timer is not None: self.timer.cancel(); self.timer = None
+        if not self.buffer: return
+        view = memoryview(b''.join(self.buffer))
+        self.buffer, self.buffer_size = list(), 0
+        while view: view = view[write(self.wpipe, view): ]
+
+class LogCompressor(object):
+    # the closed logs are compressed by a thread in the guardian, the bounded queue
+    # blocks the guardian only when the thread falls far behind.
+    formats = dict(gzip = ('gzip', '.gz', 'compresslevel'),
+                   zstd = ('compression.zstd', '.zst', 'level'))
+    def __init__(self, settings) -> None:
+        if settings.log_compress_format not in self.formats:
+            raise ValueError('Unsupported log_compress_format: %r.' %
+                             settings.log_compress_format)
+        module_name, self.suffix, level_name = self.formats[settings.log_compress_format]
+        self.compress_open = import_module(module_name).open
+        self.open_kwargs = {level_name: settings.log_compress_level}
+        self.queue = Queue(settings.log_compress_queue)
+        self.thread = Thread(target = self.run, name = 'logcompress', daemon = True)
+        self.thread.start()
+    def __repr__(self) -> str:
+        return '%s(%s,%u)' % (self.__class__.__name__, self.suffix, self.queue.qsize())
+
+    def compress(self, logpath: Path) -> None: self.queue.put(logpath)
+    def close(self) -> None:
+        self.queue.put(None)
+        self.thread.join()
+
+    def run(self) -> None:
+        while (logpath := self.queue.get()) is not None:
+            temppath = logpath.with_name('%s%s.tmp' % (logpath.name, self.suffix))
+            try:
+                with logpath.open('rb') as rfp,\
+                     self.compress_open(temppath, 'wb', **self.open_kwargs) as wfp:
+                    while (block := rfp.read(1024 * 1024)): wfp.write(block)
+                rename(temppath, temppath.with_suffix(''))
+                unlink(logpath)
+            except OSError as exc: print('compress(%s): %r.' % (logpath, exc))
+
 class BaseDaemonCommand(BaseCommand):
     del_mark = 'DELETE'
     class exctype(BaseCommand.exctype): pass
@@ -47,70 +150,147 @@ class BaseDaemonCommand(BaseCommand):
                             help = 'stop the exist daemon and start a new one.')
         parser.add_argument('-d', '--daemon', action = 'store_true',
                             help = 'run in daemon mode.')
+        parser.add_argument('-w', '--workers', type = int, default = 1,
+                            help = 'the count of workers in daemon mode.')
 
     def handle(self, namespace: Namespace) -> object:
         super().handle(namespace)
         if getattr(self, 'logprefix', None) is None:
             self.logprefix = self.__module__.split('.')[-1]
+        if namespace.workers < 1: raise self.exctype('--workers must be positive.')
+        elif namespace.workers > 1 and not namespace.daemon:
+            raise self.exctype('--workers %u needs --daemon.' % namespace.workers)
         if namespace.stop or namespace.reload: self.stop_current()
         if namespace.stop: return
+        self.worker_index, self.worker_count, self.record_handler = 0, 1, None
         if not namespace.daemon: return self.daemon_handle(namespace)
         if (subpid := fork()) > 0: return
-        self.gzip_subpids = list()
+        self.compressor = LogCompressor(the_settings)
         signal(SIGTERM, self.sigterm_func)
         setproctitle('g.%s' % self.logprefix)
         self.lnhdr = 'GUARDIAN(%u)' % getpid()
         self.logopen(self.nowstr())
-        while True:
-            rpipe, wpipe = pipe()
-            subpid = fork()
-            if subpid == 0: self.worker(rpipe, wpipe, namespace) # subprocess.
-            elif self.guardian(rpipe, wpipe, subpid): continue
-            else: break
+        self.guardian(namespace)
         self.logclose()
+        self.compressor.close()
         exit(0)
 
-    def guardian(self, rpipe: int, wpipe: int, subpid: int) -> bool:
-        close(wpipe)
-        rfp, last_write_date, lsdict = fdopen(rpipe), self.curdate(), dict()
-        self.logwrite_x('subprocess %u forked at %s.' % (subpid, self.nowstr()))
-        while True:
-            func = lambda subpid: waitpid(subpid, WNOHANG)[0] == 0
-            self.gzip_subpids = list(filter(func, self.gzip_subpids))
+    def guardian(self, namespace: Namespace) -> None:
+        # the pipes of the workers are multiplexed, a crashed worker is reloaded alone.
+        self.selector, self.workers, self.stopping = DefaultSelector(), dict(), False
+        self.lsdict, self.last_write_date = dict(), self.curdate()
+        self.record_second, self.record_secstr = None, None
+        for index in range(namespace.workers): self.fork_worker(index, namespace)
+        while self.workers:
             try:
-                if not (line := rfp.readline()): break
-                lsobj, this_write_date = LogSwitch.parse(line), self.curdate()
-                if isinstance(lsobj, LogSwitch):
-                    if lsobj.body.strip() != self.del_mark: lsdict[lsobj.key] = line
-                    elif lsobj.key in lsdict: del(lsdict[lsobj.key])
-                    else: self.logwrite(line)
-                elif last_write_date < this_write_date:
-                    self.logswitch(lsdict, 'it is another date %r' % this_write_date)
-                    last_write_date = this_write_date
-                    self.logwrite(line)
-                elif self.wfp.tell() > the_settings.log_limit:
-                    self.logswitch(lsdict, 'log_limit %u reached' % the_settings.log_limit)
-                    self.logwrite(line)
-                else: self.logwrite(line)
+                # wait at most the flush interval, so the quiet log is flushed in time.
+                for key, events in self.selector.select(the_settings.log_flush_interval):
+                    worker, chunk = key.data, read(key.fd, the_settings.log_read_size)
+                    if not chunk: self.selector.unregister(key.fd)
+                    elif key.fd == worker.record_rpipe: self.recordfeed(worker, chunk)
+                    else: self.logfeed(worker, chunk)
+                    # the worker is reaped when both of the pipes are closed.
+                    if chunk or worker.rpipe in self.selector.get_map() or\
+                       worker.record_rpipe in self.selector.get_map(): continue
+                    elif (worker := self.reap_worker(worker)) is not None:
+                        self.fork_worker(worker.index, namespace)
+                self.logflush_ornot()
             except KeyboardInterrupt as exc:
-                try: kill(subpid, SIGINT)
-                except OSError as exc: reason = repr(exc)
-                else: reason = 'succ'
-                self.logwrite_x('kill(%u, %r): %s.' % (subpid, SIGINT, reason))
-                break
-        pid, status = waitpid(subpid, 0)
-        self.logwrite_x('subprocess %u exited with %r at %s.' %
-                        (subpid, (pid, status), self.nowstr()))
-        rfp.close()
-        if status == 0: return False # exit for common stop.
-        elif status == 256: return False # exception raised, exit for debug.
-        elif status == 65280: return False # for SIGINT from subpid.
-        return True # reload it.
-
-    def worker(self, rpipe: int, wpipe: int, namespace: Namespace):
+                # go on reading the pipes until all the workers exited.
+                self.stopping = True
+                for worker in self.workers.values():
+                    try: kill(worker.subpid, SIGINT)
+                    except OSError as exc: reason = repr(exc)
+                    else: reason = 'succ'
+                    self.logwrite_x('kill(%u, %r): %s.' % (worker.subpid, SIGINT, reason))
+        self.selector.close()
+
+    def fork_worker(self, index: int, namespace: Namespace) -> None:
+        # a pipe for the plain stdout and stderr, another one for the framed records.
+        (rpipe, wpipe), (record_rpipe, record_wpipe) = pipe(), pipe()
+        worker = Context(index = index, subpid = None, rpipe = rpipe, pending = b'',
+                         record_rpipe = record_rpipe, record_pending = b'')
+        worker.subpid = fork()
+        if worker.subpid == 0: self.worker(worker, wpipe, record_wpipe, namespace)
+        close(wpipe); close(record_wpipe)
+        self.workers[rpipe] = worker
+        self.selector.register(rpipe, EVENT_READ, worker)
+        self.selector.register(record_rpipe, EVENT_READ, worker)
+        self.logwrite_x('subprocess %u(%u) forked at %s.' %
+                        (worker.subpid, index, self.nowstr()))
+
+    def reap_worker(self, worker: Context) -> Context | None:
+        # return the worker to reload, None if it stopped.
+        del(self.workers[worker.rpipe])
+        if worker.pending: self.logfeed(worker, b'\n')
+        pid, status = waitpid(worker.subpid, 0)
+        self.logwrite_x('subprocess %u(%u) exited with %r at %s.' %
+                        (worker.subpid, worker.index, (pid, status), self.nowstr()))
+        close(worker.rpipe); close(worker.record_rpipe)
+        if self.stopping: return None
+        elif status == 0: return None # exit for common stop.
+        elif status == 256: return None # exception raised, exit for debug.
+        elif status == 65280: return None # for SIGINT from subpid.
+        return worker # reload it.
+
+    def logrotate_ornot(self) -> None:
+        # the rotation is checked once a chunk, not once a line.
+        if self.last_write_date < (this_write_date := self.curdate()):
+            self.logswitch(self.lsdict, 'it is another date %r' % this_write_date)
+            self.last_write_date = this_write_date
+        elif self.logsize > the_settings.log_limit:
+            self.logswitch(self.lsdict, 'log_limit %u reached' % the_settings.log_limit)
+
+    def logfeed(self, worker: Context, chunk: bytes) -> None:
+        # the complete lines of the chunk are handled in bulk, the partial one is
+        # kept for the next chunk unless it is too long.
+        head, sep, worker.pending = (worker.pending + chunk).rpartition(b'\n')
+        if len(worker.pending) > the_settings.log_read_size:
+            head, sep, worker.pending = head + sep + worker.pending, b'\n', b''
+        if not sep: return
+        text = (head + sep).decode(errors = 'replace')
+        self.logrotate_ornot()
+        if LogSwitch.start_mark not in text: return self.logwrite(text)
+        for line in map(lambda line: '%s\n' % line, text[:-1].split('\n')):
+            if not isinstance(lsobj := LogSwitch.parse(line), LogSwitch): self.logwrite(line)
+            elif lsobj.body.strip() != self.del_mark:
+                self.lsdict[(worker.index, lsobj.key)] = line
+            elif (worker.index, lsobj.key) in self.lsdict:
+                del(self.lsdict[(worker.index, lsobj.key)])
+            else: self.logwrite(line)
+
+    def recordfeed(self, worker: Context, chunk: bytes) -> None:
+        records, worker.record_pending = LogRecord.unpack_all(worker.record_pending + chunk)
+        lines = list()
+        for kind, level, timestamp, key, body in records:
+            if kind == LogRecord.SWITCH:
+                self.lsdict[(worker.index, key)] = '%s\n' % LogSwitch(key, body).format()
+            elif kind == LogRecord.UNSWITCH: self.lsdict.pop((worker.index, key), None)
+            elif level >= the_settings.log_level:
+                # strftime once a second, the microseconds are appended.
+                if (second := int(timestamp)) != self.record_second:
+                    self.record_second = second
+                    self.record_secstr = datetime.fromtimestamp(second).strftime('%Y%m%d-%H%M%S')
+                lines.append('%s.%06u %s %s: %s\n' % (
+                    self.record_secstr, (timestamp - second) * 1000000,
+                    getLevelName(level), key, body))
+        if not lines: return
+        self.logrotate_ornot()
+        self.logwrite(''.join(lines))
+
+    def worker(self, worker: Context, wpipe: int, record_wpipe: int, namespace: Namespace):
         self.wfp.close()
-        close(rpipe)
-        setproctitle('w.%s' % self.logprefix)
+        self.selector.close()
+        close(worker.rpipe); close(worker.record_rpipe)
+        for other in self.workers.values(): close(other.rpipe); close(other.record_rpipe)
+        self.worker_index, self.worker_count = worker.index, namespace.workers
+        if namespace.workers == 1: setproctitle('w.%s' % self.logprefix)
+        else: setproctitle('w%u.%s' % (worker.index, self.logprefix))
+        self.record_handler = LogRecordHandler(
+            record_wpipe, flush_size = the_settings.log_flush_size,
+            flush_interval = the_settings.log_flush_interval)
+        getLogger().addHandler(self.record_handler)
+        getLogger().setLevel(the_settings.log_level)
         dup2(wpipe, stdout.fileno())
         dup2(wpipe, stderr.fileno())
         close(wpipe)
@@ -122,7 +302,9 @@ class BaseDaemonCommand(BaseCommand):
 
     def logopen(self, nowstr: str) -> None:
         self.logfname = '%s.%s.%u.log' % (self.logprefix, nowstr, getpid())
-        self.wfp = the_settings.logs_dir.joinpath(self.logfname).open('wt')
+        self.wfp = the_settings.logs_dir.joinpath(self.logfname).open(
+            'wt', buffering = the_settings.log_flush_size)
+        self.logsize, self.unflushed, self.flushed_at = 0, 0, monotonic()
 
     def logswitch(self, lsdict: dict, prompt: str) -> None:
         nowstr = self.nowstr()
@@ -132,10 +314,21 @@ class BaseDaemonCommand(BaseCommand):
 
     def logwrite(self, msg: str) -> None:
         self.wfp.write(msg)
+        self.logsize += len(msg)
+        self.unflushed += len(msg)
+
+    def logflush_ornot(self) -> None:
+        # flush by the size or the time budget, not after every line.
+        if self.unflushed == 0: return
+        elif self.unflushed < the_settings.log_flush_size and\
+             monotonic() - self.flushed_at < the_settings.log_flush_interval: return
         self.wfp.flush()
+        self.unflushed, self.flushed_at = 0, monotonic()
 
     def logwrite_x(self, msg: str) -> None:
-        return self.logwrite('%s: %s\n' % (self.lnhdr, msg))
+        self.logwrite('%s: %s\n' % (self.lnhdr, msg))
+        self.wfp.flush()
+        self.unflushed, self.flushed_at = 0, monotonic()
 
     def logclose(self) -> None:
         logpath0 = the_settings.logs_dir.joinpath(self.logfname)
@@ -145,9 +338,7 @@ class BaseDaemonCommand(BaseCommand):
                         self.lnhdr, logpath1.relative_to(the_settings.sandbox_root)))
         self.wfp.close()
         rename(logpath0, logpath1)
-        gzip_subpid = fork()
-        if gzip_subpid == 0: execl('/bin/gzip', '/bin/gzip', '-9', logpath1)
-        elif gzip_subpid > 0: self.gzip_subpids.append(gzip_subpid)
+        self.compressor.compress(logpath1)
 
     def sigterm_func(self, signum, frame):
         raise KeyboardInterrupt('SIGTERM received.')
@@ -176,6 +367,18 @@ class BaseDaemonCommand(BaseCommand):
     def add_logswitch(self, key, body) -> str: return LogSwitch(key, body).format()
     def del_logswitch(self, key) -> str: return LogSwitch(key, self.del_mark).format()
 
+    def send_logswitch(self, key: str, body: str | None = None) -> None:
+        # by the record pipe in daemon mode, printed as the text LogSwitch otherwise.
+        if self.record_handler is None:
+            print(self.add_logswitch(key, body) if body is not None else
+                  self.del_logswitch(key))
+            return
+        kind = LogRecord.UNSWITCH if body is None else LogRecord.SWITCH
+        data = LogRecord.pack(kind, 0, datetime.now().timestamp(), key, body or '')
+        self.record_handler.acquire()
+        try: self.record_handler.send(data)
+        finally: self.record_handler.release()
+
 class BaseDaemonWithScanCommand(BaseDaemonCommand):
     component_prefix = False
     def daemon_handle(self, namespace: Namespace):
@@ -186,8 +389,12 @@ class BaseDaemonWithScanCommand(BaseDaemonCommand):
                 for component in the_settings.components.values():
                     func1 = lambda ctx: (
                         base_class.make_map_name(ctx.component, ctx.name), ctx)
+                    # the entries are sharded across the workers by the hash of names.
+                    func2 = lambda item: crc32(item[0].encode('utf-8')) %\
+                        self.worker_count == self.worker_index
                     ctxlist = base_class.scan_component(component)
-                    self.ctx_map_map[base_class.__name__].update(map(func1, ctxlist))
+                    self.ctx_map_map[base_class.__name__].update(
+                        filter(func2, map(func1, ctxlist)))
         return self.async_handle(namespace)
 
     def make_coroutines(self, namespace: Namespace):
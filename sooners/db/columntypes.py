@@ -35,6 +35,7 @@ class ColumnTypeMixin(object):
     def save_to_attrs(self) -> Iterable[tuple[str, str]]:
         yield ('type', self.__class__.__name__)
     def save_to_subeles(self, xmlele: Element) -> None: pass
+    def save_to_fingerprint(self) -> tuple: return ()
     def format(self, value: object) -> str: return repr(value)
     def parse(self, text: str) -> object: raise NotImplemented
     def equal(self, other) -> bool: return type(self) is type(other)
@@ -106,6 +107,10 @@ class Enum(SAEnum, ColumnTypeMixin):
             subxmlele.setAttribute('name', enum_value.name)
             subxmlele.setAttribute('value', repr(enum_value.value))
             xmlele.appendChild(subxmlele)
+    def save_to_fingerprint(self) -> tuple:
+        func0 = lambda enum_value: enum_value.value
+        func1 = lambda enum_value: (enum_value.name, repr(enum_value.value))
+        return tuple(map(func1, sorted(self.enum_class.__members__.values(), key = func0)))
     def format(self, value: PyEnum) -> str: return value.name
     def parse(self, text: str) -> PyEnum: return self.enum_class.__members__[text]
     def equal(self, other) -> bool:
@@ -114,8 +119,27 @@ class Enum(SAEnum, ColumnTypeMixin):
         names0 = set(self.enum_class.__members__.keys())
         names1 = set(other.enum_class.__members__.keys())
         if names0 != names1: return False
-        func = lambda name: self.enum_class[name] == other.enum_class[name]
+        func = lambda name: self.enum_class[name].value == other.enum_class[name].value
         return all(map(func, names0))
+    def extend_ornot(self, other) -> bool:
+        # only adds values to the enum other, which can be done in place.
+        if not isinstance(other, Enum) or self.name != other.name: return False
+        names0 = set(other.enum_class.__members__.keys())
+        return names0 <= set(self.enum_class.__members__.keys())
+    def alter_operation(self, prompt: callable, database_name: str, oper, other) -> bool:
+        # the values added to the native enum of postgresql in place, true if done.
+        from alembic.ddl.postgresql import PostgresqlImpl
+        if not isinstance(oper.impl, PostgresqlImpl): return False
+        elif not self.extend_ornot(other): return False
+        names0 = set(other.enum_class.__members__.keys())
+        dialect = oper.get_bind().dialect
+        preparer = dialect.preparer(dialect)
+        for name in self.enum_class.__members__.keys():
+            if name in names0: continue
+            prompt('%s@%s(%r, %r)' % ('add_enum_value', database_name, self.name, name))
+            oper.execute("ALTER TYPE %s ADD VALUE IF NOT EXISTS '%s'" % (
+                preparer.format_type(self), name.replace("'", "''")))
+        return True
     def post_operation(self, prompt: callable, database_name: str, oper) -> None:
         dialect = oper.get_bind().dialect
         # dialect.supports_native_enum can not be used yet.
@@ -174,7 +198,7 @@ class LargeBinary(SALargeBinary, ColumnTypeMixin):
         return arguments.update_by_xmlattrs(xmlele, length = int)
     def save_to_attrs(self) -> Iterable[tuple[str, str]]:
         for attr in super().save_to_attrs(): yield attr
-        yield ('length', repr(self.length))
+        if self.length is not None: yield ('length', repr(self.length))
     def format(self, value: bytes) -> str: return urlsafe_b64encode(value)
     def parse(cls, text: str) -> bytes: return urlsafe_b64decode(text)
     def equal(self, other) -> str:
@@ -2,6 +2,8 @@ from os import environ
 from pathlib import Path
 from sys import stdout
 from sqlalchemy import create_engine, MetaData, Column, String, SmallInteger, BigInteger
+from sqlalchemy import text
+from sqlalchemy.exc import DBAPIError
 from sqlalchemy.ext.declarative import declarative_base
 from sqlalchemy.ext.asyncio import create_async_engine
 
@@ -34,6 +36,21 @@ class BaseDatabase(object):
 
     def dbshellenv(self) -> dict[str, str] | None: return None
 
+    # the estimated (rows, bytes) of the table, None for unknown, used by the plan.
+    def table_stats(self, table_name: str) -> tuple[int | None, int | None]:
+        if (sql := self.table_stats_sql(table_name)) is None: return (None, None)
+        try:
+            with self.engine_sync.connect() as conn:
+                row = conn.execute(text(sql), dict(table_name = table_name)).first()
+        except DBAPIError: return (None, None)
+        return (None, None) if row is None else tuple(row)
+    def table_stats_sql(self, table_name: str) -> str | None: return None
+
+    # insert values, or update update_values of the row conflicted on the unique keys.
+    def upsert(self, table, keys: tuple[str], values: dict[str, object],
+               update_values: dict[str, object]):
+        raise NotImplementedError('upsert is not supported by %r.' % self)
+
 class DatabaseSQLite3(BaseDatabase):
     def __init__(self, name: str, dbpath: Path,
                  dbuser: str | None = None, dbpass: str | None = None,
@@ -51,6 +68,17 @@ class DatabaseSQLite3(BaseDatabase):
             urlfmt % dict(dialect = 'sqlite+aiosqlite', **urldict))
         self.engine_sync = create_engine(urlfmt % dict(dialect = 'sqlite', **urldict))
 
+    def table_stats_sql(self, table_name: str) -> str | None:
+        # dbstat is not compiled into every sqlite, table_stats gives up without it.
+        return ('SELECT (SELECT count(*) FROM "%s"), sum(pgsize) '
+                'FROM dbstat WHERE name = :table_name' % table_name.replace('"', '""'))
+
+    def upsert(self, table, keys: tuple[str], values: dict[str, object],
+               update_values: dict[str, object]):
+        from sqlalchemy.dialects.sqlite import insert
+        return insert(table).values(**values).on_conflict_do_update(
+            index_elements = keys, set_ = update_values)
+
     def dbshell(self) -> tuple[str]:
         if self.dbuser is None: return ('sqlite3', self.dbpath)
         else: raise NotImplemented('sqlite3 with user & pass is not supported yet.')
@@ -72,6 +100,16 @@ class DatabaseMySQL(BaseDatabase):
         self.engine = create_async_engine(urlfmt % dict(dialect = 'mysql+asyncmy', **urldict))
         self.engine_sync = create_engine(urlfmt % dict(dialect = 'mysql', **urldict))
 
+    def table_stats_sql(self, table_name: str) -> str | None:
+        return ('SELECT table_rows, data_length + index_length '
+                'FROM information_schema.tables '
+                'WHERE table_schema = DATABASE() AND table_name = :table_name')
+
+    def upsert(self, table, keys: tuple[str], values: dict[str, object],
+               update_values: dict[str, object]):
+        from sqlalchemy.dialects.mysql import insert
+        return insert(table).values(**values).on_duplicate_key_update(**update_values)
+
     def dbshell(self) -> tuple[str]:
         return ('mysql', '--user=%s' % self.dbuser, '--password=%s' % self.dbpass,
                 '--host=%s' % self.dbhost, '--port=%u' % self.dbport, self.dbname)
@@ -95,6 +133,16 @@ class DatabasePostgreSQL(BaseDatabase):
         self.engine_sync = create_engine(
             urlfmt % dict(dialect = 'postgresql+psycopg', **urldict))
 
+    def table_stats_sql(self, table_name: str) -> str | None:
+        return ('SELECT reltuples::bigint, pg_total_relation_size(oid) '
+                'FROM pg_class WHERE oid = to_regclass(:table_name)')
+
+    def upsert(self, table, keys: tuple[str], values: dict[str, object],
+               update_values: dict[str, object]):
+        from sqlalchemy.dialects.postgresql import insert
+        return insert(table).values(**values).on_conflict_do_update(
+            index_elements = keys, set_ = update_values)
+
     def dbshell(self) -> tuple[str]:
         dbhost, dbport = '--host=%s' % self.dbhost, '--port=%u' % self.dbport
         return ('psql', dbhost, dbport, self.dbname, self.dbuser)
@@ -15,6 +15,14 @@ class BaseMetaData(SAMetaData, SNVersionMixin, SNPatchMixin):
     def __init__(self, settings, *args, **kwargs) -> None:
         super().__init__(*args, **kwargs)
         self.settings = settings
+    def fingerprints(self) -> dict[str, tuple[str, str]]:
+        # table name -> (component name, fingerprint), the shard tables belong to
+        # the component of their shard template.
+        func0 = lambda table: getattr(table, '__shard_suffix__', '') is not None
+        func1 = lambda table: table.__component__ if getattr(table, '__component__', None)\
+            else self.tables[table.__shard_name__].__component__
+        func2 = lambda table: (table.name, (func1(table).name, table.fingerprint()))
+        return dict(map(func2, filter(func0, self.tables.values())))
 BaseMetaData.register_subtypes(Table, ShardTable)
 
 def make_patch(xmlversion0: Element, xmlversion1: Element, prompt: callable) -> Element:
@@ -1,32 +1,55 @@
 from typing import Iterable
-from ..utils import Context, DefaultDict, OrderedDict
+from sqlalchemy import insert
+from ..utils import Context, ContextCodec, DefaultDict, OrderedDict
 from ..component import BaseComponent
 from .operations import BaseOperation
 from .metadata import MetaDataSaved
+from .plan import generate_operations
 from ..core.models import Configuration, DBSchemaVersion, DBSchemaOperation
 
 class DBSchemaParams(object):
+    # params are saved as json in their own order, they are compared by the digest
+    # of their canonical json, and decoded at most once for each text.
     def __init__(self, context: Context) -> None:
-        self.params0_text = Configuration.load_configuration(
-            Configuration.CONF_TYPE.SCHEMA_PARAMS_0, context)
-        self.params1_text = Configuration.load_configuration(
-            Configuration.CONF_TYPE.SCHEMA_PARAMS_1, context)
+        self.decoded, self.digests = dict(), dict()
+        self.params0_text = self.normalize(Configuration.load_configuration(
+            Configuration.CONF_TYPE.SCHEMA_PARAMS_0, context))
+        self.params1_text = self.normalize(Configuration.load_configuration(
+            Configuration.CONF_TYPE.SCHEMA_PARAMS_1, context))
     def __repr__(self) -> str:
         text0, text1 = repr(self.params0_text), repr(self.params1_text)
         return '%s(%s,%s)' % (self.__class__.__name__, text0, text1)
-    # fixme: it is dangerous to use repr/eval, may be reimplement in another way.
-    def params0(self) -> Context | None:
-        return None if self.params0_text is None else\
-            Context(deep = True, **eval(self.params0_text))
+    def normalize(self, text: str | None) -> str | None:
+        # the legacy repr texts are converted once, and rewritten at the next save.
+        if text is None or not text.startswith('OrderedDict('): return text
+        return self.encode(ContextCodec.decode(text))
+    def encode(self, params: Context | None) -> str | None:
+        if params is None: return None
+        self.decoded[text := ContextCodec.encode(params)] = params
+        return text
+    def decode(self, text: str | None) -> Context | None:
+        if text is None: return None
+        if text not in self.decoded: self.decoded[text] = ContextCodec.decode(text)
+        return self.decoded[text]
+    def digest(self, text: str | None) -> str | None:
+        if text is None: return None
+        if text not in self.digests:
+            self.digests[text] = ContextCodec.digest(self.decode(text))
+        return self.digests[text]
+
+    def params0(self) -> Context | None: return self.decode(self.params0_text)
     def save_params0(self, params0: Context | None = None) -> None:
-        if params0 is None: self.params0_text = None
-        else: self.params0_text = repr(params0.to_dict_deep())
-    def params1(self) -> Context | None:
-        return None if self.params1_text is None else\
-            Context(deep = True, **eval(self.params1_text))
+        self.params0_text = self.encode(params0)
+    def digest0(self) -> str | None: return self.digest(self.params0_text)
+    def params1(self) -> Context | None: return self.decode(self.params1_text)
     def save_params1(self, params1: Context | None = None) -> None:
-        if params1 is None: self.params1_text = None
-        else: self.params1_text = repr(params1.to_dict_deep())
+        self.params1_text = self.encode(params1)
+    def digest1(self) -> str | None: return self.digest(self.params1_text)
+    def same_params(self) -> bool: return self.digest0() == self.digest1()
+    def same_params0(self, params0: Context | None) -> bool:
+        return self.digest0() == self.digest(self.encode(params0))
+    def same_params1(self, params1: Context | None) -> bool:
+        return self.digest1() == self.digest(self.encode(params1))
     def save_configuration(self, context: Context, commit_ornot: bool = True) -> bool:
         saved0_ornot = Configuration.save_configuration(
             Configuration.CONF_TYPE.SCHEMA_PARAMS_0, self.params0_text,
@@ -47,8 +70,47 @@ class _AutoOperations(object):
         func = lambda record: (record.key(), record)
         return dict(map(func, query.filter_by(component_name = self.component_name)))
 
+class OperationJournal(object):
+    # the records of the done operations are buffered, and flushed by one multi-row
+    # insert into the transaction of the operator at the boundaries. so the operations
+    # and their records are committed together where the ddl is transactional,
+    # elsewhere every operation is committed with its record at once.
+    def __init__(self, context: Context) -> None:
+        self.context = context
+        self.pending = DefaultDict(lambda database_name: list())
+        self.table_ornots = DefaultDict(self._has_table)
+    def __repr__(self) -> str:
+        func = lambda item: '%s:%u' % (item[0], len(item[1]))
+        return '%s(%s)' % (self.__class__.__name__, ','.join(map(func, self.pending.items())))
+    def _has_table(self, database_name: str) -> bool:
+        (inspector := self.context.inspectors[database_name]).clear_cache()
+        return inspector.has_table(DBSchemaOperation.__tablename__)
+    def transactional_ornot(self, database_name: str) -> bool:
+        return self.context.operators[database_name].impl.transactional_ddl
+
+    def append(self, operation: BaseOperation, row: dict[str, object]) -> None:
+        # the journal table itself may be created in the pending transaction.
+        if operation.oper_member == 'create_table' and\
+           operation.table.name == DBSchemaOperation.__tablename__:
+            self.table_ornots[operation.database_name] = True
+        rows = self.pending[operation.database_name]
+        if self.table_ornots[operation.database_name]:
+            rows.append(row)
+        if not self.transactional_ornot(operation.database_name):
+            self.flush(operation.database_name)
+    def flush(self, database_name: str | None = None) -> None:
+        if database_name is None: database_names = tuple(self.pending.keys())
+        elif database_name not in self.pending: return
+        else: database_names = (database_name,)
+        for database_name in database_names:
+            rows = self.pending.pop(database_name)
+            connection = self.context.operators[database_name].get_bind()
+            if rows: connection.execute(insert(DBSchemaOperation.__table__), rows)
+            connection.commit()
+
 class Migration(object):
     def __init__(self, context: Context) -> None:
+        self.journal = OperationJournal(context)
         self.params_record = DBSchemaParams(context)
         self.version_records = DBSchemaVersion.load_default_dict(context)
         self.metadata0 = self.load_metadata0(context.settings)
@@ -60,7 +122,7 @@ class Migration(object):
         return '%s(%r,%r)' % (self.__class__.__name__, self.metadata0, self.metadata1)
 
     def is_clean(self) -> bool:
-        if self.params_record.params0_text != self.params_record.params1_text: return False
+        if not self.params_record.same_params(): return False
         func = lambda version_record: version_record.is_same()
         return all(map(func, self.version_records.values()))
 
@@ -86,8 +148,8 @@ class Migration(object):
         self.xmlpatches = dict(map(func1, filter(func0, self.version_records.values())))
 
     def same_metadata0(self, metadata0: MetaDataSaved) -> bool:
-        if self.params_record.params0() != metadata0.params: return False
-        for component in metadata.components.values():
+        if not self.params_record.same_params0(metadata0.params): return False
+        for component in metadata0.components.values():
             if not self.version_records[component.name].same0(component): return False
         for version_record in self.version_records.values():
             if version_record.component_name in metadata0.components: continue
@@ -95,11 +157,11 @@ class Migration(object):
             if version_record.checksum0 is not None: return False
         return True
     def same_metadata1(self, metadata1: MetaDataSaved) -> bool:
-        if self.params_record.params1() != metadata1.params: return False
-        for component in metadata.components.values():
+        if not self.params_record.same_params1(metadata1.params): return False
+        for component in metadata1.components.values():
             if not self.version_records[component.name].same1(component): return False
         for version_record in self.version_records.values():
-            if version_record.component_name in metadata1.component: continue
+            if version_record.component_name in metadata1.components: continue
             if version_record.version1 is not None: return False
             if version_record.checksum1 is not None: return False
         return True
@@ -174,6 +236,7 @@ class Migration(object):
             for delayed_operation in self._do_operations_by_component(
                     context, component, database_names):
                 yield delayed_operation
+            self._do_data_step(context, component, 'data_forward')
         for component_name in self.metadata1.components.keys():
             component = context.settings.components[component_name]
             self._clean_operation_records(context, component, database_names)
@@ -185,6 +248,7 @@ class Migration(object):
         delayed_operations = list()
         for component_name in reversed(self.metadata0.components.keys()):
             component = context.settings.components[component_name]
+            self._do_data_step(context, component, 'data_backward')
             for delayed_operation in self._do_operations_by_component(
                     context, component, database_names):
                 yield delayed_operation
@@ -202,31 +266,47 @@ class Migration(object):
         # yield the delayed operations to the caller.
         for operation in filter(func, self._generate_operations(component)):
             if not self.do_operation_ornot(operation, dbname2key2record): continue
-            elif self._is_delay_operation(operation): yield operation
-            else: self._do_operation(context, operation, component, dbname2key2record)
+            elif not self._is_delay_operation(operation):
+                self._do_operation(context, operation, component, dbname2key2record)
+            else: self.journal.flush(); yield operation
+        self.journal.flush()
+
+    def plan_operations(self, settings, metadata1: MetaDataSaved | None
+                        ) -> tuple[BaseOperation]:
+        # the operations a migration from metadata0 to metadata1 would do, generated
+        # without saving anything. metadata1 is the metadata0 of the next plan.
+        func = lambda metadata: dict() if metadata is None else metadata.components
+        components0, components1 = func(self.metadata0), func(metadata1)
+        self.params_record.save_params1(None if metadata1 is None else metadata1.params)
+        self.metadata1, self.xmlpatches = metadata1, dict()
+        # the same component order as do_operations_forward/backward.
+        func = lambda name: name not in components1 or\
+            components1[name].version < components0[name].version
+        if any(map(func, components0.keys())): names = reversed(components0.keys())
+        else: names = components1.keys()
+        func = lambda name: tuple(self._generate_operations(settings.components[name]))
+        operations = sum(map(func, names), ())
+        self.params_record.params0_text = self.params_record.params1_text
+        self.metadata0 = metadata1
+        return operations
+
+    def _do_data_step(self, context: Context, component: BaseComponent,
+                      member_name: str) -> None:
+        # only the patches have data steps, not the creations and the drops.
+        func = lambda metadata: None if metadata is None else\
+            getattr(metadata.components.get(component.name), 'version', None)
+        version0, version1 = func(self.metadata0), func(self.metadata1)
+        if None in (version0, version1) or version0 == version1: return
+        getattr(component, member_name)(context, version0, version1)
 
     def do_operation_ornot(self, operation: BaseOperation,
                            dbname2key2record: DefaultDict) -> bool:
         return True
 
-    def _generate_operations(self, component: BaseComponent) -> tuple[BaseOperation]:
-        if self.metadata0 is None: return self.metadata1.do_create(component)
-        elif self.metadata1 is None: return self.metadata0.do_drop(component)
-        version0 = self.metadata0.components[component.name].version
-        version1 = self.metadata1.components[component.name].version
-        if version0 < version1:
-            return MetaDataSaved.do_forward(self.xmlpatches[component.name],
-                                            self.metadata0, self.metadata1)
-        elif version0 > version1:
-            return MetaDataSaved.do_backward(self.xmlpatches[component.name],
-                                             self.metadata0, self.metadata1)
-        elif self.params_record.params0 != self.params_record.params1:
-            assert(self.metadata0.components[component.name].xmlversion is
-                   self.metadata1.components[component.name].xmlversion)
-            return MetaDataSaved.do_params_update(
-                self.metadata0.components[component.name].xmlversion,
-                self.metadata0, self.metadata1)
-        return ()
+    def _generate_operations(self, component: BaseComponent) -> Iterable[BaseOperation]:
+        return generate_operations(component, self.metadata0, self.metadata1,
+                                   self.params_record.same_params(),
+                                   self.xmlpatches.get(component.name))
 
     def _is_delay_operation(self, operation: BaseOperation) -> bool:
         if operation.oper_member != 'drop_table': return False
@@ -237,8 +317,11 @@ class Migration(object):
     def _do_operation(self, context: Context, operation: BaseOperation,
                       component: BaseComponent, dbname2key2record: DefaultDict) -> None:
         if not self._before_operation(context, operation, component, dbname2key2record): return
-        operation(context.prompt, context.operators[operation.database_name])
-        self._after_operation(context, operation, component, dbname2key2record)
+        # the row is built before the ddl, which can not be journaled after it is done.
+        row = DBSchemaOperation.row_by_operation(component.name, operation)
+        operation(context.prompt, context.operators[operation.database_name],
+                  commit_ornot = False)
+        self._after_operation(context, operation, row, dbname2key2record)
 
     def _before_operation(self, context: Context, operation: BaseOperation,
                           component: BaseComponent, dbname2key2record: DefaultDict) -> bool:
@@ -254,18 +337,19 @@ class Migration(object):
             elif debug_order == 'break': raise RuntimeError('break by user.')
 
     def _after_operation(self, context: Context, operation: BaseOperation,
-                         component: BaseComponent, dbname2key2record: DefaultDict) -> None:
-        record = DBSchemaOperation.new_by_operation(component.name, operation)
-        dbname2key2record[operation.database_name][operation.key()] = record
-        (inspector := context.inspectors[operation.database_name]).clear_cache()
-        if inspector.has_table(DBSchemaOperation.__tablename__):
-            session = context.sessions[operation.database_name]
-            session.add(record)
-            session.commit()
+                         row: dict[str, object], dbname2key2record: DefaultDict) -> None:
+        record = DBSchemaOperation(**row)
+        dbname2key2record[operation.database_name][record.key()] = record
+        self.journal.append(operation, row)
+        if Configuration.__tablename__ in (operation.table_name(), *operation.names()):
+            Configuration.forget_layout(context)
         if operation.oper_member == 'create_table':
+            # the session works on another connection, so the table must be committed.
             if operation.table.name == Configuration.__tablename__:
+                self.journal.flush(operation.database_name)
                 self.params_record.save_configuration(context)
             elif operation.table.name == DBSchemaVersion.__tablename__:
+                self.journal.flush(operation.database_name)
                 DBSchemaVersion.save_default_dict(context, self.version_records)
 
     def _clean_operation_records(self, context: Context, component: BaseComponent,
@@ -285,6 +369,8 @@ class Migration(object):
             version_record.index0 = version_record.index1
             version_record.version0 = version_record.version1
             version_record.checksum0 = version_record.checksum1
+        fingerprints = None if self.metadata1 is None else self.metadata1.fingerprints()
+        Configuration.save_fingerprints(fingerprints, context, commit_ornot = False)
         self._smart_save(context)
         self.metadata0, self.xmlpatches = self.metadata1, dict()
 
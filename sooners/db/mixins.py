@@ -1,5 +1,4 @@
 from difflib import get_close_matches
-from readline import set_completer
 from typing import Iterable
 from xml.dom.minidom import Element
 from sqlalchemy import MetaData as SAMetaData
@@ -58,8 +57,9 @@ class Doubt(Exception):
         self.xmlpatch, self.subtype = xmlpatch, subtype
         self.names0, self.names1 = names0, names1
     def ask(self) -> None:
+        from ..command import set_command_completer
         completer = PatchCompleter(self.names0, self.names1)
-        set_completer(completer)
+        set_command_completer(completer)
         func = lambda xmlele: '%s(%s)' % (xmlele.nodeName, xmlele.getAttribute('name'))
         print('->'.join(map(func, xmlele_path(self.xmlpatch))))
         print('From(%s): %r' % (self.subtype.__name__, sorted(self.names0)))
@@ -182,6 +182,9 @@ class SNVersionMixin(SNBaseMixin):
             yield subobjs0
     def generate_subobjs(self, **kwargs) -> tuple[SNBaseMixin]: return ()
     def group_check(self, other) -> bool: return self.name == other.name
+    def save_to_fingerprint(self) -> tuple:
+        func = lambda column: column.name
+        return (self.__class__.__name__, self.name, tuple(map(func, self.columns)))
 
 class SNPatchMixin(SNBaseMixin):
     @classmethod
@@ -16,18 +16,22 @@ class OperationMeta(type):
         return cls
 
 class BaseOperation(object, metaclass = OperationMeta):
+    # how the operation touches the table and which lock it holds, used by the plan.
+    # kind: 'metadata' | 'scan' | 'rewrite', lock: 'none' | 'share' | 'exclusive'.
+    plan_kind, plan_lock = 'scan', 'exclusive'
     def __init__(self, database_name: str, *args) -> None:
         self.database_name = database_name
         for index, attr in enumerate(self.attrs): setattr(self, attr, args[index])
     def __repr__(self) -> str:
         names_str = ', '.join(map(lambda attr: getattr(self, attr).name, self.attrs))
         return '%s@%s(%s)' % (self.__class__.__name__, self.database_name, names_str)
-    def __call__(self, prompt: callable, oper: AlembicOperations) -> object:
+    def __call__(self, prompt: callable, oper: AlembicOperations,
+                 commit_ornot: bool = True) -> object:
         arguments = self.make_arguments(oper)
         prompt('%s@%s(%r)' % (self.oper_member, self.database_name, arguments))
         result = arguments(getattr(oper, self.oper_member))
         if callable(getattr(self, 'post_operation', None)): self.post_operation(prompt, oper)
-        oper.get_bind().commit()
+        if commit_ornot: oper.get_bind().commit()
         return result
     def table_name(self) -> str | None: return None
     def names(self) -> tuple[str | None]:
@@ -35,11 +39,14 @@ class BaseOperation(object, metaclass = OperationMeta):
                 None if len(self.attrs) < 2 else getattr(self, self.attrs[1]).name)
     def key(self) -> tuple[str | int | None]:
         return (self.typeid, self.table_name(), *self.names())
+    def plan_traits(self, dialect_name: str) -> tuple[str, str]:
+        return (self.plan_kind, self.plan_lock)
 
 
 ColumnDict = dict[str, SAColumn]
 class CreateTable(BaseOperation):
     typeid, oper_member, attrs = 1, 'create_table', ('table',)
+    plan_kind, plan_lock = 'metadata', 'none'
     def make_arguments(self, oper: AlembicOperations) -> Arguments:
         from .table import PrimaryKeyConstraint, ForeignKeyConstraint
         from .table import UniqueConstraint, CheckConstraint, Index
@@ -98,15 +105,17 @@ class CreateTable(BaseOperation):
     def _clone_index(self, index: SAIndex, column_dict: ColumnDict) -> SAIndex:
         from .table import Index
         func = lambda column: column_dict[column.name]
-        return Arguments(index.name, map(func, index.columns), unique = index.unique)(Index)
+        return Arguments(index.name, *map(func, index.columns), unique = index.unique)(Index)
 
 class RenameTable(BaseOperation):
     typeid, oper_member, attrs = 2, 'rename_table', ('table0', 'table1')
+    plan_kind = 'metadata'
     def make_arguments(self, oper: AlembicOperations) -> Arguments:
         return Arguments(self.table0.name, self.table1.name)
 
 class DropTable(BaseOperation):
     typeid, oper_member, attrs = 3, 'drop_table', ('table',)
+    plan_kind = 'metadata'
     def make_arguments(self, oper: AlembicOperations) -> Arguments:
         return Arguments(self.table.name)
     def post_operation(self, prompt: callable, oper: AlembicOperations) -> None:
@@ -119,12 +128,50 @@ class ColumnOperationMixin(object):
 
 class CreateColumn(ColumnOperationMixin, BaseOperation):
     typeid, oper_member, attrs = 4, 'add_column', ('column',)
+    plan_kind = 'metadata'
     def make_arguments(self, oper: AlembicOperations) -> Arguments:
         return Arguments(self.column.table.name, self.column)
 
 class AlterColumn(ColumnOperationMixin, BaseOperation):
     typeid, oper_member, attrs = 5, 'alter_column', ('column0', 'column1')
+    def __call__(self, prompt: callable, oper: AlembicOperations,
+                 commit_ornot: bool = True) -> object:
+        from alembic.ddl.sqlite import SQLiteImpl
+        arguments, result = self.make_arguments(oper), None
+        func = getattr(self.column1.type, 'alter_operation', None)
+        if 'type_' in arguments.kwargs and callable(func):
+            # the type altered in place, such as the values added to a native enum.
+            if func(prompt, self.database_name, oper, self.column0.type):
+                del arguments.kwargs['type_']
+        if not arguments.kwargs: pass
+        elif isinstance(oper.impl, SQLiteImpl):
+            # sqlite alters nothing in place, the table is recreated by the batch.
+            table_name, column_name = arguments.args
+            arguments = Arguments(column_name, **arguments.kwargs)
+            prompt('%s@%s(%r, %r)' % ('batch_alter_column', self.database_name,
+                                      table_name, arguments))
+            with oper.batch_alter_table(table_name) as batch_oper:
+                result = arguments(batch_oper.alter_column)
+        else:
+            prompt('%s@%s(%r)' % (self.oper_member, self.database_name, arguments))
+            result = arguments(oper.alter_column)
+        if commit_ornot: oper.get_bind().commit()
+        return result
+    def table_name(self) -> str | None: return self.column0.table.name
     def check_arguments(self) -> bool: return bool(self._make_arguments0())
+    def plan_traits(self, dialect_name: str) -> tuple[str, str]:
+        names = set(self._make_arguments0().kwargs.keys())
+        func = getattr(self.column1.type, 'extend_ornot', None)
+        # sqlite recreates the table, mysql copies it for most of the changes.
+        if dialect_name == 'sqlite': return ('rewrite', 'exclusive')
+        elif dialect_name == 'mysql':
+            if names - {'new_column_name', 'server_default', 'comment'}:
+                return ('rewrite', 'share')
+        # the values added to a native enum in place, see Enum.alter_operation.
+        elif 'type_' in names and not (callable(func) and func(self.column0.type)):
+            return ('rewrite', 'exclusive')
+        elif 'nullable' in names: return ('scan', 'exclusive')
+        return ('metadata', 'exclusive')
     def make_arguments(self, oper: Arguments) -> Arguments:
         return self._make_arguments1(self._make_arguments0(), oper)
     def _make_arguments0(self) -> Arguments:
@@ -157,6 +204,10 @@ class AlterColumn(ColumnOperationMixin, BaseOperation):
 
 class DropColumn(ColumnOperationMixin, BaseOperation):
     typeid, oper_member, attrs = 6, 'drop_column', ('column',)
+    plan_kind = 'metadata'
+    def plan_traits(self, dialect_name: str) -> tuple[str, str]:
+        if dialect_name in ('sqlite', 'mysql'): return ('rewrite', 'exclusive')
+        return super().plan_traits(dialect_name)
     def make_arguments(self, oper: AlembicOperations) -> Arguments:
         return Arguments(self.column.table.name, self.column.name)
     def post_operation(self, prompt: callable, oper: AlembicOperations) -> None:
@@ -199,11 +250,18 @@ class IndexOperationMixin(object):
 
 class CreateIndex(IndexOperationMixin, BaseOperation):
     typeid, oper_member, attrs = 15, 'create_index', ('index',)
+    plan_lock = 'share'
+    def plan_traits(self, dialect_name: str) -> tuple[str, str]:
+        # mysql builds the index online.
+        if dialect_name == 'mysql': return ('scan', 'none')
+        return super().plan_traits(dialect_name)
     def make_arguments(self, oper: AlembicOperations) -> Arguments:
         return Arguments(self.index.name, self.index.table.name,
-                         self.index.columns, unique = self.index.unique)
+                         list(map(lambda column: column.name, self.index.columns)),
+                         unique = self.index.unique)
 
 class DropIndex(IndexOperationMixin, BaseOperation):
     typeid, oper_member, attrs = 16, 'drop_index', ('index',)
+    plan_kind = 'metadata'
     def make_arguments(self, oper: AlembicOperations) -> Arguments:
         return Arguments(self.index.name, self.index.table.name)
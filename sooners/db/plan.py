@@ -0,0 +1,89 @@
+from typing import Iterable
+from xml.dom.minidom import Element
+from ..utils import Context, DefaultDict
+from ..component import BaseComponent
+from .operations import BaseOperation
+from .metadata import MetaDataSaved
+
+def generate_operations(component: BaseComponent,
+                        metadata0: MetaDataSaved | None, metadata1: MetaDataSaved | None,
+                        same_params: bool, xmlpatch: Element | None = None
+                        ) -> Iterable[BaseOperation]:
+    if metadata0 is None: return metadata1.do_create(component)
+    elif metadata1 is None: return metadata0.do_drop(component)
+    version0 = metadata0.components[component.name].version
+    version1 = metadata1.components[component.name].version
+    if version0 != version1 and xmlpatch is None:
+        xmlpatch = component.patch_parse(min(version0, version1), max(version0, version1))
+    if version0 < version1: return MetaDataSaved.do_forward(xmlpatch, metadata0, metadata1)
+    elif version0 > version1: return MetaDataSaved.do_backward(xmlpatch, metadata0, metadata1)
+    elif not same_params:
+        assert(metadata0.components[component.name].xmlversion is
+               metadata1.components[component.name].xmlversion)
+        return MetaDataSaved.do_params_update(
+            metadata0.components[component.name].xmlversion, metadata0, metadata1)
+    return ()
+
+class PlanItem(object):
+    # the cost is the estimated bytes read and written by the operation.
+    cost_factors = dict(metadata = 0, scan = 1, rewrite = 2)
+    def __init__(self, operation: BaseOperation, dialect_name: str,
+                 table_name: str | None, rows: int | None, size: int | None) -> None:
+        self.operation, self.table_name = operation, table_name
+        self.kind, self.lock = operation.plan_traits(dialect_name)
+        # negative row estimations are given by the tables never analyzed.
+        self.rows = None if rows is None or rows < 0 else int(rows)
+        self.size = None if size is None or size < 0 else int(size)
+    def __repr__(self) -> str:
+        func = lambda value: '?' if value is None else '%u' % value
+        return '%r: %s/%s lock, rows=%s, size=%s, cost=%s' % (
+            self.operation, self.kind, self.lock,
+            func(self.rows), func(self.size), func(self.cost))
+    @property
+    def cost(self) -> int | None:
+        if self.kind == 'metadata': return 0
+        elif self.size is None: return None
+        return self.size * self.cost_factors[self.kind]
+
+class MigrationPlan(object):
+    def __init__(self, settings) -> None:
+        self.settings, self.items = settings, DefaultDict(lambda database_name: list())
+        func = lambda database_name: DefaultDict(settings.databases[database_name].table_stats)
+        self.stats = DefaultDict(func)
+    def __repr__(self) -> str:
+        func = lambda item: '%s:%u' % (item[0], len(item[1]))
+        return '%s(%s)' % (self.__class__.__name__, ','.join(map(func, self.items.items())))
+
+    def append(self, operation: BaseOperation) -> PlanItem:
+        database = self.settings.databases[operation.database_name]
+        table_name = self.target_table_name(operation)
+        if table_name is None or operation.oper_member == 'create_table':
+            rows, size = None, None
+        else: rows, size = self.stats[operation.database_name][table_name]
+        item = PlanItem(operation, database.engine_sync.dialect.name, table_name, rows, size)
+        self.items[operation.database_name].append(item)
+        return item
+    def extend(self, operations: Iterable[BaseOperation]) -> None:
+        for operation in operations: self.append(operation)
+    @classmethod
+    def target_table_name(cls, operation: BaseOperation) -> str | None:
+        if (table_name := operation.table_name()) is not None: return table_name
+        elif hasattr(operation, 'table'): return operation.table.name
+        elif hasattr(operation, 'table0'): return operation.table0.name
+        return None
+
+    def summary(self, database_name: str) -> Context:
+        items = self.items[database_name]
+        func0 = lambda item: item.lock == 'exclusive'
+        func1 = lambda item: item.cost or 0
+        return Context(operations = len(items),
+                       cost = sum(map(func1, items)),
+                       exclusive_cost = sum(map(func1, filter(func0, items))),
+                       unknown = len(tuple(filter(lambda item: item.cost is None, items))))
+    def show(self) -> Iterable[str]:
+        for database_name in sorted(self.items.keys()):
+            summary = self.summary(database_name)
+            yield '%s: %u operations, cost=%u, exclusive cost=%u, %u unknown.' % (
+                database_name, summary.operations, summary.cost,
+                summary.exclusive_cost, summary.unknown)
+            for item in self.items[database_name]: yield '    %r.' % item
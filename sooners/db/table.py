@@ -8,7 +8,7 @@ from sqlalchemy import UniqueConstraint as SAUniqueConstraint
 from sqlalchemy import CheckConstraint as SACheckConstraint
 from sqlalchemy import ColumnDefault as SAColumnDefault
 from sqlalchemy import ForeignKey as SAForeignKey
-from ..utils import Context, Arguments
+from ..utils import Hasher, Context, Arguments
 from .mixins import SA2SN, SNBaseMixin, SNVersionMixin, SNPatchMixin
 from .columntypes import bool_parser, column_type_map, ColumnTypeMixin
 from .operations import BaseOperation
@@ -32,13 +32,15 @@ class ForeignKey(SAForeignKey):
             kwargs.update(ondelete = xmlele.getAttribute('ondelete'))
         return cls(column, **kwargs)
 
-    def save_to_subeles(self, xmlele: Element) -> None:
-        xmlele.appendChild(subxmlele := xmlele.ownerDocument.createElement('ForeignKey'))
+    def save_to_attrs(self) -> list[tuple[str, str]]:
         attrs = [('column', self.target_fullname)]
         if self.name is not None: attrs.append(('name', self.name))
         if self.onupdate is not None: attrs.append(('onupdate', self.onupdate))
         if self.ondelete is not None: attrs.append(('ondelete', self.ondelete))
-        tuple(map(lambda attr: subxmlele.setAttribute(attr[0], attr[1]), attrs))
+        return attrs
+    def save_to_subeles(self, xmlele: Element) -> None:
+        xmlele.appendChild(subxmlele := xmlele.ownerDocument.createElement('ForeignKey'))
+        tuple(map(lambda attr: subxmlele.setAttribute(attr[0], attr[1]), self.save_to_attrs()))
 SA2SN.register(ForeignKey)
 
 class Column(SAColumn, SNVersionMixin, SNPatchMixin):
@@ -56,10 +58,7 @@ class Column(SAColumn, SNVersionMixin, SNPatchMixin):
             nullable = bool_parser, default = column_type_object.parse)
         yield arguments(cls)
     @classmethod
-    def save_to_xmlele_open(cls, xmlele: Element,
-                            objgroup: tuple[ColumnTypeMixin], **kwargs) -> None:
-        assert(len(objgroup) == 1)
-        column = objgroup[0]
+    def save_to_attrs(cls, column: SAColumn) -> list[tuple[str, str]]:
         attrs = [('name', column.name)]
         column.type = SA2SN.cast(column.type)
         attrs.extend(list(column.type.save_to_attrs()))
@@ -70,12 +69,26 @@ class Column(SAColumn, SNVersionMixin, SNPatchMixin):
         else:
             assert(column.default.is_scalar) # support scalar now.
             attrs.append(('default', column.type.format(column.default.arg)))
-        for attrname, attrvalue in attrs: xmlele.setAttribute(attrname, attrvalue)
+        return attrs
+    @classmethod
+    def sorted_foreign_keys(cls, column: SAColumn) -> tuple[ForeignKey]:
+        func = lambda foreign_key: foreign_key.target_fullname
+        return tuple(map(SA2SN.cast, sorted(column.foreign_keys, key = func)))
+    @classmethod
+    def save_to_xmlele_open(cls, xmlele: Element,
+                            objgroup: tuple[ColumnTypeMixin], **kwargs) -> None:
+        assert(len(objgroup) == 1)
+        column = objgroup[0]
+        for attrname, attrvalue in cls.save_to_attrs(column):
+            xmlele.setAttribute(attrname, attrvalue)
         column.type.save_to_subeles(xmlele)
         tuple(map(lambda foreign_key: foreign_key.save_to_subeles(xmlele),
-                  map(lambda foreign_key: SA2SN.cast(foreign_key),
-                      sorted(column.foreign_keys,
-                             key = lambda foreign_key: foreign_key.target_fullname))))
+                  cls.sorted_foreign_keys(column)))
+    def save_to_fingerprint(self) -> tuple:
+        func = lambda foreign_key: tuple(foreign_key.save_to_attrs())
+        return (self.__class__.__name__, tuple(self.__class__.save_to_attrs(self)),
+                self.type.save_to_fingerprint(),
+                tuple(map(func, self.__class__.sorted_foreign_keys(self))))
 
     @classmethod
     def patch_forward_create(cls, xmlpatch: Element, table: SATable,
@@ -190,60 +203,80 @@ SA2SN.register(CheckConstraint)
 class Index(SAIndex, SNVersionMixin, SNPatchMixin):
     @classmethod
     def new_from_xmlele(cls, xmlele: Element, metadata: SAMetaData) -> Iterable:
-        pass # fixme.
+        func0 = lambda subnode: subnode.nodeType is subnode.ELEMENT_NODE
+        func1 = lambda subxmlele: subxmlele.nodeName == 'Column'
+        func2 = lambda subxmlele: subxmlele.getAttribute('name')
+        arguments = Arguments(xmlele.getAttribute('name'),
+                              *map(func2, filter(func1, filter(func0, xmlele.childNodes))))
+        arguments.update_by_xmlattrs(xmlele, unique = bool_parser)
+        yield arguments(cls)
     @classmethod
     def save_to_xmlele_open(cls, xmlele: Element,
                             objgroup: tuple[SNBaseMixin], **kwargs) -> None:
         assert(len(objgroup) == 1)
-        pass # fixme.
+        index = objgroup[0]
+        xmlele.setAttribute('name', index.name)
+        if index.unique: xmlele.setAttribute('unique', 'True')
+        for column in index.columns:
+            column_xmlele = xmlele.ownerDocument.createElement('Column')
+            column_xmlele.setAttribute('name', column.name)
+            xmlele.appendChild(column_xmlele)
+    def save_to_fingerprint(self) -> tuple:
+        return (*super().save_to_fingerprint(), self.unique)
+    @classmethod
+    def by_name(cls, table: SATable, name: str) -> SAIndex:
+        # table.indexes is a set, so look the index up by its name.
+        return next(filter(lambda index: index.name == name, table.indexes))
 
     @classmethod
     def patch_forward_create(cls, xmlpatch: Element, table: SATable,
                              database_name: str = None) -> Iterable:
-        index = table.indexes[xmlpatch.getAttribute('name')]
+        index = cls.by_name(table, xmlpatch.getAttribute('name'))
         yield CreateIndex(database_name, index)
     @classmethod
     def patch_forward(cls, xmlpatch: Element, table0: SATable, table1: SATable,
                       database_name: str = None) -> Iterable:
-        index0 = table0.indexes[xmlpatch.getAttribute('name')]
-        index1 = table1.indexes[xmlpatch.getAttribute('name')]
+        index0 = cls.by_name(table0, xmlpatch.getAttribute('name'))
+        index1 = cls.by_name(table1, xmlpatch.getAttribute('name'))
+        if index0.save_to_fingerprint() == index1.save_to_fingerprint(): return
         yield DropIndex(database_name, index0)
         yield CreateIndex(database_name, index1)
     @classmethod
     def patch_forward_rename(cls, xmlpatch: Element, table0: SATable, table1: SATable,
                              database_name: str = None) -> Iterable:
-        index0 = table0.indexes[xmlpatch.getAttribute('name0')]
-        index1 = table1.indexes[xmlpatch.getAttribute('name1')]
+        index0 = cls.by_name(table0, xmlpatch.getAttribute('name0'))
+        index1 = cls.by_name(table1, xmlpatch.getAttribute('name1'))
         yield DropIndex(database_name, index0)
         yield CreateIndex(database_name, index1)
     @classmethod
     def patch_forward_drop(cls, xmlpatch: Element, table: SATable,
                            database_name: str = None) -> Iterable:
-        index = table.indexes[xmlpatch.getAttribute('name')]
+        index = cls.by_name(table, xmlpatch.getAttribute('name'))
         yield DropIndex(database_name, index)
     @classmethod
     def patch_backward_create(cls, xmlpatch: Element, table: SATable,
                               database_name: str = None) -> Iterable:
-        index = table.indexes[xmlpatch.getAttribute('name')]
+        index = cls.by_name(table, xmlpatch.getAttribute('name'))
         yield DropIndex(database_name, index)
     @classmethod
     def patch_backward(cls, xmlpatch: Element, table1: SATable, table0: SATable,
                        database_name: str = None) -> Iterable:
-        index1 = table1.indexes[xmlpatch.getAttribute('name')]
-        index0 = table0.indexes[xmlpatch.getAttribute('name')]
+        index1 = cls.by_name(table1, xmlpatch.getAttribute('name'))
+        index0 = cls.by_name(table0, xmlpatch.getAttribute('name'))
+        if index1.save_to_fingerprint() == index0.save_to_fingerprint(): return
         yield DropIndex(database_name, index1)
         yield CreateIndex(database_name, index0)
     @classmethod
     def patch_backward_rename(cls, xmlpatch: Element, table1: SATable, table0: SATable,
                               database_name: str = None) -> Iterable:
-        index1 = table1.indexes[xmlpatch.getAttribute('name1')]
-        index0 = table0.indexes[xmlpatch.getAttribute('name0')]
+        index1 = cls.by_name(table1, xmlpatch.getAttribute('name1'))
+        index0 = cls.by_name(table0, xmlpatch.getAttribute('name0'))
         yield DropIndex(database_name, index1)
         yield CreateIndex(database_name, index0)
     @classmethod
     def patch_backward_drop(cls, xmlpatch: Element, table: SATable,
                             database_name: str = None) -> Iterable:
-        index = table.indexes[xmlpatch.getAttribute('name')]
+        index = cls.by_name(table, xmlpatch.getAttribute('name'))
         yield CreateIndex(database_name, index)
 SA2SN.register(Index)
 
@@ -283,6 +316,12 @@ class BaseTable(SATable, SNVersionMixin, SNPatchMixin):
         return (*self.columns,
                 *sorted(filter(func0, self.constraints), key = func1),
                 *self.indexes)
+    def fingerprint(self) -> str:
+        # a cheap checksum of what make_version would save for this table.
+        func = lambda subobj: SA2SN.cast(subobj).save_to_fingerprint()
+        database_names = tuple(sorted(getattr(self, '__database_names__', None) or ()))
+        body = (self.name, database_names, tuple(map(func, self.generate_subobjs())))
+        return Hasher(repr(body)).b64digest()
 BaseTable.register_subtypes(Column, PrimaryKeyConstraint, ForeignKeyConstraint,
                             UniqueConstraint, CheckConstraint, Index)
 
@@ -1,6 +1,8 @@
 from typing import Iterable
 from fastapi.routing import APIRouter
-from .utils import ServeVersion
+from starlette.routing import BaseRoute, Match, NoMatchFound
+from .utils import DefaultDict, ServeVersion
+from .epresponse import prevalidated, response_classes
 from .component import BaseComponentFilePyClass
 
 class EPVersionPart(object):
@@ -35,6 +37,9 @@ class EPVersion(object):
 class BaseEndpoint(BaseComponentFilePyClass):
     component_filename = 'endpoints'
     versions = (EPVersion(),)
+    cache = None # an EPCache to cache the responses of get.
+    response = None # default, fast or prevalidated, settings.endpoint_response if None.
+    hub_topics = () # the topics published to the websockets by settings.hub.
     class exctype(Exception): pass
 
     @classmethod
@@ -46,12 +51,61 @@ class BaseEndpoint(BaseComponentFilePyClass):
 
     @classmethod
     def endpoint_setup(cls, apirouter: APIRouter) -> None:
+        from .settings import the_settings
+        if (response := cls.response) is None: response = the_settings.endpoint_response
+        if response not in response_classes:
+            raise cls.exctype('Unsupported response %r of %r.' % (response, cls))
+        response_class = response_classes[response]
         for method in ('get', 'put', 'post'):
             if not callable(method_func := getattr(cls, method, None)): continue
+            response_model = method_func.__annotations__['return']
+            if response == 'prevalidated':
+                method_func = prevalidated(method_func, response_class)
+            if method == 'get' and cls.cache is not None:
+                method_func = cls.cache.wrap(cls, method_func, response_class, response_model)
             apirouter.add_api_route(
                 '/%s' % cls.path, method_func,
-                response_model = method_func.__annotations__['return'],
+                response_model = response_model, response_class = response_class,
                 methods= [method.upper()])
+        for topic in cls.hub_topics: the_settings.hub.register(topic)
         for method in ('websocket',):
             if not callable(method_func := getattr(cls, method, None)): continue
             apirouter.add_api_websocket_route('/%s' % cls.path, method_func)
+
+class EPDispatchRoute(BaseRoute):
+    # the endpoints are resolved by /v-MM.NN/component/path through dicts before the
+    # linear matching of starlette, so the routing costs the same for any versions.
+    # the routes of the endpoints are kept in the app for openapi and url_path_for.
+    def __init__(self) -> None:
+        self.exact_routes = DefaultDict(lambda key: list())
+        self.param_routes = DefaultDict(lambda key: list())
+    def __repr__(self) -> str:
+        return '%s(%u+%u)' % (self.__class__.__name__,
+                              len(self.exact_routes), len(self.param_routes))
+
+    def add(self, route: BaseRoute) -> None:
+        _, version, component_name, path = route.path.split('/', 3)
+        if '{' in path: self.param_routes[(version, component_name)].append(route)
+        else: self.exact_routes[(version, component_name, path)].append(route)
+
+    def matches(self, scope: dict) -> tuple[Match, dict]:
+        if scope['type'] not in ('http', 'websocket'): return Match.NONE, dict()
+        path, root_path = scope['path'], scope.get('root_path', '')
+        if root_path and path.startswith(root_path): path = path[len(root_path): ]
+        if len(parts := path.split('/', 3)) < 4: return Match.NONE, dict()
+        routes = self.exact_routes.get((parts[1], parts[2], parts[3]))
+        if routes is None: routes = self.param_routes.get((parts[1], parts[2]), ())
+        partial = None
+        for route in routes:
+            match, child_scope = route.matches(scope)
+            if match == Match.FULL:
+                return Match.FULL, dict(child_scope, epdispatch_route = route)
+            elif match == Match.PARTIAL and partial is None:
+                partial = dict(child_scope, epdispatch_route = route)
+        if partial is not None: return Match.PARTIAL, partial
+        return Match.NONE, dict()
+
+    def url_path_for(self, name: str, /, **path_params: dict[str, object]):
+        raise NoMatchFound(name, path_params)
+    async def handle(self, scope: dict, receive, send) -> None:
+        await scope['epdispatch_route'].handle(scope, receive, send)
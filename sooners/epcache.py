@@ -0,0 +1,190 @@
+from asyncio import Task, create_task, shield
+from collections import OrderedDict
+from functools import wraps
+from hashlib import blake2b
+from inspect import Parameter, signature
+from json import dumps, loads
+from time import time
+from typing import Callable
+from fastapi import Request, Response
+from fastapi.encoders import jsonable_encoder
+from fastapi.exceptions import ResponseValidationError
+from fastapi.responses import JSONResponse
+from pydantic import TypeAdapter, ValidationError
+
+class EPCacheEntry(object):
+    # a cached response, shared as bytes: a json header line followed by the body.
+    def __init__(self, body: bytes, status_code: int, media_type: str | None,
+                 expire_at: float, etag: str | None = None) -> None:
+        self.body, self.status_code, self.media_type = body, status_code, media_type
+        self.expire_at = expire_at
+        if etag is None: etag = '"%s"' % blake2b(body, digest_size = 16).hexdigest()
+        self.etag = etag
+    def __repr__(self) -> str:
+        return '%s(%u,%s,%u bytes)' % (self.__class__.__name__, self.status_code,
+                                       self.etag, len(self.body))
+
+    def dumps(self) -> bytes:
+        header = dumps((self.status_code, self.media_type, self.expire_at, self.etag))
+        return b'%s\n%s' % (header.encode('utf-8'), self.body)
+    @classmethod
+    def loads(cls, data: bytes):
+        header, body = data.split(b'\n', 1)
+        status_code, media_type, expire_at, etag = loads(header)
+        return cls(body, status_code, media_type, expire_at, etag)
+
+    def match(self, if_none_match: str | None) -> bool:
+        if if_none_match is None: return False
+        func = lambda etag: etag.strip().removeprefix('W/')
+        etags = set(map(func, if_none_match.split(',')))
+        return '*' in etags or self.etag in etags
+    def response(self, request: Request, vary_headers: tuple[str]) -> Response:
+        headers = {'etag': self.etag,
+                   'cache-control': 'max-age=%u' % max(0, self.expire_at - time())}
+        if vary_headers: headers['vary'] = ', '.join(vary_headers)
+        if self.match(request.headers.get('if-none-match')):
+            return Response(status_code = 304, headers = headers)
+        return Response(content = self.body, status_code = self.status_code,
+                        media_type = self.media_type, headers = headers)
+
+class BaseSharedCache(object):
+    # the shared tier among the server processes, a redis or memcached client
+    # can be plugged in by settings.endpoint_shared_cache.
+    async def get(self, key: str) -> bytes | None:
+        raise NotImplementedError('get must be overloaded by subclass.')
+    async def set(self, key: str, value: bytes, ttl: float) -> None:
+        raise NotImplementedError('set must be overloaded by subclass.')
+    async def delete(self, key: str) -> None:
+        raise NotImplementedError('delete must be overloaded by subclass.')
+
+class LocalSharedCache(BaseSharedCache):
+    # the stand-in of the shared tier, shared by the endpoints of this process only.
+    def __init__(self, max_entries: int = 4096) -> None:
+        self.max_entries, self.entries = max_entries, OrderedDict()
+    def __repr__(self) -> str:
+        return '%s(%u/%u)' % (self.__class__.__name__, len(self.entries), self.max_entries)
+    async def get(self, key: str) -> bytes | None:
+        if (item := self.entries.get(key)) is None: return None
+        elif item[0] > time(): return item[1]
+        del(self.entries[key])
+        return None
+    async def set(self, key: str, value: bytes, ttl: float) -> None:
+        self.entries[key] = (time() + ttl, value)
+        self.entries.move_to_end(key)
+        while len(self.entries) > self.max_entries: self.entries.popitem(last = False)
+    async def delete(self, key: str) -> None: self.entries.pop(key, None)
+
+class EPCache(object):
+    # the opt-in cache of the GET handler of an endpoint: an in-process LRU tier,
+    # then the shared tier. the concurrent identical misses are computed once.
+    # vary_params None means all the query parameters.
+    registry = list() # the wrapped ones, reported by EPMetrics.
+    def __init__(self, ttl: float, vary_params: tuple[str] | None = None,
+                 vary_headers: tuple[str] = (), max_entries: int = 1024,
+                 shared_ornot: bool = True) -> None:
+        self.ttl, self.vary_params, self.max_entries = ttl, vary_params, max_entries
+        self.vary_headers = tuple(map(lambda header: header.lower(), vary_headers))
+        self.shared_ornot, self.shared, self.name = shared_ornot, None, None
+        self.entries, self.inflights = OrderedDict(), dict()
+        self.hits, self.shared_hits, self.misses = 0, 0, 0
+    def __repr__(self) -> str:
+        return '%s(%s,%u/%u,hits=%u/%u,misses=%u)' % (
+            self.__class__.__name__, self.name, len(self.entries), self.max_entries,
+            self.hits, self.shared_hits, self.misses)
+
+    def wrap(self, endpoint_class: type, method_func: Callable,
+             response_class: type = JSONResponse, response_model: object = None) -> Callable:
+        # the request is appended to the parameters resolved by fastapi.
+        from .settings import the_settings
+        self.name = '%s.%s' % (endpoint_class.__module__, endpoint_class.__name__)
+        if self not in self.registry: self.registry.append(self)
+        if not self.shared_ornot: self.shared = None
+        elif (shared := getattr(the_settings, 'endpoint_shared_cache', None)) is not None:
+            self.shared = shared
+        else: self.shared = the_settings.endpoint_shared_cache = LocalSharedCache()
+        render = self.make_render(response_class, response_model)
+        method_signature = signature(method_func)
+        request_parameter = Parameter('_epcache_request', Parameter.KEYWORD_ONLY,
+                                      annotation = Request)
+        @wraps(method_func)
+        async def cached_method(**kwargs: dict[str, object]) -> Response:
+            request = kwargs.pop(request_parameter.name)
+            return await self.respond(request, method_func, kwargs, render)
+        cached_method.__signature__ = method_signature.replace(parameters = (
+            *method_signature.parameters.values(), request_parameter))
+        return cached_method
+
+    def make_key(self, request: Request) -> str:
+        params = request.query_params.multi_items()
+        if self.vary_params is not None:
+            params = filter(lambda item: item[0] in self.vary_params, params)
+        params = sorted(params)
+        headers = map(lambda header: (header, request.headers.get(header, '')),
+                      self.vary_headers)
+        key = dumps((request.url.path, params, tuple(headers))).encode('utf-8')
+        return '%s:%s' % (self.name, blake2b(key, digest_size = 16).hexdigest())
+
+    def local_get(self, key: str) -> EPCacheEntry | None:
+        if (entry := self.entries.get(key)) is None: return None
+        elif entry.expire_at <= time():
+            del(self.entries[key])
+            return None
+        self.entries.move_to_end(key)
+        return entry
+    def local_set(self, key: str, entry: EPCacheEntry) -> None:
+        self.entries[key] = entry
+        self.entries.move_to_end(key)
+        while len(self.entries) > self.max_entries: self.entries.popitem(last = False)
+    def clear(self) -> None: self.entries.clear()
+
+    async def respond(self, request: Request, method_func: Callable,
+                      kwargs: dict[str, object], render: Callable) -> Response:
+        key = self.make_key(request)
+        if (entry := self.local_get(key)) is not None: self.hits += 1
+        else:
+            # fetched in a task of its own, awaited by every request of the key, so
+            # a cancelled request, even the first one, cancels nobody but itself.
+            if (task := self.inflights.get(key)) is None:
+                task = self.inflights[key] = create_task(
+                    self.fetch(key, method_func, kwargs, render))
+                task.add_done_callback(lambda task: self.fetched(key, task))
+            entry = await shield(task)
+        if isinstance(entry, Response): return entry # not cacheable.
+        return entry.response(request, self.vary_headers)
+
+    def fetched(self, key: str, task: Task) -> None:
+        if self.inflights.get(key) is task: del(self.inflights[key])
+        # retrieved, the waiters get it anyway if any.
+        if not task.cancelled(): task.exception()
+
+    async def fetch(self, key: str, method_func: Callable, kwargs: dict[str, object],
+                    render: Callable) -> EPCacheEntry | Response:
+        if self.shared is not None and (data := await self.shared.get(key)) is not None:
+            self.shared_hits += 1
+            entry = EPCacheEntry.loads(data)
+            self.local_set(key, entry)
+            return entry
+        self.misses += 1
+        result = await method_func(**kwargs)
+        if not isinstance(result, Response): result = render(result)
+        if result.status_code != 200: return result
+        entry = EPCacheEntry(bytes(result.body), result.status_code,
+                             result.media_type, time() + self.ttl)
+        self.local_set(key, entry)
+        if self.shared is not None: await self.shared.set(key, entry.dumps(), self.ttl)
+        return entry
+
+    @classmethod
+    def make_render(cls, response_class: type, response_model: object) -> Callable:
+        # fastapi skips the response model of a returned Response, so the result is
+        # validated and serialized here as fastapi does, the cached body is the same.
+        if response_model is None or isinstance(response_model, type) and\
+           issubclass(response_model, Response):
+            return lambda result: response_class(jsonable_encoder(result))
+        adapter = TypeAdapter(response_model)
+        def render(result: object) -> Response:
+            try: value = adapter.validate_python(result, from_attributes = True)
+            except ValidationError as exc:
+                raise ResponseValidationError(exc.errors(include_url = False), body = result)
+            return response_class(adapter.dump_python(value, mode = 'json', by_alias = True))
+        return render
@@ -0,0 +1,97 @@
+from contextvars import ContextVar
+from time import perf_counter
+from typing import Annotated, AsyncIterator
+from fastapi import Depends, Request
+from fastapi.concurrency import run_in_threadpool
+from sqlalchemy import event
+from .utils import Context, DefaultDict
+
+# the timings of the request being served, the engine events are counted into it.
+current_timings = ContextVar('sooners_epdb_timings', default = None)
+
+class DBTiming(object):
+    # the cost of a database touched by a request, in seconds.
+    __slots__ = ('database_name', 'opened_at', 'queries', 'query_time',
+                 'query_at', 'finish_time', 'total_time')
+    def __init__(self, database_name: str) -> None:
+        self.database_name, self.opened_at = database_name, perf_counter()
+        self.queries, self.query_time, self.query_at = 0, 0.0, None
+        self.finish_time, self.total_time = 0.0, None
+    def __repr__(self) -> str:
+        return '%s(%s,%u queries,%.3fms/%.3fms/%.3fms)' % (
+            self.__class__.__name__, self.database_name, self.queries,
+            self.query_time * 1000, self.finish_time * 1000, (self.total_time or 0) * 1000)
+
+def engine_events_setup(database) -> None:
+    # once per engine: the cursor executions are counted into the current request.
+    if getattr(database, '_epdb_events', False): return
+    database._epdb_events = True
+    def before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+        if (timings := current_timings.get()) is None: return
+        elif (timing := timings.get(database.name)) is None: return
+        timing.query_at = perf_counter()
+    def after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+        if (timings := current_timings.get()) is None: return
+        elif (timing := timings.get(database.name)) is None or timing.query_at is None: return
+        timing.queries += 1
+        timing.query_time += perf_counter() - timing.query_at
+        timing.query_at = None
+    event.listen(database.engine_sync, 'before_cursor_execute', before_cursor_execute)
+    event.listen(database.engine_sync, 'after_cursor_execute', after_cursor_execute)
+
+def make_request_db_context(settings) -> Context:
+    # the sessions are opened when a database is touched only, from the sessionmakers
+    # of settings, so the connections come from the pools of the engines.
+    from .settings.model import MigrateContextDefault
+    timings = dict()
+    def session_func(database_name: str):
+        engine_events_setup(settings.databases[database_name])
+        timings[database_name] = DBTiming(database_name)
+        return settings.session_makers[database_name]()
+    # no inspector nor operator in a request, empty so the default still reprs.
+    context = Context(settings = settings, default = None, timings = timings,
+                      inspectors = dict(), operators = dict(),
+                      sessions = DefaultDict(session_func))
+    context.default = MigrateContextDefault(context, settings.default_database_name)
+    return context
+
+def finish_request_db_context(context: Context, commit_ornot: bool) -> None:
+    # the databases left are rolled back once a commit fails.
+    error = None
+    for database_name, session in context.sessions.items():
+        timing, finish_at = context.timings[database_name], perf_counter()
+        try:
+            if commit_ornot and error is None: session.commit()
+            else: session.rollback()
+        except Exception as exc:
+            error = exc
+            session.rollback()
+        finally:
+            session.close()
+            timing.finish_time = perf_counter() - finish_at
+            timing.total_time = perf_counter() - timing.opened_at
+    if error is not None: raise error
+
+async def request_db_context(request: Request) -> AsyncIterator[Context]:
+    # the dependency of the endpoints touching the models: committed when the
+    # handler returns, before the response is sent, so a failed commit is a 5xx.
+    # rolled back when it raises. the sessions are sync, they are finished in the
+    # threadpool, but queried on the event loop by an async handler, so the
+    # handlers touching the databases much are better defined by def. the
+    # timings are kept in request.state.db_timings.
+    from .settings import the_settings
+    context = make_request_db_context(the_settings)
+    request.state.db_timings = context.timings
+    token = current_timings.set(context.timings)
+    try: yield context
+    except Exception as exc:
+        await run_in_threadpool(finish_request_db_context, context, False)
+        raise
+    except BaseException as exc:
+        # cancelled, nothing can be awaited any more.
+        finish_request_db_context(context, False)
+        raise
+    else: await run_in_threadpool(finish_request_db_context, context, True)
+    finally: current_timings.reset(token)
+
+DBContext = Annotated[Context, Depends(request_db_context, scope = 'function')]
@@ -0,0 +1,180 @@
+from asyncio import FIRST_COMPLETED, Queue, QueueFull
+from asyncio import create_task, get_running_loop, wait
+from os import getpid, makedirs
+from pathlib import Path
+from socket import socket, AF_UNIX, SOCK_DGRAM
+from struct import Struct
+from time import monotonic
+from typing import Callable
+from fastapi import WebSocket
+
+TEXT, BINARY = 0, 1
+
+class BaseHubBroker(object):
+    # deliver the published messages to the hubs of all the workers.
+    async def start(self, deliver: Callable[[str, int, bytes], None]) -> None:
+        raise NotImplementedError('start must be overloaded by subclass.')
+    async def publish(self, topic: str, kind: int, data: bytes) -> None:
+        raise NotImplementedError('publish must be overloaded by subclass.')
+    async def close(self) -> None: pass
+
+class LocalHubBroker(BaseHubBroker):
+    # the stand-in in process, the subscribers of the other workers are not reached.
+    async def start(self, deliver: Callable[[str, int, bytes], None]) -> None:
+        self.deliver = deliver
+    async def publish(self, topic: str, kind: int, data: bytes) -> None:
+        self.deliver(topic, kind, data)
+
+class SocketHubBroker(BaseHubBroker):
+    # every worker of this host binds a unix datagram socket in socket_dir, a message
+    # is sent to all of them. the dead sockets are removed when refused. datagram_size
+    # is kept below the default limit of the unix datagrams, about 200k on linux.
+    class exctype(Exception): pass
+    header, datagram_size, peers_ttl = Struct('!BH'), 64 * 1024, 1.0
+    def __init__(self, socket_dir: Path) -> None:
+        self.socket_dir, self.socket, self.drops = socket_dir, None, 0
+        self.peers, self.peers_at = (), None
+    def __repr__(self) -> str:
+        return '%s(%s,%u peers,%u drops)' % (self.__class__.__name__, self.socket_dir,
+                                             len(self.peers), self.drops)
+
+    async def start(self, deliver: Callable[[str, int, bytes], None]) -> None:
+        makedirs(self.socket_dir, exist_ok = True)
+        self.deliver, self.path = deliver, self.socket_dir.joinpath('%u.sock' % getpid())
+        self.path.unlink(missing_ok = True)
+        self.socket = socket(AF_UNIX, SOCK_DGRAM)
+        self.socket.bind(str(self.path))
+        self.socket.setblocking(False)
+        get_running_loop().add_reader(self.socket.fileno(), self.on_readable)
+
+    def on_readable(self) -> None:
+        while True:
+            try: datagram = self.socket.recv(self.datagram_size)
+            except BlockingIOError: return
+            kind, topic_size = self.header.unpack_from(datagram)
+            topic_end = self.header.size + topic_size
+            self.deliver(datagram[self.header.size: topic_end].decode('utf-8'),
+                         kind, datagram[topic_end: ])
+
+    async def publish(self, topic: str, kind: int, data: bytes) -> None:
+        topic = topic.encode('utf-8')
+        datagram = b''.join((self.header.pack(kind, len(topic)), topic, data))
+        if len(datagram) > self.datagram_size:
+            raise self.exctype('Message of %u bytes over datagram_size %u.' % (
+                len(datagram), self.datagram_size))
+        if self.peers_at is None or monotonic() - self.peers_at > self.peers_ttl:
+            self.peers, self.peers_at = tuple(self.socket_dir.glob('*.sock')), monotonic()
+        for peer in self.peers:
+            try: self.socket.sendto(datagram, str(peer))
+            except (ConnectionRefusedError, FileNotFoundError) as exc:
+                peer.unlink(missing_ok = True)
+                self.peers_at = None
+            except BlockingIOError as exc: self.drops += 1 # the peer falls behind.
+            except OSError as exc: self.drops += 1 # such as EMSGSIZE, the others go on.
+
+    async def close(self) -> None:
+        if self.socket is None: return
+        get_running_loop().remove_reader(self.socket.fileno())
+        self.socket.close()
+        self.path.unlink(missing_ok = True)
+
+class HubSubscriber(object):
+    # a websocket with a bounded send queue, evicted by the hub when it is full.
+    def __init__(self, websocket: WebSocket, topics: tuple[str], queue_size: int) -> None:
+        self.websocket, self.topics = websocket, topics
+        self.queue, self.sender = Queue(queue_size), None
+    def __repr__(self) -> str:
+        return '%s(%s,%u)' % (self.__class__.__name__, ','.join(self.topics),
+                              self.queue.qsize())
+    def offer(self, message: tuple[int, str | bytes]) -> bool:
+        try: self.queue.put_nowait(message)
+        except QueueFull as exc: return False
+        return True
+    async def send_loop(self) -> None:
+        while True:
+            kind, data = await self.queue.get()
+            if kind == TEXT: await self.websocket.send_text(data)
+            else: await self.websocket.send_bytes(data)
+
+class EPHub(object):
+    # the pub/sub hub of the websocket endpoints: a message is encoded once, put to
+    # the queues of all the subscribers of its topic without waiting, and sent by
+    # their own tasks. the topics are registered by BaseEndpoint.hub_topics.
+    class exctype(Exception): pass
+    evict_code = 1013 # try again later.
+    def __init__(self, broker: BaseHubBroker, queue_size: int, encoder: Callable) -> None:
+        self.broker, self.queue_size, self.encoder = broker, queue_size, encoder
+        self.topics, self.started, self.evictions = dict(), False, 0
+    def __repr__(self) -> str:
+        return '%s(%r,%u topics,%u evictions)' % (
+            self.__class__.__name__, self.broker, len(self.topics), self.evictions)
+
+    @classmethod
+    def from_settings(cls, settings):
+        from .epresponse import select_json_encoder
+        if isinstance(broker := settings.endpoint_hub_broker, BaseHubBroker): pass
+        elif broker == 'local': broker = LocalHubBroker()
+        elif broker == 'socket': broker = SocketHubBroker(settings.sandbox_root.joinpath('hub'))
+        else: raise cls.exctype('Unsupported endpoint_hub_broker: %r.' % broker)
+        encoder = select_json_encoder(settings.endpoint_json_encoders)[1]
+        return cls(broker, settings.endpoint_hub_queue_size, encoder)
+
+    def register(self, topic: str) -> None: self.topics.setdefault(topic, set())
+    async def start(self) -> None:
+        if self.started: return
+        self.started = True
+        await self.broker.start(self.deliver)
+    async def close(self) -> None:
+        if self.started: await self.broker.close()
+
+    async def publish(self, topic: str, message: object) -> None:
+        if topic not in self.topics: raise self.exctype('Unregistered topic: %r.' % topic)
+        await self.start()
+        if isinstance(message, bytes): kind, data = BINARY, message
+        elif isinstance(message, str): kind, data = TEXT, message.encode('utf-8')
+        else: kind, data = TEXT, self.encoder(message)
+        await self.broker.publish(topic, kind, data)
+
+    def deliver(self, topic: str, kind: int, data: bytes) -> None:
+        if not (subscribers := self.topics.get(topic)): return
+        message = (kind, data.decode('utf-8') if kind == TEXT else data)
+        for subscriber in tuple(subscribers):
+            if not subscriber.offer(message): self.evict(subscriber)
+
+    def evict(self, subscriber: HubSubscriber) -> None:
+        # the slow consumer is dropped, instead of slowing down the others.
+        self.evictions += 1
+        self.unsubscribe(subscriber)
+        if subscriber.sender is not None: subscriber.sender.cancel()
+
+    def subscribe(self, websocket: WebSocket, *topics: tuple[str]) -> HubSubscriber:
+        if (unregistered := set(topics) - set(self.topics.keys())):
+            raise self.exctype('Unregistered topics: %r.' % sorted(unregistered))
+        subscriber = HubSubscriber(websocket, topics, self.queue_size)
+        for topic in topics: self.topics[topic].add(subscriber)
+        return subscriber
+    def unsubscribe(self, subscriber: HubSubscriber) -> None:
+        for topic in subscriber.topics: self.topics[topic].discard(subscriber)
+
+    async def serve(self, websocket: WebSocket, *topics: tuple[str],
+                    on_receive: Callable | None = None) -> None:
+        # serve an accepted websocket until it is closed or evicted, the received
+        # texts are passed to on_receive.
+        await self.start()
+        subscriber = self.subscribe(websocket, *topics)
+        subscriber.sender = create_task(subscriber.send_loop())
+        receiver = create_task(self.receive_loop(websocket, on_receive))
+        try: await wait((subscriber.sender, receiver), return_when = FIRST_COMPLETED)
+        finally:
+            self.unsubscribe(subscriber)
+            subscriber.sender.cancel(); receiver.cancel()
+        if subscriber.sender.cancelled():
+            if not receiver.done(): await websocket.close(code = self.evict_code)
+        # a send failed as the websocket is gone, retrieved here and not raised.
+        elif subscriber.sender.done(): subscriber.sender.exception()
+        if receiver.done() and not receiver.cancelled() and receiver.exception() is not None:
+            raise receiver.exception()
+
+    async def receive_loop(self, websocket: WebSocket, on_receive: Callable | None) -> None:
+        async for text in websocket.iter_text():
+            if on_receive is not None: await on_receive(text)
@@ -0,0 +1,151 @@
+from bisect import bisect_left
+from contextvars import ContextVar
+from itertools import count
+from time import perf_counter
+from sqlalchemy import event
+
+# the db costs of a sampled request, database name -> [queries, seconds].
+current_sample = ContextVar('sooners_epmetrics_sample', default = None)
+
+class EPHistogram(object):
+    # the latencies of a route, counted by the upper bounds of settings.metrics_buckets.
+    __slots__ = ('counts', 'total', 'sum')
+    def __init__(self, buckets: tuple[float]) -> None:
+        self.counts, self.total, self.sum = [0] * (len(buckets) + 1), 0, 0.0
+    def observe(self, buckets: tuple[float], seconds: float) -> None:
+        self.counts[bisect_left(buckets, seconds)] += 1
+        self.total += 1
+        self.sum += seconds
+
+class EPDBCounter(object):
+    __slots__ = ('queries', 'seconds', 'errors')
+    def __init__(self) -> None: self.queries, self.seconds, self.errors = 0, 0.0, 0
+
+class EPMetrics(object):
+    # the counters of a server worker. they are plain integers and floats without
+    # locks, updated by the event loop, or by the db events of the threadpool where
+    # a lost increment under contention is acceptable. every worker serves its own.
+    media_type = 'text/plain; version=0.0.4; charset=utf-8'
+    def __init__(self, buckets: tuple[float], sample_rate: float) -> None:
+        self.buckets, self.histograms, self.databases = tuple(sorted(buckets)), dict(), dict()
+        self.sample_every = 0 if not sample_rate else max(1, round(1 / sample_rate))
+        self.sequence = count()
+    def __repr__(self) -> str:
+        return '%s(%u routes,%u databases)' % (
+            self.__class__.__name__, len(self.histograms), len(self.databases))
+
+    @classmethod
+    def from_settings(cls, settings):
+        metrics = cls(settings.metrics_buckets, settings.metrics_server_timing)
+        for database in settings.databases.values(): metrics.engine_setup(database)
+        return metrics
+
+    def engine_setup(self, database) -> None:
+        counter = self.databases[database.name] = EPDBCounter()
+        def before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+            conn.info.setdefault('sooners_query_at', []).append(perf_counter())
+        def after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+            seconds = perf_counter() - conn.info['sooners_query_at'].pop()
+            counter.queries += 1
+            counter.seconds += seconds
+            if (sample := current_sample.get()) is None: return
+            elif (costs := sample.get(database.name)) is None:
+                sample[database.name] = [1, seconds]
+                return
+            costs[0] += 1
+            costs[1] += seconds
+        def handle_error(exception_context):
+            counter.errors += 1
+            if (conn := exception_context.connection) is None: return
+            elif (query_ats := conn.info.get('sooners_query_at')): query_ats.pop()
+        event.listen(database.engine_sync, 'before_cursor_execute', before_cursor_execute)
+        event.listen(database.engine_sync, 'after_cursor_execute', after_cursor_execute)
+        event.listen(database.engine_sync, 'handle_error', handle_error)
+
+    def observe(self, method: str, route_path: str, status: int, seconds: float) -> None:
+        key = (method, route_path, '%uxx' % (status // 100))
+        if (histogram := self.histograms.get(key)) is None:
+            histogram = self.histograms[key] = EPHistogram(self.buckets)
+        histogram.observe(self.buckets, seconds)
+
+    def sample_ornot(self) -> bool:
+        return self.sample_every > 0 and next(self.sequence) % self.sample_every == 0
+
+    def server_timing(self, seconds: float, sample: dict[str, list]) -> bytes:
+        parts = ['app;dur=%.3f' % (seconds * 1000)]
+        for database_name, (queries, db_seconds) in sample.items():
+            parts.append('db-%s;dur=%.3f;desc="%u queries"' % (
+                database_name, db_seconds * 1000, queries))
+        return ', '.join(parts).encode('latin-1')
+
+    def render(self) -> str:
+        from .epcache import EPCache
+        label = lambda value: str(value).replace('\\', r'\\').replace('"', r'\"')
+        lines = ['# HELP sooners_request_seconds The latency of the requests by route.',
+                 '# TYPE sooners_request_seconds histogram']
+        bounds = tuple(map(lambda bound: '%g' % bound, self.buckets)) + ('+Inf',)
+        for (method, route_path, status), histogram in sorted(self.histograms.items()):
+            labels = 'method="%s",route="%s",status="%s"' % (method, label(route_path), status)
+            accumulated = 0
+            for bound, bucket_count in zip(bounds, histogram.counts):
+                accumulated += bucket_count
+                lines.append('sooners_request_seconds_bucket{%s,le="%s"} %u' % (
+                    labels, bound, accumulated))
+            lines.append('sooners_request_seconds_sum{%s} %.6f' % (labels, histogram.sum))
+            lines.append('sooners_request_seconds_count{%s} %u' % (labels, histogram.total))
+        for name, attr, mtype, description in (
+                ('sooners_db_queries_total', 'queries', 'counter', 'The queries executed.'),
+                ('sooners_db_seconds_total', 'seconds', 'counter', 'The time in queries.'),
+                ('sooners_db_errors_total', 'errors', 'counter', 'The failed queries.')):
+            lines.extend(('# HELP %s %s' % (name, description), '# TYPE %s %s' % (name, mtype)))
+            for database_name, counter in sorted(self.databases.items()):
+                lines.append('%s{database="%s"} %s' % (
+                    name, label(database_name), getattr(counter, attr)))
+        for name, attr, description in (
+                ('sooners_cache_hits_total', 'hits', 'The hits of the local tier.'),
+                ('sooners_cache_shared_hits_total', 'shared_hits',
+                 'The hits of the shared tier.'),
+                ('sooners_cache_misses_total', 'misses', 'The misses computed by the handler.')):
+            lines.extend(('# HELP %s %s' % (name, description), '# TYPE %s counter' % name))
+            for cache in EPCache.registry:
+                lines.append('%s{cache="%s"} %u' % (
+                    name, label(cache.name), getattr(cache, attr)))
+        lines.append('')
+        return '\n'.join(lines)
+
+class EPMetricsMiddleware(object):
+    # the latency of every request by route, a Server-Timing header on the sampled
+    # ones, and the prometheus text of the metrics on metrics_path.
+    def __init__(self, app, metrics: EPMetrics, metrics_path: str) -> None:
+        self.app, self.metrics, self.metrics_path = app, metrics, metrics_path
+
+    async def __call__(self, scope: dict, receive, send) -> None:
+        if scope['type'] != 'http': return await self.app(scope, receive, send)
+        elif scope['path'] == self.metrics_path: return await self.respond_metrics(send)
+        time0, status, sample, token = perf_counter(), 500, None, None
+        if self.metrics.sample_ornot():
+            sample = dict()
+            token = current_sample.set(sample)
+        async def metrics_send(message: dict) -> None:
+            nonlocal status
+            if message['type'] == 'http.response.start':
+                status = message['status']
+                if sample is not None:
+                    headers = list(message.get('headers', ()))
+                    headers.append((b'server-timing', self.metrics.server_timing(
+                        perf_counter() - time0, sample)))
+                    message = dict(message, headers = headers)
+            await send(message)
+        try: await self.app(scope, receive, metrics_send)
+        finally:
+            if token is not None: current_sample.reset(token)
+            route = scope.get('epdispatch_route') or scope.get('route')
+            route_path = '<unmatched>' if route is None else route.path
+            self.metrics.observe(scope['method'], route_path, status, perf_counter() - time0)
+
+    async def respond_metrics(self, send) -> None:
+        body = self.metrics.render().encode('utf-8')
+        await send(dict(type = 'http.response.start', status = 200, headers = [
+            (b'content-type', self.metrics.media_type.encode('latin-1')),
+            (b'content-length', b'%u' % len(body))]))
+        await send(dict(type = 'http.response.body', body = body))
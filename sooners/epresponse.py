@@ -0,0 +1,58 @@
+from functools import wraps
+from importlib import import_module
+from inspect import signature
+from typing import Callable
+from fastapi import Response
+from fastapi.responses import JSONResponse
+from pydantic import BaseModel as BaseSchema
+from pydantic_core import to_json, to_jsonable_python
+
+def _orjson_encoder() -> Callable:
+    dumps = import_module('orjson').dumps
+    return lambda content: dumps(content, default = to_jsonable_python)
+def _msgspec_encoder() -> Callable:
+    return import_module('msgspec.json').Encoder(enc_hook = to_jsonable_python).encode
+def _pydantic_encoder() -> Callable: return to_json
+def _json_encoder() -> Callable:
+    dumps = import_module('json').dumps
+    return lambda content: dumps(content, ensure_ascii = False, allow_nan = False,
+                                 separators = (',', ':'),
+                                 default = to_jsonable_python).encode('utf-8')
+
+json_encoders = dict(orjson = _orjson_encoder, msgspec = _msgspec_encoder,
+                     pydantic = _pydantic_encoder, json = _json_encoder)
+
+def select_json_encoder(names: tuple[str]) -> tuple[str, Callable]:
+    # the first available one of names, json is always available.
+    for name in names:
+        try: return name, json_encoders[name]()
+        except ImportError as exc: continue
+    return 'json', _json_encoder()
+
+class FastJSONResponse(JSONResponse):
+    # the models and the lists of models are encoded by pydantic-core directly,
+    # the others by the first available encoder of settings.endpoint_json_encoders.
+    encoder_name, encoder = None, None
+    def render(self, content: object) -> bytes:
+        if isinstance(content, BaseSchema): return content.__pydantic_serializer__.to_json(content)
+        elif isinstance(content, (list, tuple)) and content and\
+             isinstance(content[0], BaseSchema): return to_json(content)
+        elif self.encoder is None:
+            from .settings import the_settings
+            names = getattr(the_settings, 'endpoint_json_encoders', tuple(json_encoders.keys()))
+            FastJSONResponse.encoder_name, encoder = select_json_encoder(names)
+            FastJSONResponse.encoder = staticmethod(encoder)
+        return self.encoder(content)
+
+response_classes = dict(default = JSONResponse, fast = FastJSONResponse,
+                        prevalidated = FastJSONResponse)
+
+def prevalidated(method_func: Callable, response_class: type) -> Callable:
+    # the returned models are trusted, fastapi neither validates nor encodes them again.
+    @wraps(method_func)
+    async def prevalidated_method(**kwargs: dict[str, object]) -> Response:
+        result = await method_func(**kwargs)
+        if isinstance(result, Response): return result
+        return response_class(result)
+    prevalidated_method.__signature__ = signature(method_func)
+    return prevalidated_method
@@ -0,0 +1,93 @@
+from json import load
+from os import stat
+from pathlib import Path
+from fastapi import Response
+from fastapi.responses import FileResponse, PlainTextResponse
+
+encoding_suffixes = dict(br = '.br', gzip = '.gz')
+
+def load_manifest(statics_dir: Path) -> dict[str, dict[str, dict]] | None:
+    # written by makestatics: mount name -> relpath -> the entry of the asset.
+    if not (fpath := statics_dir.joinpath('manifest.json')).is_file(): return None
+    with fpath.open('rt', encoding = 'utf-8') as rfp: return load(rfp)['mounts']
+
+class StaticAsset(object):
+    # an asset of the manifest with its precompressed variants, stat once at startup.
+    # every variant has its own strong etag, "<digest>-<encoding>" for the encoded.
+    def __init__(self, fpath: Path, entry: dict[str, object]) -> None:
+        self.fpath, self.media_type = fpath, entry['media_type']
+        self.variants, self.etags = {None: (fpath, stat(fpath))}, {None: entry['etag']}
+        for encoding in entry['encodings']:
+            vpath = fpath.with_name(fpath.name + encoding_suffixes[encoding])
+            self.variants[encoding] = (vpath, stat(vpath))
+            self.etags[encoding] = '%s-%s"' % (entry['etag'][: -1], encoding)
+        self.bodies = dict()
+    def __repr__(self) -> str:
+        return '%s(%s,%s)' % (self.__class__.__name__, self.fpath.name,
+                              ','.join(map(str, self.variants.keys())))
+
+    def choose(self, accept_encoding: str, encodings: tuple[str]) -> str | None:
+        accepts = set()
+        for token in accept_encoding.split(','):
+            coding, _, param = token.strip().partition(';')
+            if param.strip().replace(' ', '') not in ('q=0', 'q=0.0', 'q=0.00', 'q=0.000'):
+                accepts.add(coding.strip().lower())
+        for encoding in encodings:
+            if encoding in self.variants and encoding in accepts: return encoding
+        return None
+
+class PrecompressedStatics(object):
+    # serve the assets written by makestatics from an index in memory: the variant
+    # of the best accepted encoding is chosen without touching the filesystem,
+    # the small bodies are kept in memory. the fingerprinted paths are immutable,
+    # the original paths are revalidated by etag.
+    immutable_control = 'public, max-age=31536000, immutable'
+    revalidate_control = 'public, no-cache'
+    def __init__(self, root: Path, entries: dict[str, dict], encodings: tuple[str],
+                 memory_limit: int) -> None:
+        self.root, self.encodings, self.memory_limit = root, encodings, memory_limit
+        self.assets = dict()
+        for relpath, entry in entries.items():
+            asset = StaticAsset(root.joinpath(entry['hashed']), entry)
+            self.assets[relpath] = (asset, self.revalidate_control)
+            self.assets[entry['hashed']] = (asset, self.immutable_control)
+    def __repr__(self) -> str:
+        return '%s(%s,%u)' % (self.__class__.__name__, self.root, len(self.assets))
+
+    async def __call__(self, scope: dict, receive, send) -> None:
+        assert(scope['type'] == 'http')
+        response = self.respond(scope)
+        await response(scope, receive, send)
+
+    def respond(self, scope: dict) -> Response:
+        if scope['method'] not in ('GET', 'HEAD'):
+            return PlainTextResponse('Method Not Allowed', status_code = 405)
+        path, root_path = scope['path'], scope.get('root_path', '')
+        if root_path and path.startswith(root_path): path = path[len(root_path): ]
+        if (item := self.assets.get(path.lstrip('/'))) is None:
+            return PlainTextResponse('Not Found', status_code = 404)
+        asset, cache_control = item
+        headers = {b'accept-encoding': b''}
+        for name, value in scope['headers']:
+            if name in headers: headers[name] = value
+        encoding = asset.choose(headers[b'accept-encoding'].decode('latin-1'), self.encodings)
+        headers = {'etag': asset.etags[encoding], 'cache-control': cache_control,
+                   'vary': 'accept-encoding'}
+        if encoding is not None: headers['content-encoding'] = encoding
+        if self.not_modified(scope, asset.etags[encoding]):
+            return Response(status_code = 304, headers = headers)
+        vpath, stat_result = asset.variants[encoding]
+        if stat_result.st_size > self.memory_limit:
+            return FileResponse(vpath, headers = headers, media_type = asset.media_type,
+                                stat_result = stat_result)
+        if (body := asset.bodies.get(encoding)) is None:
+            body = asset.bodies[encoding] = vpath.read_bytes()
+        return Response(body, headers = headers, media_type = asset.media_type)
+
+    def not_modified(self, scope: dict, etag: str) -> bool:
+        for name, value in scope['headers']:
+            if name != b'if-none-match': continue
+            func = lambda one: one.strip().removeprefix('W/')
+            etags = set(map(func, value.decode('latin-1').split(',')))
+            return '*' in etags or etag in etags
+        return False
@@ -18,6 +18,8 @@ class BaseMilestoneStep(object):
     def can_backward(self) -> bool: return callable(getattr(self, 'backward', None))
 
     def description(self) -> str: return ''
+    # the operations would be done by the step, without changing the databases.
+    def plan(self, context: Context, direction: str) -> Iterable: return ()
 
     def setup_by_milestone(self, milestone, index: int, width: int):
         self.milestone, self.index = milestone, index
@@ -121,6 +123,14 @@ class Milestone(list):
             self.do_delayed_operations(context, delayed_operations)
             self.commit_all(context)
 
+    def plan(self, patterns: MilestoneStepPatterns, context: Context, direction: str):
+        from ..db.plan import MigrationPlan
+        plan = MigrationPlan(context.settings)
+        steps = self if direction == 'forward' else reversed(self)
+        for step in filter(lambda step: patterns.match_ornot(step), steps):
+            plan.extend(step.plan(context, direction))
+        return plan
+
     def do_delayed_operations(self, context: Context, delayed_operations) -> None:
         for delayed_operation in delayed_operations:
             delayed_operation(context.prompt,
@@ -17,6 +17,13 @@ class DBSchemaStep(BaseMilestoneStep):
         xmlversions = MetaDataSaved.versions2xmls(the_settings, self.versions)
         return MetaDataSaved(the_settings, xmlversions, self.params)
 
+    def plan(self, context: Context, direction: str) -> Iterable[BaseOperation]:
+        # from the schema saved in the databases, then from the steps planned before.
+        if (migration := context.get_one('plan_migration')) is None:
+            context.set_one('plan_migration', migration := self.make_migration(context))
+        metadata1 = self.metadata1 if direction == 'forward' else self.metadata0
+        return migration.plan_operations(context.settings, metadata1)
+
     def make_migration(self, context: Context) -> Migration:
         migration = Migration(context)
         if migration.is_clean(): return migration
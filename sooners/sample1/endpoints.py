@@ -1,6 +1,7 @@
 from fastapi import WebSocket
 from pydantic import BaseModel as BaseSchema
 from ..endpoint import EPVersion, BaseEndpoint
+from ..epcache import EPCache
 
 class UserSchema(BaseSchema):
     name: str
@@ -10,6 +11,9 @@ class TeamSchema(BaseSchema):
 
 class Tester(BaseEndpoint):
     path = 'core_tester'
+    cache = EPCache(ttl = 10, vary_params = ('team',))
+    async def get(self, team: str) -> TeamSchema:
+        return TeamSchema(name = team)
     async def post(self, user: UserSchema) -> TeamSchema:
         return TeamSchema(name = user.team)
     async def websocket(self, websocket: WebSocket):
@@ -17,3 +21,15 @@ class Tester(BaseEndpoint):
         while True:
             request = await websocket.receive_text()
             await websocket.send_text(request.upper())
+
+class Board(BaseEndpoint):
+    path = 'core_board'
+    hub_topics = ('board',)
+    async def post(self, user: UserSchema) -> TeamSchema:
+        from ..settings import the_settings
+        await the_settings.hub.publish('board', user)
+        return TeamSchema(name = user.team)
+    async def websocket(self, websocket: WebSocket):
+        from ..settings import the_settings
+        await websocket.accept()
+        await the_settings.hub.serve(websocket, 'board')
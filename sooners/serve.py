@@ -6,4 +6,5 @@ from .settings import locate_settings, the_settings
 if the_settings is None:
     the_settings = locate_settings(
         Path(environ['SOURCE_ROOT']), Path(environ['SANDBOX_ROOT']), source_version)
-    the_settings.app # touch app property.
+# the workers forked from a master without preload_app boot here too.
+the_settings.boot()
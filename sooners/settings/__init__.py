@@ -1,6 +1,6 @@
+from datetime import timedelta
 from importlib import import_module
 from pathlib import Path
-from xml.dom.minidom import Element, parse
 from .. import SourceVersion, source_version as sooners_source_version
 from ..utils import SmartContext, SettingsMap
 from .model import SettingsModelMixin
@@ -30,7 +30,28 @@ class BaseSettings(SettingsModelMixin, SettingsFastAPIMixin):
         self.source_root, self.sandbox_root = source_root, sandbox_root
         self.logs_dir = sandbox_root.joinpath('logs')
         self.closed_logs_dir = sandbox_root.joinpath('closed.logs')
-        self.log_limit = 256 * 1024 * 1024
+        # written by makestatics, never a source dir even if sandbox_root is source_root.
+        self.statics_dir = sandbox_root.joinpath('statics.build')
+        self.log_limit, self.log_level = 256 * 1024 * 1024, 20 # logging.INFO.
+        self.log_read_size, self.log_flush_size = 64 * 1024, 64 * 1024
+        self.log_flush_interval = 1.0 # in seconds.
+        self.log_compress_format, self.log_compress_level = 'gzip', 9
+        self.log_compress_queue = 16
+        self.boot_drift_check = False
+        self.cron_thread_workers, self.cron_process_workers = 4, 2
+        self.cron_lease, self.cron_lease_ttl = False, timedelta(seconds = 30)
+        self.cron_ledger = True
+        self.endpoint_shared_cache = None # the shared tier of EPCache, local by default.
+        self.endpoint_response = 'default' # default, fast or prevalidated.
+        self.endpoint_json_encoders = ('orjson', 'msgspec', 'pydantic', 'json')
+        self.endpoint_hub_broker = 'local' # local, socket or a BaseHubBroker.
+        self.endpoint_hub_queue_size = 64
+        self.static_encodings = ('br', 'gzip') # in the order of preference.
+        self.static_memory_limit = 64 * 1024 # the larger bodies are read per request.
+        self.warmup_hooks = list() # called with settings by every server worker.
+        self.metrics_path = '/metrics' # None to disable the metrics middleware.
+        self.metrics_buckets = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10)
+        self.metrics_server_timing = 0.01 # the ratio of the responses with Server-Timing.
         self.components = ComponentMap(self)
         self.components.install('sooners.core')
 
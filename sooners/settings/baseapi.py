@@ -1,9 +1,15 @@
+from pathlib import Path
 from ..utils import SettingsMap
 
 class ServersMap(SettingsMap):
     def install(self, server_name: str, **server_config):
         self[server_name] = server_config
         setattr(self, server_name, server_config)
+    def pid_fpath(self, server_name: str) -> Path:
+        return self.settings.logs_dir.joinpath('%s.pid' % server_name)
+    def ready_dir(self, server_name: str) -> Path:
+        # a file named by pid for every worker ready to take traffic.
+        return self.settings.logs_dir.joinpath('%s.ready' % server_name)
 
 class SettingsBaseAPIMixin(object):
     def baseapi_setup(self) -> None:
@@ -1,4 +1,6 @@
 #from jose import jwt
+from os import environ, getpid
+from pathlib import Path
 from ..utils import Arguments, DefaultDict, ServeVersion
 from .baseapi import SettingsBaseAPIMixin
 
@@ -19,25 +21,105 @@ class SettingsFastAPIMixin(SettingsBaseAPIMixin):
         if not hasattr(self, '_serve_versions'): self.baseapi_setup()
         return self._serve_versions
 
+    def boot(self):
+        # everything a server process needs before serving, done once by the master
+        # when the gunicorn workers are preloaded.
+        if not hasattr(self, '_boot_done'):
+            if self.boot_drift_check:
+                if drifts := tuple(self.check_drift()):
+                    raise RuntimeError('Database schema drift detected: %r.' % (drifts,))
+            self.load_models()
+            self.app # touch app property.
+            self._boot_done = True
+        return self
+
     @property
     def app(self):
         if not hasattr(self, '_app'):
             from fastapi import FastAPI
             self._app = self.fastapi_arguments(FastAPI)
-            self.static_setup().endpoint_setup()
+            self.static_setup().endpoint_setup().lifespan_setup().metrics_setup()
         return self._app
 
-    def static_setup(self):
-        if static_dirpath := self.source_root.joinpath('statics').is_dir():
+    @property
+    def metrics(self):
+        if not hasattr(self, '_metrics'):
+            from ..epmetrics import EPMetrics
+            self._metrics = EPMetrics.from_settings(self)
+        return self._metrics
+
+    def metrics_setup(self):
+        if self.metrics_path is None: return self
+        from ..epmetrics import EPMetricsMiddleware
+        self._app.add_middleware(EPMetricsMiddleware, metrics = self.metrics,
+                                 metrics_path = self.metrics_path)
+        return self
+
+    @property
+    def hub(self):
+        if not hasattr(self, '_hub'):
+            from ..ephub import EPHub
+            self._hub = EPHub.from_settings(self)
+        return self._hub
+
+    @property
+    def statics_manifest(self):
+        if not hasattr(self, '_statics_manifest'):
+            from ..epstatic import load_manifest
+            self._statics_manifest = load_manifest(self.statics_dir)
+        return self._statics_manifest
+
+    def mount_statics(self, path: str, source_dir: Path, mount_name: str, name: str) -> None:
+        # the precompressed assets of makestatics if available, else the sources.
+        if self.statics_manifest is not None and mount_name in self.statics_manifest:
+            from ..epstatic import PrecompressedStatics
+            static_files = PrecompressedStatics(
+                self.statics_dir.joinpath(mount_name), self.statics_manifest[mount_name],
+                self.static_encodings, self.static_memory_limit)
+        else:
             from fastapi.staticfiles import StaticFiles
-            static_files = StaticFiles(directory = static_dirpath)
-            self._app.mount('/statics', static_files, name = 'statics')
+            static_files = StaticFiles(directory = source_dir)
+        self._app.mount(path, static_files, name = name)
+
+    def static_setup(self):
+        if (static_dirpath := self.source_root.joinpath('statics')).is_dir():
+            self.mount_statics('/statics', static_dirpath, 'statics', 'statics')
         for component in self.components.values(): component.load_statics()
         return self
 
+    def lifespan_setup(self):
+        # warm up before the worker takes traffic, then report it ready to the
+        # reload of the server command.
+        from contextlib import asynccontextmanager
+        lifespan_context = self._app.router.lifespan_context
+        @asynccontextmanager
+        async def lifespan(app):
+            async with lifespan_context(app) as state:
+                await self.warmup()
+                ready_fpath = None
+                if (ready_dir := environ.get('SOONERS_READY_DIR')) is not None:
+                    ready_fpath = Path(ready_dir).joinpath('%u' % getpid())
+                    ready_fpath.touch()
+                try: yield state
+                finally:
+                    if ready_fpath is not None: ready_fpath.unlink(missing_ok = True)
+                    if hasattr(self, '_hub'): await self._hub.close()
+        self._app.router.lifespan_context = lifespan
+        return self
+
+    async def warmup(self) -> None:
+        # the pools are opened, the openapi schema is built and the hooks prime
+        # their caches, so the first requests are not slower than the others.
+        for database in self.databases.values():
+            with database.engine_sync.connect(): pass
+            async with database.engine.connect(): pass
+        self._app.openapi()
+        for warmup_hook in self.warmup_hooks:
+            if (awaitable := warmup_hook(self)) is not None: await awaitable
+
     def endpoint_setup(self):
         from fastapi.routing import APIRouter
-        from ..endpoint import EPVersion, BaseEndpoint
+        from ..endpoint import EPDispatchRoute, BaseEndpoint
         pattern_endpoints = list()
         v2cn2ar = DefaultDict(
             lambda version: DefaultDict(
@@ -45,10 +127,16 @@ class SettingsFastAPIMixin(SettingsBaseAPIMixin):
                     prefix = '/%r/%s' % (version, component_name))))
         for component in self.components.values():
             for epctx in BaseEndpoint.scan_component(component):
+                versions = tuple(epctx.klass.get_versions())
                 for serve_version in self.serve_versions:
                     func = lambda endpoint_version: endpoint_version.match(serve_version)
-                    if not any(map(func, epctx.klass.get_versions())): continue
+                    if not any(map(func, versions)): continue
                     epctx.klass.endpoint_setup(v2cn2ar[serve_version][component.name])
+        dispatch_route = EPDispatchRoute()
         for serve_version, cn2ar in v2cn2ar.items():
-            for apirouter in cn2ar.values(): self._app.include_router(apirouter)
+            for apirouter in cn2ar.values():
+                self._app.include_router(apirouter)
+                for route in apirouter.routes: dispatch_route.add(route)
+        # in front of the others, the endpoints are matched before the linear scan.
+        self._app.router.routes.insert(0, dispatch_route)
         return self
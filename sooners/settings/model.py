@@ -101,34 +101,72 @@ class SettingsModelMixin(object):
             self.metadata.models.setup(self.model_params, self.databases)
         return self
 
+    def check_drift(self, context: Context | None = None) -> Iterable[Context]:
+        self.load_models()
+        from ..core.models import Configuration
+        if context is not None: saved = Configuration.load_fingerprints(context)
+        else:
+            context = self.make_db_context()
+            try: saved = Configuration.load_fingerprints(context)
+            finally: context.default.session.close()
+        if saved is None:
+            yield Context(table_name = None, component_name = None, drift = 'unknown')
+            return
+        current = self.metadata.fingerprints()
+        for table_name in sorted(set(saved.keys()) | set(current.keys())):
+            if table_name not in saved: drift, component_name = 'create', current[table_name][0]
+            elif table_name not in current: drift, component_name = 'drop', saved[table_name][0]
+            elif saved[table_name][1] != current[table_name][1]:
+                drift, component_name = 'change', current[table_name][0]
+            else: continue
+            yield Context(table_name = table_name, component_name = component_name,
+                          drift = drift)
+
     def check_models(self) -> Iterable[object]:
         self.load_models()
         from ..core.models import DBSchemaVersion
         context = self.make_db_context()
-        default_dict = DBSchemaVersion.load_default_dict(context)
+        try:
+            version_records = DBSchemaVersion.load_checksums(context)
+            drifts = tuple(self.check_drift(context))
+        finally: context.default.session.close()
+        # an interrupted migration is reported before the fingerprints are trusted.
         func = lambda version_record: version_record.checksum0 != version_record.checksum1
-        if any(map(func, default_dict.values())): return False
+        if any(map(func, version_records.values())): return False
+        if all(map(lambda drift: drift.component_name is not None, drifts)):
+            # the fingerprints saved by the last migration name the component of each table.
+            component_names = set(map(lambda drift: drift.component_name, drifts))
+            for component in self.components.values():
+                if component.name in component_names: yield component
+            return
         for component in self.components.values():
-            if component.name not in default_dict:
+            if component.name not in version_records:
                 if self.metadata.make_version(component) is None: pass
                 else: yield component
-            elif default_dict[component.name].checksum0 !=\
-                 default_dict[component.name].checksum1:
+            elif version_records[component.name].checksum0 !=\
+                 version_records[component.name].checksum1:
                 yield component
             elif (version_dom := self.metadata.make_version(component)) is None:
                 yield component
             elif version_dom.getAttribute('checksum') !=\
-                 default_dict[component.name].checksum0:
+                 version_records[component.name].checksum0:
                 yield component
             else: pass
 
+    @property
+    def session_makers(self):
+        if not hasattr(self, '_session_makers'):
+            from sqlalchemy.orm import sessionmaker
+            func = lambda dbname: sessionmaker(bind = self.databases[dbname].engine_sync)
+            self._session_makers = DefaultDict(func)
+        return self._session_makers
+
     def make_db_context(self, **kwargs: dict[str, object]) -> Context:
         from sqlalchemy import inspect
-        from sqlalchemy.orm import sessionmaker
         func = lambda database_name: self.databases[database_name]
         inspector_func = lambda dbname: inspect(func(dbname).engine_sync)
         operator_func = lambda dbname: func(dbname).patch_oper()
-        session_func = lambda dbname: sessionmaker(bind = func(dbname).engine_sync)()
+        session_func = lambda dbname: self.session_makers[dbname]()
         context = Context(settings = self, **kwargs, default = None,
                           inspectors = DefaultDict(inspector_func),
                           operators = DefaultDict(operator_func),
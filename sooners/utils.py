@@ -3,6 +3,7 @@ from collections import OrderedDict
 from dataclasses import dataclass
 from datetime import date, datetime, timedelta
 from hashlib import sha3_384
+from json import dumps, loads
 from pathlib import Path
 from typing import Iterable
 from xml.dom.minidom import Element
@@ -60,6 +61,79 @@ class Context(object):
                             else nv[1].to_dict_deep())
         return OrderedDict(map(func1, map(func0, self.__names__)))
 
+class ContextCodec(object):
+    # json for Context trees: Context, dict, set and tuple are tagged so they are
+    # decoded as what they were, in the order they were. the canonical json of the
+    # digest has the names and dict keys sorted too, set items are always sorted.
+    tag_context, tag_dict, tag_set, tag_tuple = 'C', 'D', 'S', 'T'
+    @classmethod
+    def encode(cls, value: object, canonical: bool = False) -> str:
+        json = cls._to_json(value, canonical)
+        return dumps(json, ensure_ascii = False, separators = (',', ':'))
+    @classmethod
+    def decode(cls, text: str) -> object:
+        # the texts saved by repr before are still readable, but never evaluated.
+        if text.startswith('OrderedDict('): return cls._from_legacy(text)
+        return cls._from_json(loads(text))
+    @classmethod
+    def digest(cls, value: object) -> str: return Hasher(cls.encode(value, True)).b64digest()
+
+    @classmethod
+    def _sorted(cls, jsons: Iterable[object], canonical: bool = True) -> list[object]:
+        if not canonical: return list(jsons)
+        func = lambda json: dumps(json, ensure_ascii = False, separators = (',', ':'))
+        return sorted(jsons, key = func)
+    @classmethod
+    def _to_json(cls, value: object, canonical: bool) -> object:
+        func0 = lambda item: cls._to_json(item, canonical)
+        if value is None or isinstance(value, (bool, int, float, str)): return value
+        elif isinstance(value, Context):
+            func1 = lambda item: [item[0], func0(item[1])]
+            return { cls.tag_context: cls._sorted(map(func1, value.items()), canonical) }
+        elif isinstance(value, dict):
+            func1 = lambda item: [func0(item[0]), func0(item[1])]
+            return { cls.tag_dict: cls._sorted(map(func1, value.items()), canonical) }
+        elif isinstance(value, (set, frozenset)):
+            return { cls.tag_set: cls._sorted(map(func0, value)) }
+        elif isinstance(value, tuple): return { cls.tag_tuple: list(map(func0, value)) }
+        elif isinstance(value, list): return list(map(func0, value))
+        raise TypeError('Unsupported value for %s: %r.' % (cls.__name__, value))
+    @classmethod
+    def _from_json(cls, json: object) -> object:
+        if isinstance(json, list): return list(map(cls._from_json, json))
+        elif not isinstance(json, dict): return json
+        (tag, body), = json.items()
+        if tag == cls.tag_context:
+            func = lambda pair: (pair[0], cls._from_json(pair[1]))
+            return Context(**dict(map(func, body)))
+        elif tag == cls.tag_dict:
+            func = lambda pair: (cls._from_json(pair[0]), cls._from_json(pair[1]))
+            return dict(map(func, body))
+        elif tag == cls.tag_set: return set(map(cls._from_json, body))
+        elif tag == cls.tag_tuple: return tuple(map(cls._from_json, body))
+        raise ValueError('Unsupported tag for %s: %r.' % (cls.__name__, tag))
+    @classmethod
+    def _from_legacy(cls, text: str) -> object:
+        import ast
+        def _node(node: ast.AST) -> object:
+            if isinstance(node, ast.Constant): return node.value
+            elif isinstance(node, ast.Tuple): return tuple(map(_node, node.elts))
+            elif isinstance(node, ast.List): return list(map(_node, node.elts))
+            elif isinstance(node, ast.Set): return set(map(_node, node.elts))
+            elif isinstance(node, ast.Dict):
+                return dict(zip(map(_node, node.keys), map(_node, node.values)))
+            elif isinstance(node, ast.Call) and isinstance(node.func, ast.Name):
+                # OrderedDict is the saved form of Context, nested in dict it is kept as is.
+                func = lambda keyword: (keyword.arg, _node(keyword.value))
+                if node.func.id == 'Context' and not node.args:
+                    return Context(**dict(map(func, node.keywords)))
+                elif node.keywords or len(node.args) > 1: pass
+                elif node.func.id == 'OrderedDict':
+                    return Context(**dict(*map(_node, node.args)))
+                elif node.func.id == 'set': return set(*map(_node, node.args))
+            raise ValueError('Unsupported legacy params: %s.' % ast.dump(node))
+        return _node(ast.parse(text, mode = 'eval').body)
+
 class SmartContext(object):
     date_format, at_format = '%Y/%m/%d', '%Y/%m/%d-%H:%M:%S'
     def __init__(self, name2values: dict[str, object]):